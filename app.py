@@ -3,7 +3,7 @@ from src.config import logger
 from src.database.db_manager import init_firebase
 from src.ui.state import initialize_session_state
 from src.ui.components.sidebar import render_sidebar
-from src.ui.tabs.analysis_tab import render_analysis_tab
+from src.ui.tabs.analysis_tab import render_analysis_tab, poll_analysis_job
 from src.ui.tabs.patch_tab import render_patch_tab
 from src.ui.tabs.chat_tab import render_chat_tab
 from src.ui.tabs.visualizations_tab import render_visualizations_tab
@@ -51,3 +51,6 @@ with tab3:
     
 with tab4:
     render_history_tab()
+
+# Keep polling the background analysis until its result is in the session
+poll_analysis_job()
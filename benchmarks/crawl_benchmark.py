@@ -0,0 +1,115 @@
+"""Crawl-time benchmark on a synthetic monorepo.
+
+    python -m benchmarks.crawl_benchmark --files 100000 --output benchmarks/crawl_results.json
+
+Builds a monorepo of small files (packages with sources, tests, node_modules, build output and
+.gitignore'd artifacts), then times the previous os.walk crawler against FileCrawler with one
+and with several workers. Every variant runs `--repeats` times on a warm page cache; the best
+run is reported along with the time to the first yielded file.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+def generate_monorepo(path, n_files, seed=0, files_per_dir=25):
+    """Writes about `n_files` files: roughly 60% wanted sources, the rest in ignored locations."""
+    rng = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, ".gitignore"), "w") as f:
+        f.write("# build artifacts\n*.log\ngenerated/\n/coverage\n!keep.log\n")
+    written, package = 0, 0
+    while written < n_files:
+        pkg = os.path.join(path, "packages", f"pkg_{package:04d}")
+        layout = [
+            ("src", ".py" if package % 3 else ".ts", files_per_dir),
+            (os.path.join("src", "components"), ".js", files_per_dir // 2),
+            ("tests", ".py", files_per_dir // 2),
+            (os.path.join("node_modules", "dep", "lib"), ".js", files_per_dir),
+            ("dist", ".js", files_per_dir // 2),
+            ("generated", ".py", files_per_dir // 2),
+            ("logs", ".log", 3),
+            ("assets", ".png", 4),
+        ]
+        for sub, ext, count in layout:
+            directory = os.path.join(pkg, sub)
+            os.makedirs(directory, exist_ok=True)
+            for i in range(count):
+                with open(os.path.join(directory, f"m{i}{ext}"), "w") as f:
+                    f.write(f"value_{rng.randint(0, 10**6)} = {i}\n")
+                written += 1
+        if package % 10 == 0:
+            with open(os.path.join(pkg, ".gitignore"), "w") as f:
+                f.write("tests/m1*.py\n")
+        package += 1
+    return written
+
+def legacy_list_files(directory, extensions=(".py", ".js", ".ts", ".html", ".css")):
+    """The os.walk crawler FileCrawler replaced (no ignores, per-file endswith loop)."""
+    file_list = []
+    for root, _, files in os.walk(directory):
+        for file in files:
+            if any(file.endswith(ext) for ext in extensions):
+                file_list.append(os.path.join(root, file))
+    return file_list
+
+def measure(run, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        first = None
+        count = 0
+        for _ in run():
+            if first is None:
+                first = time.perf_counter() - start
+            count += 1
+        wall = time.perf_counter() - start
+        if best is None or wall < best["wall_s"]:
+            best = {"wall_s": round(wall, 4), "first_file_s": round(first or wall, 4), "files": count}
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark workspace crawling on a synthetic monorepo.")
+    parser.add_argument("--files", type=int, default=100000, help="Files in the generated monorepo")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default="benchmarks/crawl_results.json")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    from src.utils.file_crawler import FileCrawler
+
+    workdir = tempfile.mkdtemp(prefix="crawl_bench_")
+    try:
+        repo = os.path.join(workdir, "monorepo")
+        start = time.perf_counter()
+        written = generate_monorepo(repo, args.files, seed=args.seed)
+        print(f"--- Generated {written} files in {time.perf_counter() - start:.1f}s ---", file=sys.stderr, flush=True)
+
+        single = FileCrawler(workers=1, max_files=0)
+        parallel = FileCrawler(workers=args.workers, max_files=0)
+        variants = [
+            ("os.walk (previous)", lambda: legacy_list_files(repo)),
+            ("FileCrawler, 1 worker", lambda: single.crawl(repo)),
+            (f"FileCrawler, {args.workers} workers", lambda: parallel.crawl(repo)),
+        ]
+        results = []
+        for name, run in variants:
+            row = {"variant": name, **measure(run, args.repeats)}
+            results.append(row)
+            print(f"--- {name}: {row['wall_s']:.3f}s, first file after {row['first_file_s']:.3f}s, {row['files']} files ---", file=sys.stderr, flush=True)
+        report = {"files_on_disk": written, "repeats": args.repeats, "crawler_stats": parallel.stats, "results": results}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"--- Crawl benchmark written to {args.output} ---", file=sys.stderr, flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""End-to-end benchmarks for the analysis pipeline against the deterministic stub LLM.
+
+    python -m benchmarks.run_benchmarks --sizes 10,100,1000 --output benchmarks/results.json
+
+Each size runs in a fresh subprocess (so peak RSS is not inherited from a previous size) on a
+synthetic repository, and reports wall time, peak RSS and LLM calls for every stage.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+
+STAGES = ["crawl", "context", "index", "session", "guard", "patches", "render"]
+
+class RssSampler:
+    """Tracks the peak resident set size while a stage runs (samples /proc on Linux,
+    falls back to the process high-water mark elsewhere)."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current():
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except Exception:
+            import resource
+            scale = 1 if sys.platform == "darwin" else 1024
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.current()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+def _configure_env(cache_dir, base_url, realistic_limits):
+    """Must run before any `src` import: Config reads the environment at import time."""
+    os.environ.update({
+        "GROQ_BASE_URL": base_url,
+        "GROQ_API_KEY": "stub-key-0",
+        "GROQ_API_KEY_1": "stub-key-1",
+        "GOOGLE_API_KEY": "",
+        "DEBUGGER_CACHE_DIR": cache_dir,
+        "LLM_CACHE_ENABLED": "false",
+        "CHECKPOINT_ENABLED": "false",
+        "INCREMENTAL_ENABLED": "false",
+    })
+    if not realistic_limits:
+        # Measure the pipeline, not the client-side quota throttling
+        os.environ.update({"GROQ_RPM": "1000000", "GROQ_TPM": "1000000000", "GROQ_TPM_HEAVY": "1000000000"})
+
+def run_size(n_files, args, queue):
+    """Benchmarks every stage on one synthetic repository (runs in its own process)."""
+    workdir = tempfile.mkdtemp(prefix=f"bench_{n_files}_")
+    try:
+        from src.utils.stub_llm_server import StubLLMServer
+        stub = StubLLMServer(latency=args.latency, rate_429=args.rate_429, retry_after=args.retry_after,
+                             payload_chars=args.payload_chars, seed=args.seed)
+        base_url = stub.start()
+        _configure_env(os.path.join(workdir, "cache"), base_url, args.realistic_limits)
+
+        from benchmarks.synthetic_repo import generate_repo
+        from src.utils.file_crawler import FileCrawler
+        from src.agents.orchestrator import Orchestrator
+        from src.utils.diagram_renderer import DiagramRenderer
+
+        repo = os.path.join(workdir, "repo")
+        generate_repo(repo, n_files, seed=args.seed)
+        orchestrator = Orchestrator()
+        state = {}
+        results = []
+
+        def stage_crawl():
+            crawler = FileCrawler()
+            state["files"] = crawler.list_files(repo)
+            state["workspace_files"] = [os.path.relpath(f, repo) for f in state["files"]]
+            return {"files": len(state["files"]), "dirs": crawler.stats["dirs"], "ignored": crawler.stats["ignored"]}
+
+        def stage_context():
+            state["summary"], report = orchestrator.build_summary(repo, state["files"])
+            return {"tokens": report["used"], "included": len(report["included"]), "dropped": len(report["dropped"])}
+
+        def stage_index():
+            return {"chunks": orchestrator.build_index(repo, state["files"])}
+
+        def stage_session():
+            messages = orchestrator.run_debugging_session(
+                state["summary"], generate_diagrams=True, diagram_types=["Flowchart", "Class Diagram"],
+                workspace_files=state["workspace_files"], workspace_dir=repo,
+            )
+            state["patch_text"] = next((m["content"] for m in messages if m["name"] == "Patch_Generator"), "")
+            shards = orchestrator.phase_timings.get("detection", {}).get("shards", [])
+            return {"messages": [m["name"] for m in messages], "detection_shards": len(shards)}
+
+        def stage_guard():
+            checked = 0
+            for _ in range(max(1, args.guard_repeats)):
+                orchestrator.guard_manager.check_for_hallucinated_imports(state["patch_text"], state["workspace_files"])
+                checked += 1
+            return {"checks": checked}
+
+        def stage_patches():
+            patches = orchestrator.parse_patches(state["patch_text"])
+            sandbox = os.path.join(workdir, "sandbox")
+            shutil.copytree(repo, sandbox)
+            applied = orchestrator.apply_patches_to_dir(patches, sandbox, state["workspace_files"])
+            return {"patches": len(patches), "statuses": [r["status"] for r in applied]}
+
+        def stage_render():
+            nodes = [{"id": str(i), "label": f"Node {i}", "layer": i % 4} for i in range(min(40, max(4, n_files // 10)))]
+            edges = [{"from": str(i), "to": str(i + 1)} for i in range(len(nodes) - 1)]
+            svg = DiagramRenderer().render(json.dumps({"nodes": nodes, "edges": edges}))
+            return {"nodes": len(nodes), "svg_chars": len(svg)}
+
+        for name, func in [("crawl", stage_crawl), ("context", stage_context), ("index", stage_index),
+                           ("session", stage_session), ("guard", stage_guard), ("patches", stage_patches),
+                           ("render", stage_render)]:
+            if name not in args.stages:
+                continue
+            before = stub.stats()
+            start = time.perf_counter()
+            with RssSampler() as rss:
+                extra = func()
+            wall = time.perf_counter() - start
+            after = stub.stats()
+            results.append({
+                "files": n_files,
+                "stage": name,
+                "wall_s": round(wall, 4),
+                "peak_rss_mb": round(rss.peak / (1024 * 1024), 1),
+                "llm_calls": after["requests"] - before["requests"],
+                "rate_limited": after["rate_limited"] - before["rate_limited"],
+                "extra": extra,
+            })
+            print(f"--- [{n_files} files] {name}: {wall:.3f}s, {results[-1]['llm_calls']} LLM call(s) ---", file=sys.stderr, flush=True)
+        stub.stop()
+        queue.put({"ok": True, "results": results})
+    except Exception as e:
+        queue.put({"ok": False, "error": f"{type(e).__name__}: {e}"})
+    finally:
+        # The retrieval index lives next to the repo, inside workdir
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on synthetic repositories.")
+    parser.add_argument("--sizes", default="10,100,1000", help="Comma-separated repository sizes (files)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Subset of {','.join(STAGES)}")
+    parser.add_argument("--output", default="benchmarks/results.json")
+    parser.add_argument("--latency", default="fixed:0", help="Stub latency distribution (see stub_llm_server)")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.05)
+    parser.add_argument("--payload-chars", type=int, default=0)
+    parser.add_argument("--guard-repeats", type=int, default=100)
+    parser.add_argument("--realistic-limits", action="store_true", help="Keep the configured client-side rate limits")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=1800, help="Seconds allowed per size")
+    args = parser.parse_args(argv)
+    args.stages = set(args.stages.split(","))
+
+    ctx = multiprocessing.get_context("spawn")
+    runs = []
+    for n_files in [int(s) for s in args.sizes.split(",") if s]:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=run_size, args=(n_files, args, queue))
+        proc.start()
+        try:
+            outcome = queue.get(timeout=args.timeout)
+        except Exception:
+            outcome = {"ok": False, "error": f"timed out after {args.timeout}s"}
+        proc.join(5)
+        if proc.is_alive():
+            proc.terminate()
+        if outcome["ok"]:
+            runs.extend(outcome["results"])
+        else:
+            print(f"--- [{n_files} files] failed: {outcome['error']} ---", file=sys.stderr, flush=True)
+            runs.append({"files": n_files, "stage": None, "error": outcome["error"]})
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "latency": args.latency,
+            "rate_429": args.rate_429,
+            "payload_chars": args.payload_chars,
+            "realistic_limits": args.realistic_limits,
+            "seed": args.seed,
+        },
+        "results": runs,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"--- Benchmark results written to {args.output} ---", file=sys.stderr, flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os
+import random
+
+MODULE_TEMPLATE = '''"""Synthetic module {name}."""
+{imports}
+
+CONSTANT_{upper} = {constant}
+
+
+def {func}(value, factor={factor}):
+    """Scales a value."""
+    if value is None:
+        return 0
+    total = 0
+    for i in range(int(value)):
+        total += i * factor
+    return total
+
+
+class {cls}:
+    """Keeps a running state."""
+
+    def __init__(self, seed={constant}):
+        self.seed = seed
+        self.items = []
+
+    def add(self, item):
+        self.items.append(item)
+        return len(self.items)
+
+    def compute(self):
+        return sum({func}(x) for x in self.items) + self.seed
+{body}
+'''
+
+JS_TEMPLATE = '''{imports}
+
+export function {func}(value) {{
+  if (value === undefined) {{
+    return 0;
+  }}
+  return value * {constant};
+}}
+
+export class {cls} {{
+  constructor() {{
+    this.items = [];
+  }}
+
+  add(item) {{
+    this.items.push(item);
+    return this.items.length;
+  }}
+}}
+'''
+
+def generate_repo(path, n_files, seed=0, js_ratio=0.1, modules_per_package=20):
+    """Writes a deterministic synthetic repository of `n_files` source files under `path`.
+    Modules import a few earlier ones (so the import graph has hubs), live in packages of
+    `modules_per_package`, and a share of them are JavaScript. Returns the relative paths."""
+    rng = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+    python_modules = []
+    js_modules = []
+    paths = []
+    for i in range(n_files):
+        package = f"pkg{i // modules_per_package}"
+        os.makedirs(os.path.join(path, package), exist_ok=True)
+        if rng.random() < js_ratio:
+            name = f"mod{i}.js"
+            imports = "\n".join(
+                f"import {{ func{j} }} from '../{os.path.dirname(p)}/mod{j}.js';"
+                for j, p in rng.sample(js_modules, min(2, len(js_modules)))
+            )
+            content = JS_TEMPLATE.format(imports=imports, func=f"func{i}", cls=f"Model{i}", constant=rng.randint(1, 99))
+            js_modules.append((i, f"{package}/{name}"))
+        else:
+            name = f"mod{i}.py"
+            # Earlier modules are imported more often: a few hubs emerge, as in real code bases
+            candidates = python_modules[:max(1, len(python_modules) // 4)] if python_modules else []
+            chosen = rng.sample(candidates, min(3, len(candidates)))
+            imports = "\n".join(f"from {mod} import func{j}" for j, mod in chosen)
+            body = "\n".join(
+                f"\n\ndef helper_{i}_{k}(x):\n    return x + {k}" for k in range(rng.randint(0, 4))
+            )
+            content = MODULE_TEMPLATE.format(
+                name=f"{package}.mod{i}", imports=imports, upper=f"MOD{i}", constant=rng.randint(1, 999),
+                func=f"func{i}", factor=rng.randint(1, 9), cls=f"Model{i}", body=body,
+            )
+            python_modules.append((i, f"{package}.mod{i}"))
+        rel_path = f"{package}/{name}"
+        with open(os.path.join(path, rel_path), "w", encoding="utf-8") as f:
+            f.write(content)
+        paths.append(rel_path)
+
+    for package in {p.split("/")[0] for p in paths}:
+        init = os.path.join(path, package, "__init__.py")
+        if not os.path.exists(init):
+            open(init, "w").close()
+    with open(os.path.join(path, "main.py"), "w", encoding="utf-8") as f:
+        f.write("from pkg0.mod0 import func0\n\n\nif __name__ == \"__main__\":\n    print(func0(10))\n")
+    paths.append("main.py")
+    return paths
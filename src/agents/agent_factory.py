@@ -1,13 +1,45 @@
 from autogen import AssistantAgent, UserProxyAgent
 from src.config import Config
+from src.agents.managers.key_pool import get_key_pool
+from src.utils.context_builder import ContextBuilder
 import src.agents.prompts as prompts
 
 class AgentFactory:
-    def __init__(self):
+    def __init__(self, slot=None):
         self.groq_keys = Config.get_groq_keys()
         self.current_groq_index = 0
+        self.heavy_gemini_first = True
+        self.reserved_key = None
+        self.key_pool = get_key_pool()
+        self.context_builder = ContextBuilder()
+        self.key_pool.register(self.groq_keys, provider="groq")
+        if Config.GOOGLE_API_KEY:
+            self.key_pool.register([Config.GOOGLE_API_KEY], provider="google")
+        if slot is not None:
+            self._assign_slot(slot)
         self.refresh_config()
 
+    def _assign_slot(self, slot):
+        """Pins the leading provider for a worker: slot 0 is Gemini (if set), the others lead with Groq.
+        Which Groq key is used is decided by the shared key pool."""
+        gemini_slots = 1 if Config.GOOGLE_API_KEY else 0
+        providers = gemini_slots + len(self.groq_keys)
+        if not providers:
+            return
+        if slot % providers >= gemini_slots:
+            self.heavy_gemini_first = False
+
+    def spawn(self, slot):
+        """Returns an independent factory for a concurrent worker, so key rotation in one worker never races another."""
+        return AgentFactory(slot=slot)
+
+    def clone(self):
+        """Returns an independent factory with the same provider order, for a request that may outlive its caller."""
+        factory = AgentFactory()
+        factory.heavy_gemini_first = self.heavy_gemini_first
+        factory.refresh_config()
+        return factory
+
     def _build_config(self, model_name, gemini_first=False):
         """Helper to build a config list with optional Gemini prioritization."""
         groq_configs = []
@@ -17,7 +49,7 @@ class AgentFactory:
                 groq_configs.append({
                     "model": model_name,
                     "api_key": key,
-                    "base_url": "https://api.groq.com/openai/v1",
+                    "base_url": Config.GROQ_BASE_URL,
                     "api_type": "openai",
                     "max_retries": 0
                 })
@@ -44,7 +76,7 @@ class AgentFactory:
         
         # Heavy Analysis (Detection, Patching, Review) -> Gemini First (Better Quota)
         self.llm_config = {
-            "config_list": self._build_config(Config.GROQ_MODEL, gemini_first=True),
+            "config_list": self._build_config(Config.GROQ_MODEL, gemini_first=self.heavy_gemini_first),
             **common_params
         }
         
@@ -54,12 +86,26 @@ class AgentFactory:
             **common_params
         }
 
-    @staticmethod
-    def truncate_context(text, max_chars=4000):
-        """Truncates massive context strings to prevent token overflow."""
-        if not text: return ""
-        if len(text) <= max_chars: return text
-        return text[:max_chars] + "\n... [Context truncated for quota safety] ..."
+    # Groq model serving each phase (see the create_*_agent methods)
+    PHASE_MODELS = {"parsing": Config.GROQ_MODEL_LIGHT}
+
+    def context_budget(self, phase):
+        """Token budget for the repository context of a phase: the phase cap, bounded by the smallest
+        model budget in its fallback chain (the Groq model when keys exist, else Gemini)."""
+        models = [Config.MODEL] if Config.GOOGLE_API_KEY else []
+        if self.groq_keys or not models:
+            models.append(self.PHASE_MODELS.get(phase, Config.GROQ_MODEL))
+        budget = min(Config.MODEL_CONTEXT_BUDGETS.get(m, Config.MODEL_CONTEXT_BUDGETS[Config.GROQ_MODEL]) for m in models)
+        return min(budget, Config.PHASE_CONTEXT_BUDGETS.get(phase, budget))
+
+    def max_context_budget(self):
+        """Largest budget any phase accepts: the size a workspace summary is built to."""
+        return max(self.context_budget(phase) for phase in Config.PHASE_CONTEXT_BUDGETS)
+
+    def fit_context(self, text, phase, reserve=0):
+        """Fits a ranked workspace summary into a phase's token budget, less `reserve` tokens taken
+        by other context. Returns (text, report)."""
+        return self.context_builder.fit(text, max(0, self.context_budget(phase) - reserve))
 
     def get_masked_key(self):
         """Returns the current key with masking (e.g., gsk_...1234)."""
@@ -67,14 +113,48 @@ class AgentFactory:
         key = self.groq_keys[self.current_groq_index]
         return f"{key[:8]}...{key[-4:]}"
 
+    def _select_key(self, key):
+        self.current_groq_index = self.groq_keys.index(key)
+        self.refresh_config()
+
+    def acquire_key(self):
+        """Reserves the healthiest Groq key from the shared pool and puts it first in both configs."""
+        self.release_key()
+        key = self.key_pool.acquire("groq")
+        if key:
+            self.reserved_key = key
+            self._select_key(key)
+        return key
+
+    def release_key(self):
+        if self.reserved_key:
+            self.key_pool.release(self.reserved_key)
+            self.reserved_key = None
+
+    def demote_gemini(self):
+        """Lets Groq lead the heavy phases once Gemini's budget is spent. Returns True if the order changed."""
+        if not self.heavy_gemini_first or not self.groq_keys:
+            return False
+        self.heavy_gemini_first = False
+        self.refresh_config()
+        return True
+
     def rotate_key(self):
-        """Switches to the next available Groq key. Returns True if rotated, False otherwise."""
+        """Switches to the healthiest other Groq key. Returns True if rotated, False otherwise."""
         if len(self.groq_keys) > 1:
-            self.current_groq_index = (self.current_groq_index + 1) % len(self.groq_keys)
-            self.refresh_config()
-            return True
+            current = self.groq_keys[self.current_groq_index]
+            self.release_key()
+            key = self.key_pool.acquire("groq", exclude=(current,))
+            if key:
+                self.reserved_key = key
+                self._select_key(key)
+                return True
         return False
 
+    def get_key_pool_state(self):
+        """Returns the shared key pool health (masked keys) for monitoring."""
+        return self.key_pool.snapshot()
+
     def create_code_parser_agent(self):
         return AssistantAgent(
             name="Code_Parser",
@@ -124,6 +204,22 @@ class AgentFactory:
             llm_config=self.llm_config,
         )
 
+    def create_memory_summarizer_agent(self):
+        return AssistantAgent(
+            name="Memory_Summarizer",
+            system_message=prompts.MEMORY_SUMMARIZER_PROMPT,
+            llm_config=self.llm_config_light,
+        )
+
+    @staticmethod
+    def pin_config(agent, config_entry):
+        """Returns a copy of an agent that only calls the given config_list entry."""
+        return AssistantAgent(
+            name=agent.name,
+            system_message=agent.system_message,
+            llm_config={**agent.llm_config, "config_list": [config_entry]},
+        )
+
     def create_user_proxy(self):
         return UserProxyAgent(
             name="User_Proxy",
@@ -1,10 +1,25 @@
 import sys
 import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait, FIRST_COMPLETED
 from src.config import Config
+from src.agents.managers.cache_manager import get_response_cache
+from src.agents.managers.hedge_manager import get_hedge_manager
+from src.agents.managers.rate_limiter import RateLimiter, get_rate_limiter
+from src.agents.managers.trace_manager import get_tracer
 
 class AgentRunner:
     def __init__(self, factory):
         self.factory = factory
+        self.cache = get_response_cache()
+        self.limiter = get_rate_limiter()
+        self.tracer = get_tracer()
+        self.hedger = get_hedge_manager()
+
+    def spawn(self, slot):
+        """Returns a runner bound to its own factory for use from a worker thread."""
+        return AgentRunner(self.factory.spawn(slot))
 
     def validate_msg(self, user_proxy, agent):
         msg = user_proxy.last_message(agent)
@@ -13,47 +28,269 @@ class AgentRunner:
             return f"⚠️ **AI Agent Error ({agent.name})**: The AI provider returned an error: {content[:100]}..."
         return content
 
-    def run_step_with_rotation(self, agent_creator, user_proxy, message, phase_name, clear_history=True):
+    def _cache_key(self, agent, message):
+        model_name = "N/A"
+        temperature = None
+        if hasattr(agent, "llm_config") and agent.llm_config:
+            temperature = agent.llm_config.get("temperature")
+            if agent.llm_config.get("config_list"):
+                model_name = agent.llm_config["config_list"][0].get("model", "unknown")
+        return self.cache.make_key(agent.name, agent.system_message, model_name, temperature, message)
+
+    def run_step_with_rotation(self, agent_creator, user_proxy, message, phase_name, clear_history=True, use_cache=True):
         """Runs an AI step with automatic key rotation on 429/quota errors."""
+        cache_key = None
+        if use_cache and self.cache.enabled:
+            probe = agent_creator()
+            cache_key = self._cache_key(probe, message)
+            cached = self.cache.get(cache_key, probe.name)
+            if cached is not None:
+                print(f"--- Phase: {phase_name} | Cache hit ---", file=sys.stderr, flush=True)
+                with self.tracer.span("llm_attempt", kind="llm", phase=phase_name, agent=probe.name, outcome="cache_hit", response_chars=len(cached)):
+                    pass
+                return cached, False
+
+        if self.hedger.applies(phase_name) and getattr(agent_creator, "__self__", None) is self.factory:
+            return self._run_hedged(agent_creator, user_proxy, message, phase_name, clear_history, cache_key)
+        return self._run_rotating(agent_creator, user_proxy, message, phase_name, clear_history, cache_key)
+
+    def _run_rotating(self, agent_creator, user_proxy, message, phase_name, clear_history, cache_key, cancelled=None):
         max_attempts = len(self.factory.groq_keys) if self.factory.groq_keys else 1
         if Config.GOOGLE_API_KEY:
             max_attempts += 1
+        # Extra attempts for waiting out a short retry-after on the same key
+        max_attempts += Config.RATE_LIMIT_SAME_KEY_RETRIES
+
+        self.factory.acquire_key()
+        try:
+            return self._run_attempts(agent_creator, user_proxy, message, phase_name, clear_history, cache_key, max_attempts, cancelled)
+        finally:
+            self.factory.release_key()
 
+    def _run_attempts(self, agent_creator, user_proxy, message, phase_name, clear_history, cache_key, max_attempts, cancelled=None):
         for attempt in range(max_attempts):
+            if cancelled is not None and cancelled.is_set():
+                return "⚠️ Cancelled: a hedged request answered first.", True
+            lead = {}
+            # One span per attempt: key, model, sizes, time waited on the rate limiter and the outcome
+            with self.tracer.span("llm_attempt", kind="llm", phase=phase_name, attempt=attempt, prompt_chars=len(message)) as span:
+                try:
+                    agent = agent_creator()
+                    if clear_history:
+                        user_proxy.clear_history(agent)
+                    
+                    masked_key = self.factory.get_masked_key()
+                    lead = self._lead_config(agent)
+                    model_name = lead.get("model", "unknown") if lead else "N/A"
+                    provider = RateLimiter.provider_of(lead) if lead else "none"
+                    span.set(agent=agent.name, key=masked_key, model=model_name, provider=provider)
+                    
+                    print(f"--- Phase: {phase_name} | Key: {masked_key} | Model: {model_name} ---", file=sys.stderr, flush=True)
+                    
+                    # Pace against the key's real RPM/TPM budget instead of a fixed sleep
+                    estimated = RateLimiter.estimate_tokens(agent.system_message, message)
+                    span.set(prompt_tokens=estimated)
+                    if lead:
+                        waited = self.limiter.acquire(provider, lead.get("api_key"), model_name, estimated, max_wait=Config.RATE_LIMIT_MAX_WAIT)
+                        if waited is None:
+                            span.set(outcome="budget_exhausted")
+                            # rotate_key only cycles Groq keys: a spent Gemini lead is moved behind them instead
+                            if provider != "groq" and self.factory.demote_gemini():
+                                print(f"--- Budget exhausted for {provider} ({model_name}). Falling back to Groq: {self.factory.get_masked_key()} ---", file=sys.stderr, flush=True)
+                                continue
+                            if self.factory.rotate_key():
+                                print(f"--- Budget exhausted for {masked_key}. Rotating to: {self.factory.get_masked_key()} ---", file=sys.stderr, flush=True)
+                                continue
+                            span.fail("quota exhausted")
+                            return "⚠️ Quota exhausted across all configured keys.", True
+                        span.set(wait_s=round(waited, 3))
+                        if waited:
+                            print(f"--- Rate limiter: waited {waited:.1f}s for {masked_key} ---", file=sys.stderr, flush=True)
+                    
+                    started = time.monotonic()
+                    user_proxy.initiate_chat(agent, message=message, silent=True, clear_history=False)
+                    latency = time.monotonic() - started
+                    if lead:
+                        self._settle_usage(agent, lead, estimated)
+                    result = self.validate_msg(user_proxy, agent)
+                    span.set(latency_s=round(latency, 3), response_chars=len(result or ""))
+                    
+                    if "⚠️" in result:
+                        span.fail(result)
+                        if cancelled is not None and cancelled.is_set():
+                            span.set(outcome="cancelled")
+                            return result, True
+                        if any(err in result.lower() for err in ["429", "quota", "rate limit"]):
+                            raw = (user_proxy.last_message(agent) or {}).get("content", "")
+                            span.set(outcome="rate_limited")
+                            if self._handle_rate_limit(lead, raw, "hit", span):
+                                continue
+                        else:
+                            span.set(outcome="error")
+                            self._record_health(lead, error=True)
+                        return result, False
+                    span.set(outcome="ok")
+                    self._record_health(lead, latency=latency)
+                    if cache_key and result:
+                        self.cache.put(cache_key, agent.name, result)
+                    return result, False
+                except Exception as e:
+                    err_msg = str(e)
+                    span.fail(err_msg)
+                    if cancelled is not None and cancelled.is_set():
+                        span.set(outcome="cancelled")
+                        return f"⚠️ API Error: {err_msg}", True
+                    if any(err in err_msg.lower() for err in ["429", "quota", "rate limit"]):
+                        span.set(outcome="rate_limited")
+                        if self._handle_rate_limit(lead, err_msg, "exception", span):
+                            continue
+                    else:
+                        span.set(outcome="error")
+                        self._record_health(lead, error=True)
+                    return f"⚠️ API Error: {err_msg}", True
+        return "⚠️ Quota exhausted across all configured keys.", True
+
+    def _run_hedged(self, agent_creator, user_proxy, message, phase_name, clear_history, cache_key):
+        """Runs the rotating path as the primary request and, once it is slower than the recent
+        latency percentile of its provider, races a copy on the next provider. The first usable
+        answer wins and the other request is abandoned.
+
+        The primary runs on a cloned factory and its own user proxy, so an abandoned request that is
+        still draining never touches this runner's key reservation or the caller's chat history."""
+        probe = agent_creator()
+        lead = self._lead_config(probe)
+        if not lead:
+            return self._run_rotating(agent_creator, user_proxy, message, phase_name, clear_history, cache_key)
+        self.hedger.count("eligible")
+        delay = self.hedger.delay(self.factory.key_pool.latency_samples(RateLimiter.provider_of(lead)))
+
+        primary_runner = AgentRunner(self.factory.clone())
+        cancel_primary, cancel_hedge = threading.Event(), threading.Event()
+        pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hedge")
+        try:
+            primary = pool.submit(contextvars.copy_context().run, primary_runner._run_rotating, getattr(primary_runner.factory, agent_creator.__name__),
+                                  primary_runner.factory.create_user_proxy(), message, phase_name, True, cache_key, cancel_primary)
             try:
-                agent = agent_creator()
-                if clear_history:
-                    user_proxy.clear_history(agent)
-                
-                masked_key = self.factory.get_masked_key()
-                # Determine model name from agent config
-                model_name = "N/A"
-                if hasattr(agent, "llm_config") and agent.llm_config.get("config_list"):
-                    model_name = agent.llm_config["config_list"][0].get("model", "unknown")
-                
-                print(f"--- Phase: {phase_name} | Key: {masked_key} | Model: {model_name} ---", file=sys.stderr, flush=True)
-                
-                # Forced Pacing to prevent RPM (Requests Per Minute) spikes
-                time.sleep(1.5) 
-                
-                user_proxy.initiate_chat(agent, message=message, silent=True, clear_history=False)
+                outcome = primary.result(timeout=delay)
+                self.hedger.count("primary_fast")
+                return outcome
+            except FutureTimeout:
+                pass
+
+            tokens = RateLimiter.estimate_tokens(probe.system_message, message)
+            entry = self.hedger.reserve(probe.llm_config["config_list"], lead, tokens, self.factory.key_pool, self.limiter)
+            if entry is None:
+                return primary.result()
+            hedge_agent = self.factory.pin_config(probe, entry)
+            print(f"--- Phase: {phase_name} | No answer after {delay:.1f}s, hedging on {RateLimiter.provider_of(entry)} ---", file=sys.stderr, flush=True)
+            hedge = pool.submit(contextvars.copy_context().run, self._run_hedge, hedge_agent, entry, message, phase_name, tokens, cancel_hedge)
+
+            roles = {primary: "primary", hedge: "hedge"}
+            outcomes = {}
+            while roles:
+                done, _ = wait(list(roles), return_when=FIRST_COMPLETED)
+                for future in done:
+                    role = roles.pop(future)
+                    outcomes[role] = future.result()
+                    result, is_err = outcomes[role]
+                    if is_err or "⚠️" in (result or ""):
+                        continue
+                    # The losing call cannot be interrupted mid-request: it stops retrying, its answer is
+                    # dropped and it releases its key when the response lands
+                    (cancel_hedge if role == "primary" else cancel_primary).set()
+                    self.hedger.count("won" if role == "hedge" else "lost")
+                    print(f"--- Phase: {phase_name} | {role.capitalize()} request answered first ---", file=sys.stderr, flush=True)
+                    if role == "hedge" and cache_key and result:
+                        self.cache.put(cache_key, probe.name, result)
+                    return result, is_err
+            self.hedger.count("lost")
+            return outcomes["primary"]
+        finally:
+            pool.shutdown(wait=False)
+
+    def _run_hedge(self, agent, entry, message, phase_name, estimated, cancelled):
+        """One attempt on the hedge key (its quota was reserved by HedgeManager.reserve)."""
+        provider, model_name = RateLimiter.provider_of(entry), entry.get("model", "unknown")
+        key = entry.get("api_key") or ""
+        masked_key = f"{key[:8]}...{key[-4:]}" if len(key) > 12 else "****"
+        user_proxy = self.factory.create_user_proxy()
+        with self.tracer.span("llm_attempt", kind="llm", phase=phase_name, attempt="hedge", hedge=True, agent=agent.name,
+                              key=masked_key, model=model_name, provider=provider, prompt_chars=len(message), prompt_tokens=estimated) as span:
+            try:
+                print(f"--- Phase: {phase_name} | Hedge | Key: {masked_key} | Model: {model_name} ---", file=sys.stderr, flush=True)
+                started = time.monotonic()
+                user_proxy.initiate_chat(agent, message=message, silent=True, clear_history=True)
+                latency = time.monotonic() - started
+                self._settle_usage(agent, entry, estimated)
                 result = self.validate_msg(user_proxy, agent)
-                
+                span.set(latency_s=round(latency, 3), response_chars=len(result or ""))
                 if "⚠️" in result:
-                    if any(err in result.lower() for err in ["429", "quota", "rate limit"]):
-                        if self.factory.rotate_key():
-                            next_key = self.factory.get_masked_key()
-                            print(f"--- ⚠️ Rate limit hit. Cooling down & Rotating to: {next_key} ---", file=sys.stderr, flush=True)
-                            time.sleep(3)
-                            continue
-                return result, False
+                    span.fail(result)
+                    raw = (user_proxy.last_message(agent) or {}).get("content", "")
+                    self._record_failure(entry, raw, span)
+                    return result, True
+                # A late answer is still a latency sample for the key
+                self._record_health(entry, latency=latency)
+                span.set(outcome="cancelled" if cancelled.is_set() else "ok")
+                return result, cancelled.is_set()
             except Exception as e:
-                err_msg = str(e)
-                if any(err in err_msg.lower() for err in ["429", "quota", "rate limit"]):
-                    if self.factory.rotate_key():
-                        next_key = self.factory.get_masked_key()
-                        print(f"--- ⚠️ Rate limit exception. Cooling down & Rotating to: {next_key} ---", file=sys.stderr, flush=True)
-                        time.sleep(3)
-                        continue
-                return f"⚠️ API Error: {err_msg}", True
-        return "⚠️ Quota exhausted across all configured keys.", True
+                span.fail(str(e))
+                if cancelled.is_set():
+                    span.set(outcome="cancelled")
+                else:
+                    self._record_failure(entry, str(e), span)
+                return f"⚠️ API Error: {e}", True
+            finally:
+                self.factory.key_pool.release(key)
+
+    def _record_failure(self, entry, error_text, span):
+        """Health bookkeeping for a failed hedge (no rotation: the primary request is still running)."""
+        if any(err in error_text.lower() for err in ["429", "quota", "rate limit"]):
+            retry_after = RateLimiter.parse_retry_after(error_text)
+            span.set(outcome="rate_limited", retry_after=retry_after)
+            self._record_health(entry, rate_limited=True, retry_after=retry_after)
+            self.limiter.penalize(RateLimiter.provider_of(entry), entry.get("api_key"), entry.get("model"), retry_after)
+        else:
+            span.set(outcome="error")
+            self._record_health(entry, error=True)
+
+    def _record_health(self, lead, **outcome):
+        if lead and lead.get("api_key"):
+            self.factory.key_pool.record(lead["api_key"], **outcome)
+
+    @staticmethod
+    def _lead_config(agent):
+        """Returns the config_list entry AutoGen will try first for this agent."""
+        if hasattr(agent, "llm_config") and agent.llm_config and agent.llm_config.get("config_list"):
+            return agent.llm_config["config_list"][0]
+        return {}
+
+    def _settle_usage(self, agent, lead, estimated):
+        """Feeds the real token usage reported by AutoGen back into the TPM budget."""
+        try:
+            usage = getattr(agent.client, "total_usage_summary", None) or {}
+            actual = sum(v.get("total_tokens", 0) for v in usage.values() if isinstance(v, dict))
+            if actual:
+                self.limiter.settle(RateLimiter.provider_of(lead), lead.get("api_key"), lead.get("model"), estimated, actual)
+        except Exception:
+            pass
+
+    def _handle_rate_limit(self, lead, error_text, label, span=None):
+        """Records a 429 with the limiter and rotates keys. Returns True if the step should be retried."""
+        retry_after = RateLimiter.parse_retry_after(error_text)
+        if span is not None and retry_after is not None:
+            span.set(retry_after=retry_after)
+        self._record_health(lead, rate_limited=True, retry_after=retry_after)
+        if lead:
+            self.limiter.penalize(RateLimiter.provider_of(lead), lead.get("api_key"), lead.get("model"), retry_after)
+        if lead and RateLimiter.provider_of(lead) != "groq" and self.factory.demote_gemini():
+            print(f"--- ⚠️ Rate limit {label} on {lead.get('model')}. Falling back to Groq: {self.factory.get_masked_key()} ---", file=sys.stderr, flush=True)
+            return True
+        if self.factory.rotate_key():
+            next_key = self.factory.get_masked_key()
+            print(f"--- ⚠️ Rate limit {label}. Rotating to: {next_key} ---", file=sys.stderr, flush=True)
+            return True
+        if retry_after is not None and retry_after <= Config.RATE_LIMIT_MAX_WAIT:
+            print(f"--- ⚠️ Rate limit {label}. Retrying same key after {retry_after:.1f}s ---", file=sys.stderr, flush=True)
+            return True
+        return False
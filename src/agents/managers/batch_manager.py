@@ -0,0 +1,236 @@
+import os
+import re
+import sys
+import json
+import time
+import queue
+import shutil
+import hashlib
+import secrets
+import tempfile
+import multiprocessing
+from multiprocessing.managers import BaseManager
+from src.config import Config, logger
+from src.agents.managers.key_pool import get_key_pool, install_key_pool
+from src.agents.managers.rate_limiter import get_rate_limiter, install_rate_limiter
+from src.utils.sandbox_manager import get_sandbox_manager
+
+class SchedulerManager(BaseManager):
+    """Serves one key pool and one rate limiter to every batch worker process, so key health,
+    cooldowns and RPM/TPM budgets are shared instead of multiplied by the number of workers."""
+
+SchedulerManager.register("KeyPool", callable=get_key_pool)
+SchedulerManager.register("RateLimiter", callable=get_rate_limiter)
+
+def _connect_scheduler(address, authkey):
+    manager = SchedulerManager(address=address, authkey=authkey)
+    manager.connect()
+    install_key_pool(manager.KeyPool())
+    install_rate_limiter(manager.RateLimiter())
+
+def _analyze_worker(spec, options, address, authkey, results):
+    """Runs one repository in a worker process and writes its result file."""
+    started = time.time()
+    try:
+        # Must precede the first AgentFactory: factories bind the process-wide pool on creation
+        _connect_scheduler(address, authkey)
+        from src.agents.orchestrator import Orchestrator
+        orchestrator = Orchestrator()
+        result = orchestrator.analyze_repository(
+            spec["repo_url"], spec["local_path"], options["diagram_types"],
+            progress=lambda message: print(f"--- [{spec['name']}] {message} ---", file=sys.stderr, flush=True),
+            workspace_dir=spec["workspace_dir"],
+        )
+        result["source"] = spec["source"]
+        result["duration"] = round(time.time() - started, 3)
+        result["status"] = "done" if result["ok"] else "failed"
+        if not options["keep_workspaces"]:
+            BatchManager.remove_workspace(spec["workspace_dir"])
+            result["workspace_dir"] = None
+        BatchManager.write_json(spec["result_path"], result)
+        timings = result.get("timings") or []
+        results.put({
+            "source": spec["source"],
+            "status": result["status"],
+            "duration": result["duration"],
+            "error": result["error"],
+            "attempts": sum(row["attempts"] for row in timings),
+            "retries": sum(row["retries"] for row in timings),
+            "wait_s": round(sum(row["wait_s"] for row in timings), 3),
+        })
+    except Exception as e:
+        logger.error(f"Batch worker failed on {spec['source']}: {e}")
+        results.put({"source": spec["source"], "status": "failed", "duration": round(time.time() - started, 3), "error": f"{type(e).__name__}: {e}"})
+
+class BatchManager:
+    """Analyzes many repositories headlessly on a bounded set of worker processes.
+
+    Each repository runs in its own process (so a per-repo timeout can actually stop it), all
+    workers draw keys and quota from one shared scheduler, results are written as one JSON file
+    per repository, and `progress.json` lets an interrupted sweep resume where it stopped."""
+
+    def __init__(self, output_dir, workers=None, timeout=None, diagram_types=None, resume=True, keep_workspaces=False):
+        self.output_dir = output_dir
+        self.workers = max(1, workers or Config.BATCH_WORKERS)
+        self.timeout = timeout or Config.BATCH_REPO_TIMEOUT
+        self.diagram_types = list(diagram_types or [])
+        self.resume = resume
+        self.keep_workspaces = keep_workspaces
+        self.progress_path = os.path.join(output_dir, "progress.json")
+        self.summary_path = os.path.join(output_dir, "summary.json")
+
+    @staticmethod
+    def parse_source(source):
+        """Classifies a CLI source as a remote URL or a local path."""
+        source = source.strip()
+        if re.match(r"^(https?://|git@|ssh://)", source) or source.endswith(".git"):
+            return {"source": source, "repo_url": source, "local_path": None}
+        return {"source": source, "repo_url": None, "local_path": os.path.abspath(source)}
+
+    @staticmethod
+    def slug(source):
+        name = re.sub(r"[^A-Za-z0-9._-]+", "_", source.rstrip("/").split("/")[-1].removesuffix(".git")) or "repo"
+        return f"{name[:40]}-{hashlib.sha1(source.encode('utf-8')).hexdigest()[:8]}"
+
+    @staticmethod
+    def write_json(path, data):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def remove_workspace(workspace_dir):
+        if workspace_dir:
+            # Also unregisters worktree sandboxes from the source repository
+            get_sandbox_manager().remove(workspace_dir)
+
+    def load_progress(self):
+        if not self.resume:
+            return {}
+        try:
+            with open(self.progress_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable batch progress {self.progress_path}: {e}")
+            return {}
+
+    def run(self, sources):
+        """Analyzes every source (URL or path). Returns the throughput summary."""
+        progress = self.load_progress()
+        specs, skipped = [], []
+        workspace_root = tempfile.mkdtemp(prefix="batch_")
+        for source in dict.fromkeys(s.strip() for s in sources if s.strip()):
+            if progress.get(source, {}).get("status") == "done":
+                skipped.append(source)
+                continue
+            spec = self.parse_source(source)
+            slug = self.slug(source)
+            spec.update(name=slug, workspace_dir=os.path.join(workspace_root, slug), result_path=os.path.join(self.output_dir, "results", f"{slug}.json"))
+            specs.append(spec)
+        if skipped:
+            print(f"--- Batch: resuming, {len(skipped)} repo(s) already done ---", file=sys.stderr, flush=True)
+
+        authkey = secrets.token_bytes(16)
+        scheduler = SchedulerManager(address=("127.0.0.1", 0), authkey=authkey)
+        scheduler.start()
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        options = {"diagram_types": self.diagram_types, "keep_workspaces": self.keep_workspaces}
+        records = []
+        started = time.time()
+        pending = list(specs)
+        running = {}
+        try:
+            while pending or running:
+                while pending and len(running) < self.workers:
+                    spec = pending.pop(0)
+                    proc = ctx.Process(target=_analyze_worker, args=(spec, options, scheduler.address, authkey, results), daemon=True)
+                    proc.start()
+                    running[spec["source"]] = (proc, spec, time.monotonic())
+                    print(f"--- Batch: started {spec['source']} ({len(records) + len(running)}/{len(specs)}) ---", file=sys.stderr, flush=True)
+
+                self._collect(results, running, progress, records, 0.5)
+                for source, (proc, spec, began) in list(running.items()):
+                    if time.monotonic() - began > self.timeout:
+                        proc.terminate()
+                        proc.join(10)
+                        running.pop(source)
+                        self.remove_workspace(spec["workspace_dir"])
+                        self._finish(progress, records, spec, {"source": source, "status": "timeout", "duration": round(time.monotonic() - began, 3), "error": f"Timed out after {self.timeout}s"})
+                    elif not proc.is_alive():
+                        # A worker that exited normally has already queued its record
+                        while source in running and self._collect(results, running, progress, records, 1):
+                            pass
+                        if source in running:
+                            running.pop(source)
+                            self._finish(progress, records, spec, {"source": source, "status": "failed", "duration": round(time.monotonic() - began, 3), "error": f"Worker exited with code {proc.exitcode}"})
+            summary = self.summarize(records, skipped, time.time() - started, scheduler)
+        finally:
+            for proc, _, _ in running.values():
+                proc.terminate()
+            scheduler.shutdown()
+            if not self.keep_workspaces:
+                shutil.rmtree(workspace_root, ignore_errors=True)
+        self.write_json(self.summary_path, summary)
+        return summary
+
+    def _collect(self, results, running, progress, records, timeout):
+        """Records one finished repository from the result queue. Returns False if none arrived in time."""
+        try:
+            record = results.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        entry = running.pop(record["source"], None)
+        if entry:
+            entry[0].join(10)
+            self._finish(progress, records, entry[1], record)
+        return True
+
+    def _finish(self, progress, records, spec, record):
+        record["result_file"] = os.path.relpath(spec["result_path"], self.output_dir) if os.path.exists(spec["result_path"]) else None
+        if record["status"] != "done" and not record["result_file"]:
+            self.write_json(spec["result_path"], record)
+            record["result_file"] = os.path.relpath(spec["result_path"], self.output_dir)
+        record["finished_at"] = time.time()
+        records.append(record)
+        progress[spec["source"]] = record
+        self.write_json(self.progress_path, progress)
+        print(f"--- Batch: {record['status']} {spec['source']} in {record['duration']:.1f}s ---", file=sys.stderr, flush=True)
+
+    def summarize(self, records, skipped, wall, scheduler=None):
+        """Aggregate throughput: outcomes, repos per minute, per-repo latency percentiles, LLM usage."""
+        durations = sorted(r["duration"] for r in records)
+
+        def percentile(q):
+            return round(durations[min(len(durations) - 1, int(q * len(durations)))], 2) if durations else None
+
+        counts = {}
+        for r in records:
+            counts[r["status"]] = counts.get(r["status"], 0) + 1
+        summary = {
+            "repos": len(records) + len(skipped),
+            "processed": len(records),
+            "skipped": len(skipped),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "timed_out": counts.get("timeout", 0),
+            "workers": self.workers,
+            "wall_s": round(wall, 2),
+            "repos_per_minute": round(len(records) / wall * 60, 2) if wall > 0 else None,
+            "duration_s": {"mean": round(sum(durations) / len(durations), 2) if durations else None, "p50": percentile(0.5), "p95": percentile(0.95), "max": durations[-1] if durations else None},
+            "llm_attempts": sum(r.get("attempts", 0) for r in records),
+            "llm_retries": sum(r.get("retries", 0) for r in records),
+            "rate_limit_wait_s": round(sum(r.get("wait_s", 0.0) for r in records), 2),
+            "records": records,
+        }
+        if scheduler is not None:
+            try:
+                summary["key_pool"] = scheduler.KeyPool().snapshot()
+                summary["rate_limiter"] = scheduler.RateLimiter().snapshot()
+            except Exception as e:
+                logger.warning(f"Could not read shared scheduler state: {e}")
+        return summary
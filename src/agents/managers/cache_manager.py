@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import contextlib
+from src.config import Config, logger
+
+class ResponseCache:
+    """Disk-backed (SQLite), content-addressed cache of LLM responses with LRU eviction and per-phase TTLs."""
+
+    def __init__(self, path=None, max_entries=None, enabled=None):
+        self.path = path or Config.LLM_CACHE_PATH
+        self.max_entries = max_entries if max_entries is not None else Config.LLM_CACHE_MAX_ENTRIES
+        self.enabled = Config.LLM_CACHE_ENABLED if enabled is None else enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if self.enabled:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with self._connect() as conn:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS responses ("
+                        "key TEXT PRIMARY KEY, agent TEXT, response TEXT, "
+                        "created_at REAL, last_access REAL)"
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+            except Exception as e:
+                logger.warning(f"LLM cache disabled, could not open {self.path}: {e}")
+                self.enabled = False
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Yields a connection that commits on success and is always closed (sqlite3's own context manager only commits)."""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(agent_name, system_message, model, temperature, message):
+        """Hashes everything that determines the model output into a stable cache key."""
+        payload = json.dumps([agent_name, system_message, model, temperature, message], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def ttl_for(agent_name):
+        return Config.LLM_CACHE_TTLS.get(agent_name, Config.LLM_CACHE_DEFAULT_TTL)
+
+    def get(self, key, agent_name):
+        """Returns the cached response or None. Expired entries are dropped on read."""
+        if not self.enabled:
+            return None
+        ttl = self.ttl_for(agent_name)
+        if ttl <= 0:
+            return None
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+                if row and now - row[1] <= ttl:
+                    conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                    self.hits += 1
+                    return row[0]
+                if row:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+        except Exception as e:
+            logger.warning(f"LLM cache read failed: {e}")
+        return None
+
+    def put(self, key, agent_name, response):
+        """Stores a response and evicts the least recently used entries above max_entries."""
+        if not self.enabled or self.ttl_for(agent_name) <= 0:
+            return
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, agent, response, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, agent_name, response, now, now)
+                )
+                count = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                overflow = count - self.max_entries
+                if overflow > 0:
+                    conn.execute(
+                        "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                        (overflow,)
+                    )
+                    self.evictions += overflow
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def clear(self):
+        if not self.enabled:
+            return
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        """Returns hit/miss counters and the current entry count."""
+        entries = 0
+        if self.enabled:
+            try:
+                with self._connect() as conn:
+                    entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            except Exception:
+                pass
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Returns the process-wide response cache so counters survive Orchestrator re-creation."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
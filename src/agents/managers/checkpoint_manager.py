@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from src.config import Config, logger
+from src.utils.file_reader import file_digest
+
+class CheckpointManager:
+    """Persists each orchestrator phase's output under a run id derived from the phase inputs,
+    so a failed or repeated session resumes from the first incomplete phase."""
+
+    PHASES = ["parsing", "detection", "patching", "review"]
+
+    def __init__(self, directory=None, max_runs=None):
+        self.directory = directory or Config.CHECKPOINT_DIR
+        self.max_runs = max_runs if max_runs is not None else Config.CHECKPOINT_MAX_RUNS
+        self.enabled = Config.CHECKPOINT_ENABLED
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def run_id(repo_summary, workspace_files=None, workspace_dir=None):
+        """Content hash of the code the phases analyze: every workspace file's path and full content.
+        The budgeted summary leaves out (or elides) most of the code, so it only keys runs that have
+        no workspace to read."""
+        digest = hashlib.sha256()
+        if workspace_dir:
+            for f in sorted(workspace_files or []):
+                content = file_digest(os.path.join(workspace_dir, f)) or ""
+                digest.update(f"\0{f}\0{content}".encode("utf-8"))
+        else:
+            digest.update((repo_summary or "").encode("utf-8"))
+            for f in sorted(workspace_files or []):
+                digest.update(b"\0" + f.encode("utf-8"))
+        return digest.hexdigest()[:24]
+
+    def _path(self, run_id):
+        return os.path.join(self.directory, f"{run_id}.json")
+
+    def load(self, run_id):
+        """Returns {'phases': {...}, 'diagrams': {...}} for a run (empty if none is stored)."""
+        empty = {"phases": {}, "diagrams": {}}
+        if not self.enabled:
+            return empty
+        try:
+            with open(self._path(run_id), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            data.setdefault("phases", {})
+            data.setdefault("diagrams", {})
+            return data
+        except FileNotFoundError:
+            return empty
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable checkpoint {run_id}: {e}")
+            return empty
+
+    def _write(self, run_id, data):
+        os.makedirs(self.directory, exist_ok=True)
+        data["updated"] = time.time()
+        tmp = self._path(run_id) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self._path(run_id))
+
+    def save_phase(self, run_id, phase, content):
+        if not self.enabled:
+            return
+        with self._lock:
+            data = self.load(run_id)
+            data["phases"][phase] = content
+            self._write(run_id, data)
+            self._gc()
+
+    def save_diagram(self, run_id, d_type, content):
+        if not self.enabled:
+            return
+        with self._lock:
+            data = self.load(run_id)
+            data["diagrams"][d_type] = content
+            self._write(run_id, data)
+
+    def invalidate(self, run_id, phase):
+        """Drops a phase and every phase that depends on it ('diagrams' drops only the diagrams)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            data = self.load(run_id)
+            if phase == "diagrams":
+                data["diagrams"] = {}
+            elif phase in self.PHASES:
+                for dependent in self.PHASES[self.PHASES.index(phase):]:
+                    data["phases"].pop(dependent, None)
+            else:
+                raise ValueError(f"Unknown phase '{phase}'. Expected one of {self.PHASES + ['diagrams']}.")
+            self._write(run_id, data)
+
+    def _gc(self):
+        """Keeps only the most recently updated `max_runs` checkpoints."""
+        try:
+            files = [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith(".json")]
+            files.sort(key=os.path.getmtime, reverse=True)
+            for stale in files[self.max_runs:]:
+                os.remove(stale)
+        except Exception as e:
+            logger.warning(f"Checkpoint cleanup failed: {e}")
@@ -2,11 +2,21 @@ import os
 import sys
 import subprocess
 from src.config import logger
+from src.agents.managers.trace_manager import get_tracer
 
 class CommandManager:
     @staticmethod
     def execute_command(cwd, command, timeout=30):
         """Executes a shell command with a robust timeout that kills the entire process group on Windows."""
+        with get_tracer().span("command", kind="command", command=command[:200], timeout=timeout) as span:
+            output, ok = CommandManager._execute(cwd, command, timeout)
+            span.set(output_chars=len(output))
+            if not ok:
+                span.fail("non-zero exit status" if output.startswith("--- STDOUT") else output.splitlines()[0])
+            return output, ok
+
+    @staticmethod
+    def _execute(cwd, command, timeout):
         try:
             creationflags = 0
             if os.name == 'nt':
@@ -44,6 +54,16 @@ class CommandManager:
     @staticmethod
     def spawn_command(cwd, command):
         """Spawns a shell command and returns the Popen process object."""
+        with get_tracer().span("command_spawn", kind="command", command=command[:200]) as span:
+            process = CommandManager._spawn(cwd, command)
+            if process is None:
+                span.fail("spawn failed")
+            else:
+                span.set(pid=process.pid)
+            return process
+
+    @staticmethod
+    def _spawn(cwd, command):
         try:
             creationflags = 0
             if os.name == 'nt':
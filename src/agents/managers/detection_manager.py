@@ -0,0 +1,225 @@
+import os
+import re
+import sys
+from difflib import SequenceMatcher
+from src.config import Config, logger
+from src.agents.managers.phase_scheduler import PhaseNode, PhaseScheduler
+from src.agents.managers.manifest_manager import ManifestManager
+
+FINDING_HEADER = re.compile(r"^###\s+(.+)$", re.MULTILINE)
+
+# Keyword -> severity weight; a finding takes its highest match
+SEVERITY_KEYWORDS = [
+    (5, ("critical", "remote code", "rce", "injection", "arbitrary", "credential", "secret", "hardcoded", "deserializ", "path traversal", "xss", "csrf")),
+    (4, ("security", "vulnerab", "unsafe", "exploit", "authentication", "authorization", "eval(", "shell=true")),
+    (3, ("crash", "exception", "race", "deadlock", "data loss", "corrupt", "infinite", "leak", "null pointer", "undefined", "incorrect", "wrong")),
+    (2, ("performance", "bottleneck", "slow", "n+1", "quadratic", "blocking", "memory")),
+    (1, ("style", "naming", "readability", "unused", "typo")),
+]
+
+class DetectionManager:
+    """Map-reduce bug detection: splits the workspace into token-bounded shards of neighbouring
+    modules, runs Bug_Detection on every shard concurrently across the key pool, then merges the
+    findings into one ranked, de-duplicated report."""
+
+    def __init__(self, runner, factory):
+        self.runner = runner
+        self.factory = factory
+        self.manifests = ManifestManager()
+        self.shard_timings = []
+
+    def shard(self, ranked, budget):
+        """Groups ranked files (see ContextBuilder.rank_files) into shards of at most `budget` tokens.
+        Files are ordered by module so a package stays together; a file larger than the budget gets
+        a (truncated) shard of its own."""
+        builder = self.factory.context_builder
+        ranked = {f["path"]: f for f in ranked}
+        shards = []
+        current, used = [], 0
+        for rel_path in sorted(ranked, key=lambda p: (os.path.dirname(p), p)):
+            cost = ranked[rel_path]["tokens"] + builder.estimate_tokens(f"--- Path: {rel_path} ---")
+            if current and used + cost > budget:
+                shards.append(current)
+                current, used = [], 0
+            current.append(rel_path)
+            used += cost
+        if current:
+            shards.append(current)
+
+        result = []
+        for paths in shards:
+            text, report = builder.pack([(p, ranked[p]["content"]) for p in paths], budget)
+            result.append({
+                "paths": paths,
+                "text": text,
+                "tokens": report["used"],
+                "priority": max(ranked[p]["score"] for p in paths),
+            })
+        # Highest-value shards first, so they start before the pool is saturated
+        result.sort(key=lambda s: -s["priority"])
+        return result
+
+    def run(self, directory, files, structure="", repo_id=None, incremental=True):
+        """Runs detection over every shard. Returns (report, is_err); is_err only if every shard failed.
+        With a `repo_id`, only files changed since the repo's manifest (plus their import dependents)
+        are analyzed; findings of the other files are reused from the manifest. `incremental=False`
+        analyzes everything and refreshes the manifest."""
+        builder = self.factory.context_builder
+        ranked = builder.rank_files(directory, files)
+        all_paths = [f["path"] for f in ranked]
+        targets, cached, manifest, state = ranked, [], None, None
+        if repo_id and self.manifests.enabled:
+            contents = {f["path"]: f["content"] for f in ranked}
+            manifest = self.manifests.load(repo_id)
+            state = self.manifests.scan(contents, builder.import_graph(contents), directory)
+            to_analyze, reusable = self.manifests.plan(manifest, state) if incremental else (set(state), {})
+            targets = [f for f in ranked if f["path"] in to_analyze]
+            cached = self._cached_findings(reusable)
+
+        budget = self.factory.context_budget("detection")
+        shards = self.shard(targets, budget)
+        self.shard_timings = []
+        if not shards and not cached:
+            if manifest is not None and state:
+                # Unchanged repo without findings: nothing to analyze
+                return "Ranked findings: 0 unique (no files changed since the last analysis)", False
+            return "No analyzable files found.", True
+        structure, _ = builder.fit(structure, Config.DETECTION_STRUCTURE_BUDGET)
+        print(f"--- Sharded detection: {len(targets)}/{len(ranked)} files in {len(shards)} shard(s) of <= {budget} tokens ---", file=sys.stderr, flush=True)
+
+        nodes = [PhaseNode(f"shard:{i}", self._shard_func(i, shard, len(shards), structure)) for i, shard in enumerate(shards)]
+        outcomes = PhaseScheduler(Config.DETECTION_SHARD_CONCURRENCY, span_kind="shard", span_name="detection_shard").run(nodes) if nodes else {}
+
+        findings = []
+        failures = []
+        for i, shard in enumerate(shards):
+            outcome = outcomes[f"shard:{i}"]
+            self.shard_timings.append({
+                "shard": i,
+                "files": len(shard["paths"]),
+                "tokens": shard["tokens"],
+                "status": outcome["status"],
+                "start": outcome["start"],
+                "duration": outcome["duration"],
+            })
+            if outcome["status"] != "done":
+                failures.append((i, outcome["output"]))
+                continue
+            for finding in self.split_findings(outcome["output"]):
+                mentioned = self._files_mentioned(finding, all_paths)
+                # Findings that name no file of the shard are owned by all of its files
+                finding.update(shard=i, files=mentioned, owners=(mentioned & set(shard["paths"])) or set(shard["paths"]))
+                findings.append(finding)
+
+        if failures and len(failures) == len(shards) and not cached:
+            return failures[0][1], True
+        for i, error in failures:
+            logger.warning(f"Detection shard {i} failed: {error}")
+
+        if manifest is not None:
+            failed_paths = {p for i, _ in failures for p in shards[i]["paths"]}
+            analyzed = {f["path"] for f in targets} - failed_paths
+            by_file = {}
+            for finding in findings:
+                for owner in finding["owners"]:
+                    by_file.setdefault(owner, []).append({"title": finding["title"], "body": finding["body"]})
+            # Files of failed shards are left out so the next run analyzes them again
+            fresh = {p: entry for p, entry in state.items() if p not in failed_paths}
+            self.manifests.save(repo_id, self.manifests.update(manifest, fresh, by_file, analyzed))
+
+        return self.reduce(findings + cached, total_shards=len(shards), failed=[i for i, _ in failures]), False
+
+    def _cached_findings(self, reusable):
+        """Turns per-file cached findings back into findings, one per distinct (title, body)."""
+        grouped = {}
+        for rel_path, entries in reusable.items():
+            for entry in entries:
+                key = (entry["title"], entry["body"])
+                grouped.setdefault(key, set()).add(rel_path)
+        return [{"title": title, "body": body, "shard": "cache", "files": files, "owners": files} for (title, body), files in grouped.items()]
+
+    def _shard_func(self, index, shard, total, structure):
+        def run(inputs):
+            # Slot 0 (Gemini-first) is shared with the analysis chain; shards spread over the rest
+            runner = self.runner.spawn(index + 1)
+            user_proxy = runner.factory.create_user_proxy()
+            prompt = (
+                f"Repository Summary (shard {index + 1} of {total}):\n{shard['text']}\n\n"
+                f"Project Structure:\n{structure}\n\n"
+                "Task: Locate bugs/vulnerabilities in the files above."
+            )
+            return runner.run_step_with_rotation(runner.factory.create_bug_detection_agent, user_proxy, prompt, f"Bug Detection [shard {index + 1}/{total}]")
+        return run
+
+    def split_findings(self, text):
+        """Splits a detection answer into [{'title', 'body'}] on its '###' headers."""
+        headers = list(FINDING_HEADER.finditer(text))
+        if not headers:
+            return [{"title": text.strip().splitlines()[0][:120], "body": text.strip()}] if text.strip() else []
+        findings = []
+        for header, nxt in zip(headers, headers[1:] + [None]):
+            body = text[header.end():nxt.start() if nxt else len(text)].strip()
+            findings.append({"title": header.group(1).strip(), "body": body})
+        return findings
+
+    @staticmethod
+    def severity(finding):
+        text = f"{finding['title']} {finding['body']}".lower()
+        for weight, keywords in SEVERITY_KEYWORDS:
+            if any(k in text for k in keywords):
+                return weight
+        return 2
+
+    @staticmethod
+    def _normalize(title):
+        title = re.sub(r"[`*_#:\d.\-]+", " ", title.lower())
+        return " ".join(title.split())
+
+    @staticmethod
+    def _files_mentioned(finding, paths):
+        text = f"{finding['title']}\n{finding['body']}"
+        return {p for p in paths if p in text or os.path.basename(p) in text}
+
+    def _same_issue(self, a, b):
+        """Near-identical titles about the same files (or both about no file in particular)."""
+        if a["files"] != b["files"] and not (a["files"] & b["files"]):
+            return False
+        return SequenceMatcher(None, a["key"], b["key"]).ratio() >= Config.DETECTION_DEDUP_SIMILARITY
+
+    def reduce(self, findings, total_shards=None, failed=()):
+        """Merges findings ({'title', 'body', 'shard', 'files'}): near-identical titles about the same
+        files are collapsed (keeping the longest body), then findings are ranked by severity and how
+        many shards reported them."""
+        merged = []
+        for finding in findings:
+            finding = {**finding, "key": self._normalize(finding["title"]), "files": set(finding.get("files", ()))}
+            match = next((m for m in merged if self._same_issue(m, finding)), None)
+            if match:
+                match["shards"].add(finding["shard"])
+                match["files"] |= finding["files"]
+                if len(finding["body"]) > len(match["body"]):
+                    match["body"] = finding["body"]
+                continue
+            merged.append({**finding, "shards": {finding["shard"]}, "severity": self.severity(finding)})
+
+        merged.sort(key=lambda f: (-f["severity"], -len(f["shards"])))
+        builder = self.factory.context_builder
+        remaining = Config.DETECTION_REPORT_BUDGET
+        sections = []
+        for f in merged:
+            section = f"### {f['title']}\n{f['body']}"
+            cost = builder.estimate_tokens(section)
+            if sections and cost > remaining:
+                break
+            sections.append(section)
+            remaining -= cost
+
+        reused = sum(1 for f in merged if f["shards"] == {"cache"})
+        header = f"Ranked findings: {len(merged)} unique across {total_shards or 0} shard(s)"
+        if reused:
+            header += f", {reused} reused from unchanged files"
+        if failed:
+            header += f" ({len(failed)} shard(s) failed)"
+        if len(sections) < len(merged):
+            header += f"; {len(merged) - len(sections)} lower-ranked finding(s) omitted for budget"
+        return header + "\n\n" + "\n\n".join(sections)
@@ -0,0 +1,156 @@
+import os
+import re
+from src.config import Config
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+class Hunk:
+    """One `@@` block of a unified diff: (tag, text) lines with tag in ' ', '-', '+'."""
+
+    def __init__(self, header, old_start):
+        self.header = header
+        self.old_start = old_start
+        self.lines = []
+
+class DiffManager:
+    """Parses unified diffs and applies their hunks locally with offset and fuzz tolerance."""
+
+    def parse(self, diff_text, default_path=None):
+        """Splits diff text into [{'path', 'hunks', 'new_file', 'text'}], where `text` is the diff for that file alone.
+        Hunk line counts are not trusted, since models routinely get them wrong; a hunk runs until the next header."""
+        files = []
+        current = None
+        hunk = None
+        lines = diff_text.splitlines()
+        i = 0
+        while i < len(lines):
+            raw = lines[i]
+            i += 1
+            # A file header is a "---" line immediately followed by "+++"
+            if raw.startswith("--- ") and i < len(lines) and lines[i].startswith("+++ "):
+                old_path = self._clean_path(raw[4:])
+                new_path = self._clean_path(lines[i][4:])
+                i += 1
+                path = new_path if new_path != "/dev/null" else old_path
+                current = {"path": path or default_path, "hunks": [], "new_file": old_path == "/dev/null", "start": i - 2}
+                files.append(current)
+                hunk = None
+                continue
+            match = HUNK_HEADER.match(raw)
+            if match:
+                if current is None:
+                    current = {"path": default_path, "hunks": [], "new_file": match.group(1) == "0", "start": i - 1}
+                    files.append(current)
+                hunk = Hunk(raw, int(match.group(1)))
+                current["hunks"].append(hunk)
+                continue
+            if hunk is None or raw.startswith("\\"):
+                continue
+            if raw.startswith(("diff --git", "index ")):
+                hunk = None
+                continue
+            tag = raw[:1]
+            if tag in (" ", "-", "+"):
+                hunk.lines.append((tag, raw[1:]))
+            else:
+                # Blank context lines often lose their leading space
+                hunk.lines.append((" ", raw))
+        for f, nxt in zip(files, files[1:] + [None]):
+            f["text"] = "\n".join(lines[f.pop("start"):nxt["start"] if nxt else len(lines)])
+        return [f for f in files if f["hunks"]]
+
+    @staticmethod
+    def _clean_path(path):
+        path = path.split("\t")[0].strip()
+        if path == "/dev/null":
+            return path
+        if path.startswith(("a/", "b/")):
+            path = path[2:]
+        return os.path.normpath(path).lstrip("/\\")
+
+    def apply(self, original, hunks, fuzz=None):
+        """Applies hunks in order. Returns (new_content, rejects); rejects lists hunks that could not be placed."""
+        fuzz = Config.DIFF_FUZZ if fuzz is None else fuzz
+        newline = "\r\n" if "\r\n" in original else "\n"
+        lines = original.splitlines()
+        rejects = []
+        offset = 0
+        floor = 0
+        for idx, hunk in enumerate(hunks, 1):
+            placed = self._place(lines, hunk, offset, floor, fuzz)
+            if placed is None:
+                rejects.append({"hunk": idx, "header": hunk.header, "reason": f"context not found (fuzz {fuzz})"})
+                continue
+            pos, hunk_lines, expected = placed
+            replacement = []
+            cursor = pos
+            for tag, text in hunk_lines:
+                if tag == " ":
+                    replacement.append(lines[cursor])
+                    cursor += 1
+                elif tag == "-":
+                    cursor += 1
+                else:
+                    replacement.append(text)
+            lines[pos:cursor] = replacement
+            offset += (pos - expected) + len(replacement) - (cursor - pos)
+            floor = pos + len(replacement)
+        content = newline.join(lines)
+        if lines and (original.endswith(("\n", "\r")) or not original):
+            content += newline
+        return content, rejects
+
+    def _place(self, lines, hunk, offset, floor, fuzz):
+        """Finds where a hunk applies, trimming up to `fuzz` context lines from each end if needed."""
+        for level in range(fuzz + 1):
+            hunk_lines = self._trim_context(hunk.lines, level)
+            if hunk_lines is None:
+                break
+            lead_trim = self._leading_context(hunk.lines) - self._leading_context(hunk_lines)
+            old = [text for tag, text in hunk_lines if tag != "+"]
+            expected = max(hunk.old_start - 1, 0) + offset + lead_trim
+            if not old:
+                return min(max(expected, floor), len(lines)), hunk_lines, expected
+            for normalize in (False, True):
+                pos = self._search(lines, old, expected, floor, normalize)
+                if pos is not None:
+                    return pos, hunk_lines, expected
+        return None
+
+    @staticmethod
+    def _leading_context(hunk_lines):
+        count = 0
+        for tag, _ in hunk_lines:
+            if tag != " ":
+                break
+            count += 1
+        return count
+
+    def _trim_context(self, hunk_lines, level):
+        if level == 0:
+            return list(hunk_lines)
+        lead = self._leading_context(hunk_lines)
+        trail = self._leading_context(list(reversed(hunk_lines)))
+        if lead < level and trail < level:
+            return None
+        start = min(level, lead)
+        end = len(hunk_lines) - min(level, trail)
+        trimmed = hunk_lines[start:end]
+        return trimmed if any(tag != " " for tag, _ in trimmed) else None
+
+    @staticmethod
+    def _search(lines, old, expected, floor, normalize):
+        """Searches outward from the expected line for `old`, nearest match first."""
+        norm = (lambda s: " ".join(s.split())) if normalize else (lambda s: s)
+        target = [norm(l) for l in old]
+        n = len(old)
+        last = len(lines) - n
+        if last < floor:
+            return None
+        expected = min(max(expected, floor), last)
+        for distance in range(0, max(expected - floor, last - expected) + 1):
+            for pos in (expected - distance, expected + distance):
+                if floor <= pos <= last and norm(lines[pos]) == target[0]:
+                    if all(norm(lines[pos + i]) == target[i] for i in range(1, n)):
+                        return pos
+        return None
@@ -2,7 +2,27 @@ import ast
 import re
 from src.config import logger
 
+FENCE = re.compile(r"^\s*```\s*([\w+-]*)")
+IMPORT_LINE = re.compile(r"^\s*(?:import|from)\s+([a-zA-Z0-9_\.]+)")
+
 class GuardManager:
+    @staticmethod
+    def _import_lines(text):
+        """Maps line index -> code for the lines that can introduce imports: every line outside ```diff
+        blocks, but only the added ('+') lines inside them. Context and removed lines are already in the file."""
+        code = {}
+        in_diff = False
+        for i, line in enumerate(text.splitlines()):
+            fence = FENCE.match(line)
+            if fence:
+                in_diff = not in_diff and fence.group(1) == "diff"
+                continue
+            if not in_diff:
+                code[i] = line
+            elif line.startswith("+") and not line.startswith("+++ "):
+                code[i] = line[1:]
+        return code
+
     def check_for_hallucinated_imports(self, patch_text, workspace_files):
         """Strictly validates imports against stdlib, whitelist, and workspace using AST."""
         logger.debug(f"--- Checking Patch (len={len(patch_text)}) ---")
@@ -20,7 +40,11 @@ class GuardManager:
                     if node.module:
                         found_imports.append(node.module)
         except SyntaxError:
-            found_imports = re.findall(r"^\s*(?:import|from)\s+([a-zA-Z0-9_\.]+)", patch_text, re.MULTILINE)
+            # Markdown with code blocks and unified diffs: only lines a patch adds can import anything new
+            for code in self._import_lines(patch_text).values():
+                match = IMPORT_LINE.match(code)
+                if match:
+                    found_imports.append(match.group(1))
         
         logger.debug(f"Found Imports: {found_imports}")
         
@@ -68,11 +92,16 @@ class GuardManager:
         return list(set(detected))
 
     def strip_hallucinated_imports(self, content, hallucinations):
-        """Forcefully removes lines containing hallucinated imports."""
+        """Forcefully removes lines containing hallucinated imports. In ```diff blocks only added lines are
+        removed: context and '-' lines must stay for the hunk to apply."""
         lines = content.splitlines()
+        candidates = self._import_lines(content)
         new_lines = []
-        for line in lines:
+        for i, line in enumerate(lines):
             is_hallucination = False
+            if i not in candidates:
+                new_lines.append(line)
+                continue
             
             if ("import " in line or "from " in line) and any(h in line for h in (hallucinations or [])):
                 is_hallucination = True
@@ -0,0 +1,92 @@
+import time
+import threading
+from src.config import Config, logger
+from src.agents.managers.rate_limiter import RateLimiter, TokenBucket
+
+class HedgeManager:
+    """Decides when a latency-critical LLM call gets a duplicate on a second provider.
+
+    A hedge fires once the primary request has run longer than a percentile of its provider's
+    recent latencies. Hedges are paid from their own per-minute budget, and only when the hedge
+    key is not cooling down and keeps `HEDGE_HEADROOM` of its RPM/TPM for regular traffic, so
+    duplicates never starve the shared key pool."""
+
+    def __init__(self, per_minute=None, percentile=None, headroom=None):
+        self.bucket = TokenBucket(per_minute or Config.HEDGE_PER_MINUTE)
+        self.percentile = percentile if percentile is not None else Config.HEDGE_PERCENTILE
+        self.headroom = headroom if headroom is not None else Config.HEDGE_HEADROOM
+        self.stats = {"eligible": 0, "primary_fast": 0, "issued": 0, "won": 0, "lost": 0, "skipped_budget": 0, "skipped_quota": 0, "no_secondary": 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def applies(phase_name):
+        return Config.HEDGE_ENABLED and phase_name in Config.HEDGE_PHASES
+
+    def delay(self, samples):
+        """Seconds to give the primary request before hedging."""
+        if len(samples) < Config.HEDGE_MIN_SAMPLES:
+            return Config.HEDGE_DEFAULT_DELAY
+        ordered = sorted(samples)
+        return max(Config.HEDGE_MIN_DELAY, ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))])
+
+    def count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    @staticmethod
+    def candidates(config_list, lead):
+        """Config entries a hedge may use, best first: other providers, then other keys of the same one."""
+        provider = RateLimiter.provider_of(lead)
+        others = [c for c in config_list if c.get("api_key") != lead.get("api_key")]
+        return [c for c in others if RateLimiter.provider_of(c) != provider] + [c for c in others if RateLimiter.provider_of(c) == provider]
+
+    def reserve(self, config_list, lead, tokens, key_pool, limiter):
+        """Reserves a key and quota for one hedge. Returns the config entry to use (the caller must
+        `key_pool.release` its api_key) or None when no hedge is allowed right now."""
+        candidates = self.candidates(config_list, lead)
+        if not candidates:
+            self.count("no_secondary")
+            return None
+        with self._lock:
+            if self.bucket.wait_time(1, time.monotonic()) > 0:
+                self.stats["skipped_budget"] += 1
+                return None
+        tried = set()
+        for entry in candidates:
+            provider = RateLimiter.provider_of(entry)
+            if provider in tried:
+                continue
+            tried.add(provider)
+            exclude = (lead.get("api_key"),)
+            if not key_pool.available(provider, exclude=exclude):
+                continue
+            key = key_pool.acquire(provider, exclude=exclude)
+            if not key:
+                continue
+            chosen = {**entry, "api_key": key}
+            if limiter.try_acquire(provider, key, chosen.get("model"), tokens, headroom=self.headroom):
+                with self._lock:
+                    self.bucket.consume(1)
+                    self.stats["issued"] += 1
+                return chosen
+            key_pool.release(key)
+        self.count("skipped_quota")
+        return None
+
+    def snapshot(self):
+        with self._lock:
+            self.bucket._refill(time.monotonic())
+            return {**self.stats, "budget_available": round(self.bucket.tokens, 2)}
+
+_hedger = None
+_hedger_lock = threading.Lock()
+
+def get_hedge_manager():
+    """Returns the process-wide hedge manager (one hedge budget for every runner)."""
+    global _hedger
+    with _hedger_lock:
+        if _hedger is None:
+            _hedger = HedgeManager()
+            if Config.HEDGE_ENABLED:
+                logger.info(f"Hedging enabled for: {', '.join(Config.HEDGE_PHASES)}")
+        return _hedger
@@ -0,0 +1,204 @@
+import os
+import time
+import uuid
+import fnmatch
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from git import Git
+from src.config import Config, logger
+from src.utils.sandbox_manager import COPY_IGNORE, get_sandbox_manager
+from src.agents.orchestrator import Orchestrator
+
+class Job:
+    """One background unit of work: status, streamed progress messages and per-phase states."""
+
+    def __init__(self, key, description):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.description = description
+        self.status = "queued"
+        self.messages = []
+        self.phases = OrderedDict()
+        self.result = None
+        self.error = None
+        self.coalesced = 0
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    def log(self, message):
+        with self._lock:
+            self.messages.append({"time": round(time.time() - self.created, 2), "message": str(message)})
+
+    def set_phase(self, phase, status):
+        with self._lock:
+            self.phases[phase] = status
+
+    def snapshot(self):
+        """A consistent copy for rendering from another thread."""
+        with self._lock:
+            return {
+                "id": self.id,
+                "key": self.key,
+                "description": self.description,
+                "status": self.status,
+                "messages": list(self.messages),
+                "phases": dict(self.phases),
+                "coalesced": self.coalesced,
+                "error": self.error,
+                "created": self.created,
+                "started": self.started,
+                "finished": self.finished,
+                "elapsed": round((self.finished or time.time()) - (self.started or self.created), 1),
+            }
+
+class JobManager:
+    """Process-wide background runner. Jobs live outside the Streamlit script, so reruns, refreshes
+    and other tabs only poll them. Submissions with the key of a job still in flight join that job
+    (singleflight) instead of starting a duplicate; finished jobs are kept for `history` lookups."""
+
+    def __init__(self, max_workers=None, history=None):
+        self.pool = ThreadPoolExecutor(max_workers=max(1, max_workers or Config.JOB_WORKERS), thread_name_prefix="job")
+        self.history = history or Config.JOB_HISTORY
+        self._jobs = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, func, description=""):
+        """Runs `func(job)` in the background, or returns the in-flight job with the same key.
+        `func` reports through `job.log` / `job.set_phase` and returns the job result."""
+        with self._lock:
+            existing = self._inflight.get(key)
+            if existing and not existing.done:
+                existing.coalesced += 1
+                logger.info(f"Job {existing.id}: coalesced a duplicate request for {description or key}")
+                return existing
+            job = Job(key, description)
+            self._jobs[job.id] = job
+            self._inflight[key] = job
+            self._evict()
+        self.pool.submit(self._run, job, func)
+        return job
+
+    def _run(self, job, func):
+        job.status = "running"
+        job.started = time.time()
+        try:
+            job.result = func(job)
+            job.status = "done"
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                if self._inflight.get(job.key) is job:
+                    del self._inflight[job.key]
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        while len(self._jobs) > self.history and finished:
+            del self._jobs[finished.pop(0)]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return [job.snapshot() for job in self._jobs.values()]
+
+    # --- Repository analyses ---
+
+    @staticmethod
+    def analysis_key(repo_url=None, local_path=None, diagram_types=None):
+        """Identifies an analysis by repository content: the remote HEAD commit (or the URL when it
+        cannot be resolved), or a fingerprint of the local tree's paths, sizes and mtimes."""
+        digest = hashlib.sha256()
+        if repo_url:
+            try:
+                head = Git().ls_remote(repo_url, "HEAD").split()[0]
+            except Exception:
+                head = ""
+            digest.update(f"url:{repo_url}:{head}".encode("utf-8"))
+        elif local_path and os.path.isfile(local_path):
+            stat = os.stat(local_path)
+            digest.update(f"file:{os.path.abspath(local_path)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+        elif local_path:
+            root_path = os.path.abspath(local_path)
+            digest.update(f"dir:{root_path}".encode("utf-8"))
+            for root, dirs, files in os.walk(root_path):
+                dirs[:] = sorted(d for d in dirs if not any(fnmatch.fnmatch(d, p) for p in COPY_IGNORE))
+                for name in sorted(files):
+                    if any(fnmatch.fnmatch(name, p) for p in COPY_IGNORE):
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    rel = os.path.relpath(os.path.join(root, name), root_path)
+                    digest.update(f"\0{rel}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+        digest.update(("\0" + ",".join(sorted(diagram_types or []))).encode("utf-8"))
+        return digest.hexdigest()[:24]
+
+    def submit_analysis(self, repo_url=None, local_path=None, diagram_types=None):
+        """Starts (or joins) a background `Orchestrator.analyze_repository` run."""
+        diagram_types = list(diagram_types or [])
+
+        def run(job):
+            # The job holds its workspace until it finishes; sessions claim it when they apply the result
+            owner = f"job:{job.id}"
+            result = Orchestrator().analyze_repository(repo_url, local_path, diagram_types, progress=job.log, phase_listener=job.set_phase, owner=owner)
+            get_sandbox_manager().release(result.get("workspace_dir"), owner)
+            if result.get("error") and "messages" not in result:
+                raise RuntimeError(result["error"])
+            return result
+
+        key = self.analysis_key(repo_url, local_path, diagram_types)
+        return self.submit(key, run, description=repo_url or local_path or "")
+
+    def submit_rerun(self, phase, repo_summary, diagram_types=None, workspace_files=None, workspace_dir=None, repo_id=None, context_report=None):
+        """Starts (or joins) a background `Orchestrator.rerun_phase` on an analyzed workspace.
+        The result has the shape of an analysis result, so the UI applies both the same way."""
+        diagram_types = list(diagram_types or [])
+
+        def run(job):
+            owner = f"job:{job.id}"
+            sandboxes = get_sandbox_manager()
+            sandboxes.claim(workspace_dir, owner)
+            try:
+                job.log(f"Re-running {phase} from checkpoints...")
+                orchestrator = Orchestrator()
+                messages = orchestrator.rerun_phase(repo_summary, phase, bool(diagram_types), diagram_types, workspace_files, workspace_dir, repo_id, phase_listener=job.set_phase)
+            finally:
+                sandboxes.release(workspace_dir, owner)
+            return {
+                "repo_id": repo_id,
+                "workspace_dir": workspace_dir,
+                "workspace_files": workspace_files,
+                "repo_summary": repo_summary,
+                "context_report": context_report,
+                **orchestrator.session_result(messages),
+            }
+
+        key = hashlib.sha256(f"rerun:{workspace_dir}:{phase}:{','.join(sorted(diagram_types))}".encode("utf-8")).hexdigest()[:24]
+        return self.submit(key, run, description=f"Re-run {phase}")
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_job_manager():
+    """Returns the process-wide job manager (it outlives Streamlit reruns and sessions)."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
@@ -0,0 +1,137 @@
+import time
+import threading
+from collections import deque
+from src.config import Config
+
+class KeyHealth:
+    """Rolling health record for one API key."""
+
+    def __init__(self, key, provider):
+        self.key = key
+        self.provider = provider
+        self.cooldown_until = 0.0
+        self.error_rate = 0.0
+        self.latency = None
+        self.latencies = deque(maxlen=Config.KEY_POOL_LATENCY_WINDOW)
+        self.in_flight = 0
+        self.successes = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.last_used = 0.0
+
+    @property
+    def masked(self):
+        return f"{self.key[:8]}...{self.key[-4:]}" if len(self.key) > 12 else "****"
+
+    def score(self):
+        """Lower is healthier: penalizes concurrent use, recent errors and slow responses."""
+        latency = self.latency if self.latency is not None else 0.0
+        return self.in_flight + 2.0 * self.error_rate + latency / 10.0
+
+class KeyPool:
+    """Process-wide, thread-safe scheduler that hands each request the healthiest available key.
+
+    Keys are registered per provider. Health (cooldown expiry after 429s, EWMA error rate and
+    latency, in-flight requests) is shared by every AgentFactory in the process."""
+
+    def __init__(self):
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def register(self, keys, provider="groq"):
+        with self._lock:
+            for key in keys:
+                if key and key not in self._keys:
+                    self._keys[key] = KeyHealth(key, provider)
+
+    def acquire(self, provider="groq", exclude=()):
+        """Reserves and returns the healthiest key of a provider, or None if none is registered.
+        Keys cooling down after a rate limit are only handed out when every key is cooling."""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [h for h in self._keys.values() if h.provider == provider and h.key not in exclude]
+            if not candidates:
+                return None
+            ready = [h for h in candidates if h.cooldown_until <= now]
+            if ready:
+                best = min(ready, key=lambda h: (h.score(), h.last_used))
+            else:
+                best = min(candidates, key=lambda h: h.cooldown_until)
+            best.in_flight += 1
+            best.last_used = now
+            return best.key
+
+    def release(self, key):
+        """Ends a reservation made by `acquire`."""
+        with self._lock:
+            health = self._keys.get(key)
+            if health and health.in_flight > 0:
+                health.in_flight -= 1
+
+    def record(self, key, latency=None, error=False, rate_limited=False, retry_after=None):
+        """Folds the outcome of one call into the key's health."""
+        alpha = Config.KEY_POOL_EWMA_ALPHA
+        with self._lock:
+            health = self._keys.get(key)
+            if not health:
+                return
+            health.error_rate = (1 - alpha) * health.error_rate + alpha * (1.0 if error or rate_limited else 0.0)
+            if error or rate_limited:
+                health.failures += 1
+            else:
+                health.successes += 1
+            if latency is not None and not error:
+                health.latencies.append(latency)
+                health.latency = latency if health.latency is None else (1 - alpha) * health.latency + alpha * latency
+            if rate_limited:
+                health.rate_limited += 1
+                cooldown = retry_after if retry_after is not None else Config.RATE_LIMIT_DEFAULT_COOLDOWN
+                health.cooldown_until = max(health.cooldown_until, time.monotonic() + cooldown)
+
+    def available(self, provider="groq", exclude=()):
+        """Number of keys of a provider that are not cooling down."""
+        with self._lock:
+            now = time.monotonic()
+            return sum(1 for h in self._keys.values() if h.provider == provider and h.key not in exclude and h.cooldown_until <= now)
+
+    def latency_samples(self, provider):
+        """Recent successful-call latencies across all keys of a provider."""
+        with self._lock:
+            samples = []
+            for h in self._keys.values():
+                if h.provider == provider:
+                    samples.extend(h.latencies)
+            return samples
+
+    def snapshot(self):
+        """Returns the pool state (masked keys) for monitoring."""
+        with self._lock:
+            now = time.monotonic()
+            return [{
+                "key": h.masked,
+                "provider": h.provider,
+                "in_flight": h.in_flight,
+                "cooldown_remaining": round(max(0.0, h.cooldown_until - now), 2),
+                "error_rate": round(h.error_rate, 3),
+                "latency": round(h.latency, 3) if h.latency is not None else None,
+                "successes": h.successes,
+                "failures": h.failures,
+                "rate_limited": h.rate_limited,
+            } for h in self._keys.values()]
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_key_pool():
+    """Returns the process-wide key pool shared by all sessions and worker threads."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = KeyPool()
+        return _pool
+
+def install_key_pool(pool):
+    """Replaces the process-wide key pool, e.g. with a proxy to a pool shared across processes."""
+    global _pool
+    with _pool_lock:
+        _pool = pool
@@ -0,0 +1,115 @@
+import os
+import re
+import ast
+import json
+import time
+import hashlib
+import threading
+from src.config import Config, logger
+from src.utils.file_reader import file_digest
+
+JS_EXPORT = re.compile(r"^\s*export\s+(?:default\s+)?(?:async\s+)?(?:function\*?|class|const|let|var)\s+(\w+)[^\n{=]*", re.MULTILINE)
+
+class ManifestManager:
+    """Per-repository manifest of file content hashes, public-symbol digests, imports and the
+    findings each file produced. Comparing a new scan with it tells which files need re-analysis:
+    the changed ones, plus the files importing a changed file whose symbols (interface) changed."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or Config.MANIFEST_DIR
+        self.enabled = Config.INCREMENTAL_ENABLED
+        self._lock = threading.Lock()
+
+    def _path(self, repo_id):
+        return os.path.join(self.directory, hashlib.sha256(repo_id.encode("utf-8")).hexdigest()[:24] + ".json")
+
+    def load(self, repo_id):
+        """Returns {'repo', 'files': {path: entry}} (empty when nothing is stored)."""
+        empty = {"repo": repo_id, "files": {}}
+        if not self.enabled or not repo_id:
+            return empty
+        try:
+            with open(self._path(repo_id), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            data.setdefault("files", {})
+            return data
+        except FileNotFoundError:
+            return empty
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable manifest for {repo_id}: {e}")
+            return empty
+
+    def save(self, repo_id, manifest):
+        if not self.enabled or not repo_id:
+            return
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            manifest["updated"] = time.time()
+            tmp = self._path(repo_id) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(tmp, self._path(repo_id))
+
+    @staticmethod
+    def symbol_digest(rel_path, content):
+        """Digest of a file's interface: signatures of top-level functions/classes/methods and
+        module-level names. Edits inside bodies keep it stable, so importers are not re-analyzed."""
+        symbols = []
+        if rel_path.endswith(".py"):
+            try:
+                tree = ast.parse(content)
+            except SyntaxError:
+                return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+            for node in tree.body:
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    symbols.append(f"def {node.name}{ast.dump(node.args)}")
+                elif isinstance(node, ast.ClassDef):
+                    symbols.append(f"class {node.name}{[ast.dump(b) for b in node.bases]}")
+                    for member in node.body:
+                        if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                            symbols.append(f"{node.name}.{member.name}{ast.dump(member.args)}")
+                elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+                    targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                    symbols.extend(t.id for t in targets if isinstance(t, ast.Name))
+        else:
+            symbols = [" ".join(m.group(0).split()) for m in JS_EXPORT.finditer(content)]
+        return hashlib.sha256("\n".join(symbols).encode("utf-8")).hexdigest()[:16]
+
+    def scan(self, contents, graph, directory=None):
+        """Builds the current entry (hash, symbols, imports) of every file from its content and import graph.
+        `contents` may be bounded prefixes (see FileReader): with the workspace `directory`, the hash
+        streams the whole file instead, so an edit past the prefix still marks the file changed."""
+        state = {}
+        for rel_path, content in contents.items():
+            digest = file_digest(os.path.join(directory, rel_path)) if directory else None
+            state[rel_path] = {
+                "hash": digest or hashlib.sha256(content.encode("utf-8")).hexdigest(),
+                "symbols": self.symbol_digest(rel_path, content),
+                "imports": sorted(graph.get(rel_path, ())),
+            }
+        return state
+
+    def plan(self, manifest, state):
+        """Returns (to_analyze, reusable) where `reusable` maps unchanged paths to their cached findings."""
+        previous = manifest["files"]
+        changed = {p for p, entry in state.items() if previous.get(p, {}).get("hash") != entry["hash"]}
+        removed = set(previous) - set(state)
+        # Only an interface change (or a removed module) can invalidate what importers do
+        interface_changed = {p for p in changed if previous.get(p, {}).get("symbols") != state[p]["symbols"]} | removed
+        # A deleted module no longer resolves in the current graph: its importers are found by their previous imports
+        dependents = {p for p, entry in state.items() if interface_changed & (set(entry["imports"]) | set(previous.get(p, {}).get("imports", ())))}
+        to_analyze = changed | dependents
+        reusable = {p: previous[p].get("findings", []) for p in state if p not in to_analyze}
+        logger.info(f"Incremental plan: {len(changed)} changed, {len(dependents - changed)} dependent(s), {len(removed)} removed, {len(reusable)} reused")
+        return to_analyze, reusable
+
+    def update(self, manifest, state, findings_by_file, analyzed):
+        """Returns the next manifest: fresh findings for analyzed files, cached ones for the rest."""
+        files = {}
+        for rel_path, entry in state.items():
+            if rel_path in analyzed:
+                findings = findings_by_file.get(rel_path, [])
+            else:
+                findings = manifest["files"].get(rel_path, {}).get("findings", [])
+            files[rel_path] = {**entry, "findings": findings}
+        return {"repo": manifest["repo"], "files": files}
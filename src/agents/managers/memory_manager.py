@@ -0,0 +1,103 @@
+import re
+import threading
+from collections import OrderedDict
+from src.config import Config, logger
+from src.utils.context_builder import ContextBuilder
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+class ConversationMemory:
+    """Bounded chat memory for one session: the last turns are kept verbatim and older turns are
+    folded into a running summary. Folding is incremental, so each turn only summarizes the
+    messages that just aged out."""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.summary = ""
+        self.folded = 0
+        self._lock = threading.Lock()
+
+    def render(self, history, summarizer=None):
+        """Returns the memory block for a prompt. `history` is [{'role', 'content'}] of earlier messages;
+        `summarizer(previous_summary, transcript)` returns a new summary or None (extractive fallback)."""
+        with self._lock:
+            if len(history) < self.folded:
+                # The chat was cleared or replaced: start over
+                self.summary, self.folded = "", 0
+
+            keep = self._verbatim_start(history)
+            if keep > self.folded:
+                self._fold(history[self.folded:keep], summarizer)
+                self.folded = keep
+
+            parts = []
+            if self.summary:
+                parts.append(f"Conversation summary (earlier turns):\n{self.summary}")
+            recent = history[self.folded:]
+            if recent:
+                parts.append("Recent turns:\n" + "\n".join(self._line(m) for m in recent))
+            return "\n\n".join(parts)
+
+    def _verbatim_start(self, history):
+        """Index of the first message kept verbatim: at most CHAT_MEMORY_TURNS turns, within the budget."""
+        start = max(0, len(history) - 2 * Config.CHAT_MEMORY_TURNS)
+        budget = Config.CHAT_MEMORY_BUDGET - ContextBuilder.estimate_tokens(self.summary)
+        while start < len(history) and sum(ContextBuilder.estimate_tokens(self._line(m)) for m in history[start:]) > budget:
+            start += 1
+        return max(start, self.folded)
+
+    def _fold(self, messages, summarizer):
+        transcript = "\n".join(self._line(m) for m in messages)
+        summary = None
+        if summarizer:
+            try:
+                summary = summarizer(self.summary, transcript)
+            except Exception as e:
+                logger.warning(f"Memory summarizer failed, using extractive summary: {e}")
+        if not summary:
+            lines = [self.summary] if self.summary else []
+            lines.extend(self._extract(m) for m in messages)
+            summary = "\n".join(lines)
+        self.summary = self._bound(summary.strip(), Config.CHAT_SUMMARY_BUDGET)
+
+    @staticmethod
+    def _line(message):
+        role = "User" if message.get("role") == "user" else "Assistant"
+        return f"{role}: {message.get('content', '')}"
+
+    @staticmethod
+    def _extract(message):
+        """First sentence of a message (code blocks skipped), capped at ~40 tokens."""
+        text = re.sub(r"```.*?```", " ", message.get("content", ""), flags=re.DOTALL)
+        text = " ".join(text.split())
+        first = SENTENCE_END.split(text, 1)[0] if text else ""
+        words = first.split()
+        if len(words) > 30:
+            first = " ".join(words[:30]) + " ..."
+        role = "User asked" if message.get("role") == "user" else "Assistant answered"
+        return f"- {role}: {first}"
+
+    @staticmethod
+    def _bound(summary, budget):
+        """Keeps the most recent summary lines that fit the budget."""
+        lines = summary.splitlines()
+        while len(lines) > 1 and ContextBuilder.estimate_tokens("\n".join(lines)) > budget:
+            lines.pop(0)
+        text, _ = ContextBuilder().fit("\n".join(lines), budget)
+        return text
+
+_memories = OrderedDict()
+_memories_lock = threading.Lock()
+
+def get_memory(session_id):
+    """Returns the cached memory of a chat session (least recently used sessions are evicted)."""
+    with _memories_lock:
+        memory = _memories.get(session_id)
+        if memory is None:
+            memory = ConversationMemory(session_id)
+            _memories[session_id] = memory
+            while len(_memories) > Config.CHAT_MEMORY_MAX_SESSIONS:
+                _memories.popitem(last=False)
+        else:
+            _memories.move_to_end(session_id)
+        return memory
@@ -0,0 +1,275 @@
+import ast
+import re
+import threading
+
+DEF_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+IMPORT_NODES = (ast.Import, ast.ImportFrom)
+
+class MergeManager:
+    """Deterministic merge engine: splices top-level functions, classes, methods and imports
+    from a patch into the original file by AST node span, keeping the surrounding formatting.
+    Returns None whenever a patch cannot be mapped structurally so the caller can fall back to the LLM."""
+
+    # Patches that elide code ("# ... existing code ...") are partial and must not replace whole nodes
+    PLACEHOLDER_PATTERN = re.compile(
+        r"#\s*\.\.\.|#.*\b(existing code|rest of (the )?(code|file|class|function)|unchanged|remains? the same)\b",
+        re.IGNORECASE
+    )
+
+    def __init__(self):
+        self.local_merges = 0
+        self.llm_merges = 0
+        self.diff_merges = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+
+    def record(self, local, original="", patches=None):
+        """Counts a merge; local merges also credit the prompt tokens the LLM round-trip would have cost."""
+        with self._lock:
+            if local:
+                self.local_merges += 1
+                self.tokens_saved += (len(original) * 2 + sum(len(p) for p in (patches or []))) // 4
+            else:
+                self.llm_merges += 1
+
+    def record_diff(self):
+        """Counts a file patched from unified diffs; those never had a Patch_Applier round-trip to save."""
+        with self._lock:
+            self.diff_merges += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.local_merges + self.llm_merges
+            return {
+                "local_merges": self.local_merges,
+                "llm_merges": self.llm_merges,
+                "diff_merges": self.diff_merges,
+                "local_ratio": round(self.local_merges / total, 3) if total else 0.0,
+                "estimated_tokens_saved": self.tokens_saved,
+            }
+
+    def merge_all(self, original, patch_codes, path=""):
+        """Applies every patch in order. Returns the merged content or None if any patch needs the LLM."""
+        if not original.strip():
+            return "\n\n\n".join(p.strip("\n") for p in patch_codes) + "\n"
+        if not path.endswith(".py"):
+            return None
+        content = original
+        for patch_code in patch_codes:
+            content = self.merge(content, patch_code)
+            if content is None:
+                return None
+        return content
+
+    def merge(self, original, patch_code):
+        """Merges a single patch into `original`. Returns the new content or None."""
+        if self.PLACEHOLDER_PATTERN.search(patch_code):
+            return None
+        try:
+            orig_tree = ast.parse(original)
+            patch_tree = ast.parse(patch_code)
+        except SyntaxError:
+            return None
+
+        newline = "\r\n" if "\r\n" in original else "\n"
+        lines = original.splitlines()
+        patch_lines = patch_code.splitlines()
+
+        top_defs = {n.name: n for n in orig_tree.body if isinstance(n, DEF_NODES)}
+        top_assigns = {}
+        for n in orig_tree.body:
+            name = self._assign_name(n)
+            if name:
+                top_assigns[name] = n
+        existing_imports = {ast.dump(n) for n in orig_tree.body if isinstance(n, IMPORT_NODES)}
+        existing_stmts = {ast.dump(n) for n in orig_tree.body}
+
+        edits = []
+        new_imports = []
+        appends = []
+        for idx, node in enumerate(patch_tree.body):
+            segment = self._segment(patch_lines, node)
+            if isinstance(node, IMPORT_NODES):
+                if ast.dump(node) not in existing_imports:
+                    new_imports.append(segment)
+            elif isinstance(node, DEF_NODES):
+                target = top_defs.get(node.name)
+                if target is not None and isinstance(target, ast.ClassDef) != isinstance(node, ast.ClassDef):
+                    return None
+                if isinstance(node, ast.ClassDef) and target is not None:
+                    class_edits = self._merge_class(lines, target, patch_lines, node)
+                    if class_edits is None:
+                        return None
+                    edits.extend(class_edits)
+                elif target is not None:
+                    edits.append(self._replace(lines, target, segment, node))
+                elif self._is_method(node):
+                    method_edit = self._replace_method(lines, orig_tree, node, segment)
+                    if method_edit is None:
+                        return None
+                    edits.append(method_edit)
+                else:
+                    appends.append(segment)
+            elif idx == 0 and self._is_docstring(node):
+                continue
+            elif ast.dump(node) in existing_stmts:
+                continue
+            elif self._assign_name(node) in top_assigns:
+                edits.append(self._replace(lines, top_assigns[self._assign_name(node)], segment, node))
+            else:
+                return None
+
+        if not self._non_overlapping(edits):
+            return None
+
+        for start, end, new_lines in sorted(edits, key=lambda e: e[0], reverse=True):
+            lines[start:end] = new_lines
+
+        if new_imports:
+            insert_at = self._import_insert_line(lines)
+            for segment in reversed(new_imports):
+                lines[insert_at:insert_at] = segment
+
+        for segment in appends:
+            while lines and not lines[-1].strip():
+                lines.pop()
+            lines.extend(["", ""] + segment)
+
+        merged = newline.join(lines) + newline
+        try:
+            ast.parse(merged)
+        except SyntaxError:
+            return None
+        return merged
+
+    def _merge_class(self, lines, target, patch_lines, node):
+        """Member-wise merge of a patched class into the original one. Returns a list of edits or None."""
+        if self._header(target) != self._header(node):
+            return None
+        orig_members = {m.name: m for m in target.body if isinstance(m, (ast.FunctionDef, ast.AsyncFunctionDef))}
+        patch_members = {m.name: m for m in node.body if isinstance(m, (ast.FunctionDef, ast.AsyncFunctionDef))}
+        orig_stmts = {ast.dump(m) for m in target.body}
+        # A patch restating every method, and every other statement (attributes, docstring...) unchanged,
+        # is a full replacement of the class; anything it leaves out goes through the member-wise merge
+        patch_stmts = {ast.dump(m) for m in node.body}
+        kept = all(ast.dump(m) in patch_stmts for m in target.body if not isinstance(m, (ast.FunctionDef, ast.AsyncFunctionDef)))
+        if set(orig_members) <= set(patch_members) and kept:
+            return [self._replace(lines, target, self._segment(patch_lines, node), node)]
+
+        member_indent = self._indent(lines[target.body[0].lineno - 1])
+        edits = []
+        additions = []
+        for idx, member in enumerate(node.body):
+            segment = self._segment(patch_lines, member)
+            if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                if member.name in orig_members:
+                    edits.append(self._replace(lines, orig_members[member.name], segment, member))
+                else:
+                    additions.extend([""] + self._reindent(segment, member.col_offset, member_indent))
+            elif ast.dump(member) in orig_stmts or (idx == 0 and self._is_docstring(member)):
+                continue
+            else:
+                return None
+        if additions:
+            end = target.end_lineno
+            edits.append((end, end, additions))
+        return edits
+
+    def _replace_method(self, lines, orig_tree, node, segment):
+        """Maps a bare `def name(self, ...)` patch onto the single class that defines that method."""
+        matches = []
+        for cls in orig_tree.body:
+            if isinstance(cls, ast.ClassDef):
+                for member in cls.body:
+                    if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)) and member.name == node.name:
+                        matches.append(member)
+        if len(matches) != 1:
+            return None
+        return self._replace(lines, matches[0], segment, node)
+
+    def _replace(self, lines, target, segment, node):
+        start = self._start_line(target)
+        if getattr(target, "decorator_list", None) and not getattr(node, "decorator_list", None):
+            # Patch restates only the body: keep the original decorators
+            start = target.lineno - 1
+        indent = self._indent(lines[start])
+        return (start, target.end_lineno, self._reindent(segment, node.col_offset, indent))
+
+    @staticmethod
+    def _start_line(node):
+        """0-based first line of a node, including its decorators."""
+        decorators = getattr(node, "decorator_list", [])
+        return min([node.lineno] + [d.lineno for d in decorators]) - 1
+
+    def _segment(self, source_lines, node):
+        return source_lines[self._start_line(node):node.end_lineno]
+
+    @staticmethod
+    def _indent(line):
+        return line[:len(line) - len(line.lstrip())]
+
+    @staticmethod
+    def _reindent(segment, col_offset, indent):
+        if not segment:
+            return segment
+        current = segment[0][:col_offset]
+        if current == indent:
+            return list(segment)
+        out = []
+        for line in segment:
+            if not line.strip():
+                out.append("")
+            elif line.startswith(current):
+                out.append(indent + line[len(current):])
+            else:
+                out.append(indent + line.lstrip())
+        return out
+
+    @staticmethod
+    def _header(node):
+        return (
+            [ast.dump(b) for b in node.bases],
+            [ast.dump(k) for k in node.keywords],
+            [ast.dump(d) for d in node.decorator_list],
+        )
+
+    @staticmethod
+    def _is_method(node):
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return False
+        args = node.args.posonlyargs + node.args.args
+        return bool(args) and args[0].arg in ("self", "cls")
+
+    @staticmethod
+    def _is_docstring(node):
+        return isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+
+    @staticmethod
+    def _assign_name(node):
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            return node.targets[0].id
+        if isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+            return node.target.id
+        return None
+
+    @staticmethod
+    def _non_overlapping(edits):
+        spans = sorted((start, end) for start, end, _ in edits)
+        for (s1, e1), (s2, e2) in zip(spans, spans[1:]):
+            if s2 < e1 or (s1 == s2 and e1 == e2):
+                return False
+        return True
+
+    @staticmethod
+    def _import_insert_line(lines):
+        """Line index after the last top-level import (or after the module docstring)."""
+        try:
+            tree = ast.parse("\n".join(lines))
+        except SyntaxError:
+            return 0
+        imports = [n for n in tree.body if isinstance(n, IMPORT_NODES)]
+        if imports:
+            return imports[-1].end_lineno
+        if tree.body and MergeManager._is_docstring(tree.body[0]):
+            return tree.body[0].end_lineno
+        return 0
@@ -1,83 +1,177 @@
 import os
 import re
 import ast
-from src.config import logger
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from src.config import Config, logger
+from src.agents.managers.merge_manager import MergeManager
+from src.agents.managers.diff_manager import DiffManager
+from src.agents.managers.trace_manager import get_tracer
+from src.utils.sandbox_manager import detach, get_sandbox_manager
 
 class PatchManager:
     def __init__(self, runner, factory, guard_manager):
         self.runner = runner
         self.factory = factory
         self.guard_manager = guard_manager
+        self.merge_manager = MergeManager()
+        self.diff_manager = DiffManager()
+        self.tracer = get_tracer()
 
     def parse_patches(self, patch_generator_output):
-        """Extracts file paths and code patches from the agent output with robust path normalization."""
-        patches = []
-        pattern = r"#### \[FILE\]\s*(.*?)\s*\n.*?```python\n(.*?)\n```"
-        matches = re.finditer(pattern, patch_generator_output, re.DOTALL)
-        for match in matches:
+        """Extracts file paths and code patches from the agent output with robust path normalization.
+        Accepts full ```python blocks and unified diffs (```diff), with or without a #### [FILE] header."""
+        found = []
+        claimed = []
+        pattern = r"#### \[FILE\]\s*(.*?)\s*\n.*?```(python|diff)\n(.*?)\n```"
+        for match in re.finditer(pattern, patch_generator_output, re.DOTALL):
             rel_path = os.path.normpath(match.group(1).strip()).lstrip("/\\")
-            patches.append({
-                "path": rel_path,
-                "patch_code": match.group(2).strip()
-            })
-        return patches
+            claimed.append(match.span())
+            if match.group(2) == "python":
+                found.append((match.start(), {"path": rel_path, "patch_code": match.group(3).strip()}))
+            else:
+                for file_diff in self.diff_manager.parse(match.group(3), default_path=rel_path):
+                    found.append((match.start(), self._diff_patch(rel_path, file_diff)))
+        
+        # Bare ```diff blocks carry their target paths in the ---/+++ headers
+        for match in re.finditer(r"```diff\n(.*?)\n```", patch_generator_output, re.DOTALL):
+            if any(start <= match.start() < end for start, end in claimed):
+                continue
+            for file_diff in self.diff_manager.parse(match.group(1)):
+                if file_diff["path"]:
+                    found.append((match.start(), self._diff_patch(file_diff["path"], file_diff)))
+        
+        return [patch for _, patch in sorted(found, key=lambda item: item[0])]
+
+    @staticmethod
+    def _diff_patch(rel_path, file_diff):
+        return {"path": rel_path, "format": "diff", "patch_code": file_diff["text"].strip()}
+
+    def group_patches(self, patches):
+        """Groups patches by target path (first-appearance order) so each file is merged exactly once."""
+        groups = {}
+        for p in patches:
+            groups.setdefault(p["path"], []).append(p)
+        return list(groups.items())
 
     def apply_patches_to_dir(self, patches, base_dir, workspace_files=None):
-        """Applies a list of patches to files in the specified directory, creating new files if needed."""
+        """Applies a list of patches to files in the specified directory, creating new files if needed.
+        Independent files are merged concurrently; results follow the order files first appear in `patches`."""
+        groups = self.group_patches(patches)
+        if not groups:
+            return []
+        get_sandbox_manager().touch(base_dir)
+        
+        workers = max(1, min(Config.PATCH_CONCURRENCY, len(groups)))
         results = []
-        user_proxy = self.factory.create_user_proxy()
+        with self.tracer.span("apply_patches", kind="patches", files=len(groups), patches=len(patches)):
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(contextvars.copy_context().run, self._traced_apply, rel_path, file_patches, base_dir, workspace_files, slot)
+                    for slot, (rel_path, file_patches) in enumerate(groups)
+                ]
+                for (rel_path, _), future in zip(groups, futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        results.append({"path": rel_path, "status": f"Error: {str(e)}"})
+        return results
+
+    def _traced_apply(self, rel_path, file_patches, base_dir, workspace_files, slot):
+        """Merges one file inside a 'patch_merge' span carrying the merge mode and outcome."""
+        with self.tracer.span("patch_merge", kind="merge", path=rel_path, patches=len(file_patches)) as span:
+            result = self._apply_file_patches(rel_path, file_patches, base_dir, workspace_files, slot)
+            span.set(merge_mode=result.get("merge_mode", "none"), result=result["status"][:120])
+            if result["status"] != "Success":
+                span.fail(result["status"])
+            return result
+
+    def _build_merge_prompt(self, rel_path, original_content, file_patches):
+        if len(file_patches) == 1:
+            patch_section = f"PROPOSED PATCH:\n```python\n{file_patches[0]['patch_code']}\n```"
+        else:
+            blocks = "\n\n".join(f"PATCH {i}:\n```python\n{p['patch_code']}\n```" for i, p in enumerate(file_patches, 1))
+            patch_section = f"PROPOSED PATCHES (apply ALL of them):\n{blocks}"
         
-        for p in patches:
-            rel_path = p["path"]
-            full_path = os.path.join(base_dir, rel_path)
+        if not original_content:
+            code = "\n\n".join(p["patch_code"] for p in file_patches)
+            return f"Task: Create a new file at {rel_path} with the following content:\n```python\n{code}\n```"
+        return f"ORIGINAL CONTENT:\n```python\n{original_content}\n```\n\n{patch_section}\n\nTask: Merge them into a complete file."
+
+    def _apply_file_patches(self, rel_path, file_patches, base_dir, workspace_files, slot):
+        """Merges every patch targeting one file in a single Patch_Applier round-trip on its own runner."""
+        full_path = os.path.join(base_dir, rel_path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        
+        try:
+            original_content = ""
+            if os.path.exists(full_path):
+                with open(full_path, "r", encoding="utf-8") as f:
+                    original_content = f.read()
             
-            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            # Unified diffs apply locally; rejected hunks fail the file rather than guessing
+            diff_patches = [p for p in file_patches if p.get("format") == "diff"]
+            code_patches = [p for p in file_patches if p.get("format") != "diff"]
+            base_content = original_content
+            for p in diff_patches:
+                hunks = [h for file_diff in self.diff_manager.parse(p["patch_code"], default_path=rel_path) for h in file_diff["hunks"]]
+                base_content, rejects = self.diff_manager.apply(base_content, hunks)
+                if rejects:
+                    details = "; ".join(f"hunk {r['hunk']} {r['header']}: {r['reason']}" for r in rejects)
+                    return {"path": rel_path, "status": f"Rejected: {len(rejects)} of {len(hunks)} hunk(s) did not apply ({details})", "rejects": rejects, "merge_mode": "diff"}
             
-            try:
-                original_content = ""
-                if os.path.exists(full_path):
-                    with open(full_path, "r", encoding="utf-8") as f:
-                        original_content = f.read()
-                
-                if not original_content:
-                    prompt = f"Task: Create a new file at {rel_path} with the following content:\n```python\n{p['patch_code']}\n```"
-                else:
-                    prompt = f"ORIGINAL CONTENT:\n```python\n{original_content}\n```\n\nPROPOSED PATCH:\n```python\n{p['patch_code']}\n```\n\nTask: Merge them into a complete file."
-                
-                msg, is_err = self.runner.run_step_with_rotation(self.factory.create_patch_applier_agent, user_proxy, prompt, f"Applying Patch to {rel_path}")
+            # Structural merge next; only unmappable patches pay for a Patch_Applier round-trip
+            patch_codes = [p["patch_code"] for p in code_patches]
+            new_content = self.merge_manager.merge_all(base_content, patch_codes, rel_path) if patch_codes else base_content
+            merge_mode = ("diff" if not patch_codes else "local") if new_content is not None else "llm"
+            if diff_patches:
+                self.merge_manager.record_diff()
+            if patch_codes:
+                self.merge_manager.record(new_content is not None, base_content, patch_codes)
+            
+            if new_content is None:
+                runner = self.runner.spawn(slot)
+                user_proxy = runner.factory.create_user_proxy()
+                prompt = self._build_merge_prompt(rel_path, base_content, code_patches)
+                msg, is_err = runner.run_step_with_rotation(runner.factory.create_patch_applier_agent, user_proxy, prompt, f"Applying Patch to {rel_path}")
                 
                 if is_err:
-                    results.append({"path": rel_path, "status": f"Error: {msg}"})
-                    continue
+                    return {"path": rel_path, "status": f"Error: {msg}", "merge_mode": merge_mode}
                 
                 code_match = re.search(r"```python\n(.*?)\n```", msg, re.DOTALL)
                 new_content = code_match.group(1).strip() if code_match else msg.strip()
-                
-                hallucinations = self.guard_manager.check_for_hallucinated_imports(new_content, [rel_path] + (workspace_files or []))
-                if hallucinations:
-                    logger.warning(f"🛡️ Nuclear Guard: Stripping persistent hallucinations in merge: {hallucinations}")
-                    new_content = self.guard_manager.strip_hallucinated_imports(new_content, hallucinations)
-                
-                with open(full_path, "w", encoding="utf-8") as f:
-                    f.write(new_content)
-                
-                syntax_ok, syntax_err = self.validate_syntax(new_content, rel_path)
-                
-                if not syntax_ok:
-                    results.append({"path": rel_path, "status": f"Syntax Error: {syntax_err}"})
-                else:
-                    results.append({
-                        "path": rel_path, 
-                        "status": "Success", 
-                        "new_content": new_content, 
-                        "old_content": original_content,
-                        "syntax_ok": syntax_ok,
-                        "syntax_error": syntax_err
-                    })
-            except Exception as e:
-                results.append({"path": rel_path, "status": f"Error: {str(e)}"})
-        
-        return results
+            else:
+                logger.info(f"Merged {len(file_patches)} patch(es) into {rel_path} locally.")
+            
+            hallucinations = self.guard_manager.check_for_hallucinated_imports(new_content, [rel_path] + (workspace_files or []))
+            if hallucinations:
+                logger.warning(f"🛡️ Nuclear Guard: Stripping persistent hallucinations in merge: {hallucinations}")
+                new_content = self.guard_manager.strip_hallucinated_imports(new_content, hallucinations)
+            
+            # Sandbox files may still be hardlinks to the user's original
+            detach(full_path)
+            with open(full_path, "w", encoding="utf-8") as f:
+                f.write(new_content)
+            
+            syntax_ok, syntax_err = self.validate_syntax(new_content, rel_path)
+            
+            if not syntax_ok:
+                return {"path": rel_path, "status": f"Syntax Error: {syntax_err}", "merge_mode": merge_mode}
+            return {
+                "path": rel_path, 
+                "status": "Success", 
+                "new_content": new_content, 
+                "old_content": original_content,
+                "syntax_ok": syntax_ok,
+                "syntax_error": syntax_err,
+                "merge_mode": merge_mode
+            }
+        except Exception as e:
+            return {"path": rel_path, "status": f"Error: {str(e)}"}
+
+    def merge_stats(self):
+        """Returns how many merges were handled locally vs. by the LLM, and the tokens saved."""
+        return self.merge_manager.stats()
 
     def validate_syntax(self, code, path):
         """Checks if the code is syntactically correct (Python only for now)."""
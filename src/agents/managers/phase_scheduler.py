@@ -0,0 +1,89 @@
+import sys
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from src.config import logger
+from src.agents.managers.trace_manager import get_tracer
+
+class PhaseNode:
+    """A unit of orchestrator work. `func(inputs)` receives the outputs of the nodes named in
+    `requires` (as a dict) and returns (output, is_err)."""
+
+    def __init__(self, name, func, requires=()):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+
+class PhaseScheduler:
+    """Runs a DAG of PhaseNodes, starting every node whose inputs are ready on a bounded pool.
+    A failed node skips everything downstream of it; independent branches keep running.
+    Each node runs in a span of `span_kind` (named after the node, or `span_name` for all nodes).
+    `listener(name, status)` is told when a node starts ('running') and how it ended."""
+
+    def __init__(self, max_workers=4, span_kind="phase", span_name=None, listener=None):
+        self.max_workers = max(1, max_workers)
+        self.span_kind = span_kind
+        self.span_name = span_name
+        self.listener = listener
+
+    def _notify(self, name, status):
+        if self.listener:
+            try:
+                self.listener(name, status)
+            except Exception as e:
+                logger.warning(f"Phase listener failed for '{name}': {e}")
+
+    def run(self, nodes):
+        """Returns {name: {"status", "output", "start", "duration"}} with status done/failed/skipped.
+        `start` is relative to the beginning of the run, so the timings show overlap."""
+        by_name = {n.name: n for n in nodes}
+        for n in nodes:
+            missing = [r for r in n.requires if r not in by_name]
+            if missing:
+                raise ValueError(f"Phase '{n.name}' requires unknown phase(s): {missing}")
+
+        outcomes = {}
+        running = {}
+        origin = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while len(outcomes) < len(nodes):
+                progressed = False
+                for n in nodes:
+                    if n.name in outcomes or n.name in running.values():
+                        continue
+                    if any(outcomes.get(r, {}).get("status") in ("failed", "skipped") for r in n.requires):
+                        outcomes[n.name] = {"status": "skipped", "output": None, "start": None, "duration": 0.0}
+                        self._notify(n.name, "skipped")
+                        progressed = True
+                        continue
+                    if all(outcomes.get(r, {}).get("status") == "done" for r in n.requires):
+                        inputs = {r: outcomes[r]["output"] for r in n.requires}
+                        # Workers inherit the caller's context so node spans nest under the current span
+                        future = pool.submit(contextvars.copy_context().run, self._timed, n, inputs, origin)
+                        running[future] = n.name
+                        self._notify(n.name, "running")
+                        progressed = True
+                if not running:
+                    if not progressed:
+                        raise RuntimeError("Phase graph contains a cycle.")
+                    continue
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    outcomes[name] = future.result()
+                    self._notify(name, outcomes[name]["status"])
+        return outcomes
+
+    def _timed(self, node, inputs, origin):
+        start = time.monotonic()
+        with get_tracer().span(self.span_name or node.name, kind=self.span_kind, node=node.name) as span:
+            try:
+                output, is_err = node.func(inputs)
+            except Exception as e:
+                logger.error(f"Phase '{node.name}' raised: {e}")
+                output, is_err = f"⚠️ {node.name} failed: {e}", True
+            if is_err:
+                span.fail(output)
+        duration = time.monotonic() - start
+        print(f"--- Phase '{node.name}' {'failed' if is_err else 'finished'} in {duration:.2f}s ---", file=sys.stderr, flush=True)
+        return {"status": "failed" if is_err else "done", "output": output, "start": round(start - origin, 3), "duration": round(duration, 3)}
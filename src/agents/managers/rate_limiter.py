@@ -0,0 +1,194 @@
+import re
+import time
+import hashlib
+import threading
+from src.config import Config, logger
+
+class TokenBucket:
+    """Classic token bucket: holds up to `capacity` units and refills continuously over one minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available (requests larger than the bucket wait for a full bucket)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class RateLimiter:
+    """Tracks requests-per-minute and tokens-per-minute budgets per (API key, model).
+
+    Callers `acquire` a slot before each LLM call and only block for as long as a budget
+    (or a provider retry-after hint recorded via `penalize`) actually requires."""
+
+    RETRY_PATTERNS = [
+        r"try again in\s+(?:(?P<m>\d+)m)?\s*(?P<s>[\d.]+)\s*(?P<unit>ms|s)",
+        r"retry in\s+(?P<s>[\d.]+)\s*(?P<unit>ms|s)",
+        r"retry[_-]delay\s*\{\s*seconds:\s*(?P<s>\d+)",
+        r"retry-after[\"']?\s*[:=]\s*[\"']?(?P<s>[\d.]+)",
+    ]
+
+    def __init__(self, limits=None, model_limits=None):
+        self.limits = limits or Config.RATE_LIMITS
+        self.model_limits = model_limits if model_limits is not None else Config.RATE_LIMITS_BY_MODEL
+        self._buckets = {}
+        self._blocked_until = {}
+        self._lock = threading.Lock()
+        self.total_wait = 0.0
+        self.acquired = 0
+
+    @staticmethod
+    def provider_of(config_entry):
+        """Maps an AutoGen config_list entry to a provider name used for limit lookup."""
+        if config_entry.get("api_type") == "google":
+            return "google"
+        base_url = config_entry.get("base_url") or ""
+        if "groq" in base_url or base_url == Config.GROQ_BASE_URL:
+            return "groq"
+        return "default"
+
+    @staticmethod
+    def _fingerprint(api_key):
+        return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+
+    @staticmethod
+    def estimate_tokens(*texts):
+        """Cheap local estimate (~4 chars per token) plus headroom for the completion."""
+        chars = sum(len(t or "") for t in texts)
+        return chars // 4 + Config.RATE_LIMIT_OUTPUT_TOKENS
+
+    def _limits_for(self, provider, model):
+        limits = dict(self.limits.get(provider) or self.limits.get("default", {}))
+        limits.update(self.model_limits.get(model, {}))
+        return limits
+
+    def _get_buckets(self, provider, api_key, model):
+        key = (self._fingerprint(api_key), model)
+        if key not in self._buckets:
+            limits = self._limits_for(provider, model)
+            self._buckets[key] = (TokenBucket(limits.get("rpm", 60)), TokenBucket(limits.get("tpm", 100000)))
+        return key, self._buckets[key]
+
+    def acquire(self, provider, api_key, model, tokens=0, max_wait=None):
+        """Blocks until one request and `tokens` tokens fit the budget. Returns seconds waited (None if max_wait exceeded)."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                key, (rpm, tpm) = self._get_buckets(provider, api_key, model)
+                wait = max(
+                    rpm.wait_time(1, now),
+                    tpm.wait_time(tokens, now),
+                    self._blocked_until.get(key, 0) - now,
+                )
+                if wait <= 0:
+                    rpm.consume(1)
+                    tpm.consume(tokens)
+                    self.acquired += 1
+                    self.total_wait += waited
+                    return waited
+            if max_wait is not None and waited + wait > max_wait:
+                self.total_wait += waited
+                return None
+            time.sleep(wait)
+            waited += wait
+
+    def try_acquire(self, provider, api_key, model, tokens=0, headroom=0.0):
+        """Non-blocking acquire that also leaves `headroom` (a share of each bucket's capacity) for
+        regular traffic. Returns True if the slot was taken."""
+        with self._lock:
+            now = time.monotonic()
+            key, (rpm, tpm) = self._get_buckets(provider, api_key, model)
+            if self._blocked_until.get(key, 0) > now:
+                return False
+            if rpm.wait_time(1 + headroom * rpm.capacity, now) > 0 or tpm.wait_time(tokens + headroom * tpm.capacity, now) > 0:
+                return False
+            rpm.consume(1)
+            tpm.consume(tokens)
+            self.acquired += 1
+            return True
+
+    def settle(self, provider, api_key, model, estimated, actual):
+        """Corrects the TPM bucket once the real token usage of a call is known."""
+        with self._lock:
+            _, (_, tpm) = self._get_buckets(provider, api_key, model)
+            if actual > estimated:
+                tpm.consume(actual - estimated)
+            else:
+                tpm.refund(estimated - actual)
+
+    def penalize(self, provider, api_key, model, retry_after=None):
+        """Blocks a key/model after a 429, honoring the provider's retry-after hint when present."""
+        cooldown = retry_after if retry_after is not None else Config.RATE_LIMIT_DEFAULT_COOLDOWN
+        with self._lock:
+            key, _ = self._get_buckets(provider, api_key, model)
+            self._blocked_until[key] = max(self._blocked_until.get(key, 0), time.monotonic() + cooldown)
+        logger.info(f"Rate limiter: blocking {provider}/{model} for {cooldown:.1f}s")
+        return cooldown
+
+    @classmethod
+    def parse_retry_after(cls, text):
+        """Extracts a retry-after delay (seconds) from a provider error message, or None."""
+        if not text:
+            return None
+        for pattern in cls.RETRY_PATTERNS:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                groups = match.groupdict()
+                seconds = float(groups["s"])
+                if groups.get("unit") == "ms":
+                    seconds /= 1000.0
+                if groups.get("m"):
+                    seconds += 60 * int(groups["m"])
+                return seconds
+        return None
+
+    def snapshot(self):
+        """Returns the current budget state per key/model for monitoring."""
+        with self._lock:
+            now = time.monotonic()
+            state = []
+            for (fp, model), (rpm, tpm) in self._buckets.items():
+                rpm._refill(now)
+                tpm._refill(now)
+                state.append({
+                    "key": fp,
+                    "model": model,
+                    "requests_available": round(rpm.tokens, 2),
+                    "tokens_available": round(tpm.tokens),
+                    "blocked_for": round(max(0.0, self._blocked_until.get((fp, model), 0) - now), 2),
+                })
+            return {"acquired": self.acquired, "total_wait": round(self.total_wait, 2), "buckets": state}
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """Returns the process-wide rate limiter shared by every runner and worker thread."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
+
+def install_rate_limiter(limiter):
+    """Replaces the process-wide rate limiter, e.g. with a proxy to a limiter shared across processes."""
+    global _limiter
+    with _limiter_lock:
+        _limiter = limiter
@@ -0,0 +1,278 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.config import Config, logger
+
+# Upper bounds (seconds) of the span duration histogram buckets
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    """One timed unit of work. Attributes are free-form; `status` is 'ok' unless `fail` is called
+    or the body raises."""
+
+    def __init__(self, name, kind, trace_id, parent_id, attrs):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs = dict(attrs)
+        self.status = "ok"
+        self.start = time.time()
+        self._started = time.monotonic()
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def fail(self, message=None):
+        self.status = "error"
+        if message:
+            self.attrs["error"] = str(message)[:300]
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": round(self.start, 6),
+            "duration": round(self.duration or 0.0, 6),
+            "status": self.status,
+            "attrs": self.attrs,
+        }
+
+class Tracer:
+    """Process-wide span recorder. Spans nest through a context variable (PhaseScheduler and
+    PatchManager copy it into their worker threads), finished spans are appended to a JSON lines
+    file and folded into Prometheus-style aggregates, and the most recent ones stay in memory for
+    per-run breakdowns."""
+
+    def __init__(self, enabled=None, jsonl_path=None, metrics_path=None, max_spans=None):
+        self.enabled = Config.TRACING_ENABLED if enabled is None else enabled
+        self.jsonl_path = jsonl_path if jsonl_path is not None else Config.TRACE_JSONL_PATH
+        self.metrics_path = metrics_path if metrics_path is not None else Config.TRACE_METRICS_PATH
+        self._spans = deque(maxlen=max_spans or Config.TRACE_MAX_SPANS)
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._server = None
+
+    @contextmanager
+    def span(self, name, kind="internal", **attrs):
+        """Times the body as a child of the current span (or as the root of a new trace)."""
+        parent = _current_span.get()
+        current = Span(name, kind, parent.trace_id if parent else uuid.uuid4().hex[:16], parent.span_id if parent else None, attrs)
+        token = _current_span.set(current)
+        try:
+            yield current
+        except BaseException as e:
+            current.fail(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current_span.reset(token)
+            current.duration = time.monotonic() - current._started
+            if self.enabled:
+                self._record(current)
+
+    @staticmethod
+    def current():
+        return _current_span.get()
+
+    # --- Recording ---
+
+    def _record(self, span):
+        record = span.to_dict()
+        with self._lock:
+            self._spans.append(record)
+            self._aggregate(record)
+        if self.jsonl_path:
+            self._append_jsonl(record)
+
+    def _append_jsonl(self, record):
+        try:
+            with self._file_lock:
+                os.makedirs(os.path.dirname(self.jsonl_path) or ".", exist_ok=True)
+                if os.path.exists(self.jsonl_path) and os.path.getsize(self.jsonl_path) > Config.TRACE_JSONL_MAX_BYTES:
+                    os.replace(self.jsonl_path, self.jsonl_path + ".1")
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        except Exception as e:
+            logger.warning(f"Could not write trace span to {self.jsonl_path}: {e}")
+
+    def _count(self, metric, value, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def _aggregate(self, record):
+        key = (record["kind"], record["name"], record["status"])
+        hist = self._histograms.setdefault(key, {"buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0})
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if record["duration"] <= bound:
+                hist["buckets"][i] += 1
+        hist["sum"] += record["duration"]
+        hist["count"] += 1
+
+        attrs = record["attrs"]
+        if record["kind"] == "llm":
+            provider, model = attrs.get("provider", "none"), attrs.get("model", "none")
+            self._count("llm_attempts_total", 1, provider=provider, model=model, outcome=attrs.get("outcome", "unknown"))
+            self._count("llm_wait_seconds_total", attrs.get("wait_s", 0.0), provider=provider)
+            self._count("llm_prompt_tokens_total", attrs.get("prompt_tokens", 0), provider=provider, model=model)
+            self._count("llm_response_chars_total", attrs.get("response_chars", 0), provider=provider, model=model)
+            if attrs.get("hedge"):
+                self._count("llm_hedges_total", 1, provider=provider, outcome=attrs.get("outcome", "unknown"))
+        elif record["kind"] == "merge":
+            self._count("patch_merges_total", 1, mode=attrs.get("merge_mode", "none"), status=record["status"])
+        elif record["kind"] == "command":
+            self._count("commands_total", 1, status=record["status"])
+
+    # --- Export ---
+
+    def spans(self, trace_id=None):
+        with self._lock:
+            return [s for s in self._spans if trace_id is None or s["trace_id"] == trace_id]
+
+    @staticmethod
+    def _labels(pairs):
+        escaped = [(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in pairs]
+        return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}" if escaped else ""
+
+    def prometheus_text(self):
+        """Renders the aggregates in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = {k: {"buckets": list(v["buckets"]), "sum": v["sum"], "count": v["count"]} for k, v in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = [
+            "# HELP debugger_span_duration_seconds Duration of traced phases, LLM attempts, patch merges and commands.",
+            "# TYPE debugger_span_duration_seconds histogram",
+        ]
+        for (kind, name, status), hist in sorted(histograms.items()):
+            base = [("kind", kind), ("name", name), ("status", status)]
+            for bound, count in zip(DURATION_BUCKETS, hist["buckets"]):
+                lines.append(f"debugger_span_duration_seconds_bucket{self._labels(base + [('le', bound)])} {count}")
+            lines.append(f"debugger_span_duration_seconds_bucket{self._labels(base + [('le', '+Inf')])} {hist['count']}")
+            lines.append(f"debugger_span_duration_seconds_sum{self._labels(base)} {hist['sum']:.6f}")
+            lines.append(f"debugger_span_duration_seconds_count{self._labels(base)} {hist['count']}")
+
+        by_metric = {}
+        for (metric, labels), value in counters.items():
+            by_metric.setdefault(metric, []).append((labels, value))
+        for metric in sorted(by_metric):
+            lines.append(f"# TYPE debugger_{metric} counter")
+            for labels, value in sorted(by_metric[metric]):
+                lines.append(f"debugger_{metric}{self._labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path=None):
+        """Atomically writes the Prometheus text to a file (for node_exporter's textfile collector)."""
+        path = path or self.metrics_path
+        if not self.enabled or not path:
+            return
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.warning(f"Could not write metrics to {path}: {e}")
+
+    def serve_metrics(self, port, host="127.0.0.1"):
+        """Serves GET /metrics in a background thread. Returns the bound port, or None on failure."""
+        if self._server:
+            return self._server.server_address[1]
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                data = tracer.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            logger.warning(f"Metrics endpoint not started on {host}:{port}: {e}")
+            return None
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server.server_address[1]
+
+    # --- Per-run breakdown ---
+
+    def breakdown(self, trace_id):
+        """One row per phase of a trace: wall time, time in LLM calls, time lost to rate-limit
+        waits, attempts, retries, hedged duplicates, cache hits, the keys that served it and
+        prompt/response sizes."""
+        spans = self.spans(trace_id)
+        if not spans:
+            return []
+        root = next((s for s in spans if s["parent_id"] is None), spans[0])
+        children = {}
+        for s in spans:
+            children.setdefault(s["parent_id"], []).append(s)
+
+        def descendants(span_id):
+            stack, found = list(children.get(span_id, [])), []
+            while stack:
+                s = stack.pop()
+                found.append(s)
+                stack.extend(children.get(s["span_id"], []))
+            return found
+
+        rows = []
+        for phase in sorted((s for s in spans if s["kind"] == "phase"), key=lambda s: s["start"]):
+            llm = [s for s in descendants(phase["span_id"]) if s["kind"] == "llm"]
+            calls = [s for s in llm if s["attrs"].get("outcome") != "cache_hit"]
+            wait = sum(s["attrs"].get("wait_s", 0.0) for s in calls)
+            rows.append({
+                "phase": phase["name"],
+                "status": phase["status"],
+                "start_s": round(phase["start"] - root["start"], 2),
+                "wall_s": round(phase["duration"], 2),
+                "llm_s": round(sum(s["duration"] for s in calls) - wait, 2),
+                "wait_s": round(wait, 2),
+                "attempts": len(calls),
+                "retries": sum(1 for s in calls if s["attrs"].get("outcome") not in ("ok", "cancelled") and not s["attrs"].get("hedge")),
+                "hedges": sum(1 for s in calls if s["attrs"].get("hedge")),
+                "cache_hits": len(llm) - len(calls),
+                "keys": ", ".join(sorted({s["attrs"]["key"] for s in calls if s["attrs"].get("key")})),
+                "prompt_tokens": sum(s["attrs"].get("prompt_tokens", 0) for s in calls),
+                "response_chars": sum(s["attrs"].get("response_chars", 0) for s in calls),
+            })
+        return rows
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_tracer():
+    """Returns the process-wide tracer (starting the metrics endpoint when TRACE_METRICS_PORT is set)."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+            if _tracer.enabled and Config.TRACE_METRICS_PORT:
+                _tracer.serve_metrics(Config.TRACE_METRICS_PORT)
+        return _tracer
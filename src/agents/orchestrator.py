@@ -1,11 +1,21 @@
+import os
 import sys
-import time
+import importlib
 from src.agents.agent_factory import AgentFactory
-from src.config import logger
+from src.config import Config, logger
+import src.utils.diagram_renderer as d_rend
 from src.agents.managers.agent_runner import AgentRunner
 from src.agents.managers.guard_manager import GuardManager
 from src.agents.managers.patch_manager import PatchManager
 from src.agents.managers.command_manager import CommandManager
+from src.agents.managers.checkpoint_manager import CheckpointManager
+from src.agents.managers.phase_scheduler import PhaseNode, PhaseScheduler
+from src.agents.managers.detection_manager import DetectionManager
+from src.utils.retrieval_index import RetrievalIndex, get_index
+from src.agents.managers.memory_manager import get_memory
+from src.agents.managers.trace_manager import get_tracer
+from src.utils.file_crawler import FileCrawler
+from src.utils.workspace_utils import WorkspaceUtils
 
 class Orchestrator:
     def __init__(self):
@@ -13,12 +23,30 @@ class Orchestrator:
         self.runner = AgentRunner(self.factory)
         self.guard_manager = GuardManager()
         self.patch_manager = PatchManager(self.runner, self.factory, self.guard_manager)
+        self.detection_manager = DetectionManager(self.runner, self.factory)
+        self.checkpoints = CheckpointManager()
+        self.last_run_id = None
+        self.last_trace_id = None
+        self.tracer = get_tracer()
+        self.phase_timings = {}
+        self.context_reports = {}
+        self.phase_listener = None
         
     def _validate_msg(self, user_proxy, agent):
         return self.runner.validate_msg(user_proxy, agent)
 
-    def _run_step_with_rotation(self, agent_creator, user_proxy, message, phase_name, clear_history=True):
-        return self.runner.run_step_with_rotation(agent_creator, user_proxy, message, phase_name, clear_history)
+    def _run_step_with_rotation(self, agent_creator, user_proxy, message, phase_name, clear_history=True, use_cache=True):
+        return self.runner.run_step_with_rotation(agent_creator, user_proxy, message, phase_name, clear_history, use_cache)
+
+    def cache_stats(self):
+        return self.runner.cache.stats()
+
+    def key_pool_state(self):
+        return self.factory.get_key_pool_state()
+
+    def timing_breakdown(self, trace_id=None):
+        """Per-phase timings of the last traced run: wall, LLM and rate-limit wait time, attempts, keys."""
+        return self.tracer.breakdown(trace_id or self.last_trace_id)
 
     def _check_for_hallucinated_imports(self, patch_text, workspace_files):
         return self.guard_manager.check_for_hallucinated_imports(patch_text, workspace_files)
@@ -32,6 +60,9 @@ class Orchestrator:
     def apply_patches_to_dir(self, patches, base_dir, workspace_files=None):
         return self.patch_manager.apply_patches_to_dir(patches, base_dir, workspace_files)
 
+    def merge_stats(self):
+        return self.patch_manager.merge_stats()
+
     def validate_syntax(self, code, path):
         return self.patch_manager.validate_syntax(code, path)
 
@@ -47,83 +78,285 @@ class Orchestrator:
     def suggest_entry_point(self, dir_path):
         return CommandManager.suggest_entry_point(dir_path)
 
+    def build_summary(self, directory, files):
+        """Ranks workspace files and packs the best into the largest phase budget. Returns (summary, report)."""
+        summary, report = self.factory.context_builder.build_summary(directory, files, self.factory.max_context_budget())
+        self.context_reports["summary"] = report
+        return summary, report
+
+    def build_index(self, workspace_dir, files):
+        """Builds the chat retrieval index over function/class chunks and persists it next to the workspace."""
+        print("--- Indexing code chunks for retrieval ---", file=sys.stderr, flush=True)
+        index = RetrievalIndex.build(workspace_dir, files)
+        index.save(RetrievalIndex.index_dir(workspace_dir))
+        return len(index.chunks)
+
+    def fit_context(self, repo_summary, phase, reserve=0):
+        """Quota Safety: fits the summary into the phase's token budget (less `reserve`) and records what was dropped."""
+        text, report = self.factory.fit_context(repo_summary, phase, reserve)
+        self.context_reports[phase] = report
+        if report["dropped"] or report["truncated"]:
+            logger.info(f"Context for {phase}: {report['used']}/{report['budget']} tokens, truncated {report['truncated']}, dropped {report['dropped']}")
+        return text
+
+    def source_context(self, workspace_dir, rel_paths, phase, rank=False):
+        """Source of workspace files (not skeletons) packed into the phase's token budget. Returns (text, report)."""
+        text, report = self.factory.context_builder.build_sources(workspace_dir, rel_paths, self.factory.context_budget(phase), rank)
+        self.context_reports[f"{phase}_sources"] = report
+        return text, report
+
+    @staticmethod
+    def flagged_files(detection_report, workspace_files):
+        """Workspace files a detection report names, in order of first mention (the most severe findings come first)."""
+        positions = {}
+        for rel_path in workspace_files or []:
+            found = [i for i in (detection_report.find(rel_path), detection_report.find(os.path.basename(rel_path))) if i >= 0]
+            if found:
+                positions[rel_path] = min(found)
+        return sorted(positions, key=lambda p: (positions[p], p))
+
+    def patch_context(self, repo_summary, detection_report, workspace_files, workspace_dir=None, phase="patching"):
+        """Context for patch generation: the source of the flagged files, so diff hunks can quote real
+        lines, with the summary in whatever budget they leave. Returns (summary, sources)."""
+        sources, report = "", {"used": 0}
+        if workspace_dir:
+            sources, report = self.source_context(workspace_dir, self.flagged_files(detection_report, workspace_files), phase)
+        return self.fit_context(repo_summary, phase, reserve=report["used"]), sources
+
+    def _detection_context(self, repo_summary, workspace_dir, workspace_files, repo_id=None):
+        """Context of single-shot detection, or None when detection is sharded. Sharding (DETECTION_MODE=auto)
+        happens when the workspace source does not fit the phase budget, or when the repo has a manifest to
+        analyze incrementally against. Without a workspace the summary is all there is."""
+        if not workspace_dir or not workspace_files:
+            return self.fit_context(repo_summary, "detection")
+        if Config.DETECTION_MODE == "sharded" or (Config.DETECTION_MODE == "auto" and repo_id and Config.INCREMENTAL_ENABLED):
+            return None
+        sources, report = self.source_context(workspace_dir, workspace_files, "detection", rank=True)
+        if Config.DETECTION_MODE == "auto" and (report["truncated"] or report["dropped"]):
+            return None
+        return sources or self.fit_context(repo_summary, "detection")
+
+    @staticmethod
+    def repo_id(repo_url=None, local_path=None):
+        """Stable identity of a repository for incremental manifests."""
+        return repo_url or (os.path.abspath(local_path) if local_path else None)
+
+    def analyze_repository(self, repo_url=None, local_path=None, diagram_types=None, progress=None, workspace_dir=None, phase_listener=None, owner=None):
+        """Runs the full pipeline without the UI: workspace preparation, crawl, context packing,
+        indexing and the debugging session. `progress(message)` receives step updates and
+        `phase_listener(phase, status)` phase transitions; `owner` holds the workspace sandbox.
+        Returns a JSON-serializable result dict; `ok` is False when any step failed."""
+        progress = progress or (lambda message: print(f"--- {message} ---", file=sys.stderr, flush=True))
+        self.phase_listener = phase_listener
+        result = {"repo_url": repo_url, "local_path": local_path, "repo_id": self.repo_id(repo_url, local_path), "ok": False, "error": None}
+        progress("Cloning remote repository..." if repo_url else f"Sandboxing local repository from {local_path}...")
+        workspace_dir, note, error = WorkspaceUtils.prepare_workspace(repo_url, local_path, workspace_dir, owner)
+        result["workspace_dir"] = workspace_dir
+        if note:
+            progress(note)
+        if error:
+            result["error"] = error
+            return result
+
+        progress("Parsing files...")
+        crawler = FileCrawler()
+        files = []
+
+        def crawled():
+            # Ranking reads each file while the crawler is still scanning the rest of the tree
+            for file_path in crawler.crawl(workspace_dir):
+                files.append(file_path)
+                yield file_path
+
+        progress("Initializing Agents...")
+        # Rank files and pack the most valuable ones into the token budget
+        repo_summary, context_report = self.build_summary(workspace_dir, crawled())
+        files.sort()
+        workspace_files = [os.path.relpath(fp, workspace_dir) for fp in files]
+        # Bytes on disk (crawler), read (bounded prefixes) and packed into the summary
+        result["crawl"] = {**crawler.stats, **context_report.get("reads", {})}
+        progress("Indexing code for chat...")
+        self.build_index(workspace_dir, files)
+
+        messages = self.run_debugging_session(
+            repo_summary,
+            generate_diagrams=bool(diagram_types),
+            diagram_types=diagram_types,
+            workspace_files=workspace_files,
+            workspace_dir=workspace_dir,
+            repo_id=result["repo_id"],
+        )
+        result.update({
+            "workspace_files": workspace_files,
+            "repo_summary": repo_summary,
+            "context_report": context_report,
+            **self.session_result(messages),
+        })
+        return result
+
+    def session_result(self, messages):
+        """Outcome of the last debugging session: ok/error, messages, parsed patches, run and trace ids, timings."""
+        patch_msg = next((m for m in messages if m.get("name") == "Patch_Generator"), None)
+        errors = [m["content"] for m in messages if m.get("name") in ("System", "Error")]
+        return {
+            "ok": bool(messages) and not errors,
+            "error": errors[0] if errors else None,
+            "messages": messages,
+            "pending_patches": self.parse_patches(patch_msg["content"]) if patch_msg else [],
+            "run_id": self.last_run_id,
+            "trace_id": self.last_trace_id,
+            "phase_timings": self.phase_timings,
+            "timings": self.timing_breakdown(),
+        }
+
     # Core Orchestration Logic Kept Below:
-    def run_debugging_session(self, repo_summary, generate_diagrams=False, diagram_types=None, workspace_files=None):
-        """Orchestrates the debugging process with isolated context tracking."""
-        try:
-            user_proxy = self.factory.create_user_proxy()
-            all_results = {}
+    PHASE_AGENTS = {"parsing": "Code_Parser", "detection": "Bug_Detection", "patching": "Patch_Generator", "review": "Reviewer"}
+
+    def _format_messages(self, all_results):
+        return [{"name": agent, "content": all_results[phase]} for phase, agent in self.PHASE_AGENTS.items() if phase in all_results]
 
-            # Quota Safety: Cap summary size
-            safe_summary = self.factory.truncate_context(repo_summary)
+    def _run_phase(self, run_id, checkpoint, phase, producer, restore=True):
+        """Returns the checkpointed output of a phase, or runs it and checkpoints the result.
+        Without `restore` the phase always runs (it has its own, finer-grained reuse)."""
+        if restore and phase in checkpoint["phases"]:
+            print(f"--- Resuming: {phase} restored from checkpoint {run_id} ---", file=sys.stderr, flush=True)
+            return checkpoint["phases"][phase], False
+        msg, is_err = producer()
+        if not is_err:
+            self.checkpoints.save_phase(run_id, phase, msg)
+        return msg, is_err
 
-            # Phase 1: Parsing
+    def _analysis_nodes(self, repo_summary, workspace_files, run_id, checkpoint, workspace_dir=None, repo_id=None, incremental=True):
+        """Declares the analysis phases as a dependency graph; each node consumes the outputs it requires."""
+        user_proxy = self.factory.create_user_proxy()
+
+        def parsing(inputs):
+            safe_summary = self.fit_context(repo_summary, "parsing")
             print("--- PHASE 1: Parsing Codebase Structure ---", file=sys.stderr, flush=True)
-            msg, is_err = self.runner.run_step_with_rotation(self.factory.create_code_parser_agent, user_proxy, f"Context:\n{safe_summary}\n\nTask: Parse this structure.", "Code Parsing")
-            if is_err: return [{"name": "Error", "content": msg}]
-            all_results["parsing"] = msg
-            
-            # Phase 2: Detection
+            prompt = f"Context:\n{safe_summary}\n\nTask: Parse this structure."
+            return self._run_phase(run_id, checkpoint, "parsing", lambda: self.runner.run_step_with_rotation(self.factory.create_code_parser_agent, user_proxy, prompt, "Code Parsing"))
+
+        def detection(inputs):
             print("--- PHASE 2: Detecting Bugs & Vulnerabilities ---", file=sys.stderr, flush=True)
-            time.sleep(1)
-            prompt = f"Repository Summary:\n{safe_summary}\n\nProject Structure:\n{all_results['parsing']}\n\nTask: Locate bugs/vulnerabilities."
-            msg, is_err = self.runner.run_step_with_rotation(self.factory.create_bug_detection_agent, user_proxy, prompt, "Bug Detection")
-            if is_err: return [{"name": "Error", "content": msg}]
-            all_results["detection"] = msg
+            context = self._detection_context(repo_summary, workspace_dir, workspace_files, repo_id)
+            if context is None:
+                paths = [os.path.join(workspace_dir, f) for f in workspace_files]
+                # With a manifest, its plan decides per file what is re-analyzed and what is reused
+                manifest = bool(repo_id and incremental and self.detection_manager.manifests.enabled)
+                return self._run_phase(run_id, checkpoint, "detection", lambda: self.detection_manager.run(workspace_dir, paths, inputs["parsing"], repo_id, incremental), restore=not manifest)
+            prompt = f"Repository Source:\n{context}\n\nProject Structure:\n{inputs['parsing']}\n\nTask: Locate bugs/vulnerabilities."
+            return self._run_phase(run_id, checkpoint, "detection", lambda: self.runner.run_step_with_rotation(self.factory.create_bug_detection_agent, user_proxy, prompt, "Bug Detection"))
 
-            # Phase 3: Patching
+        def patching(inputs):
             print("--- PHASE 3: Generating Fix Suggestions ---", file=sys.stderr, flush=True)
-            time.sleep(1)
+            safe_summary, sources = self.patch_context(repo_summary, inputs["detection"], workspace_files, workspace_dir)
+            source_block = f"Source of the Flagged Files:\n{sources}\n\n" if sources else ""
             file_list_str = "\n".join([f"- {f}" for f in workspace_files]) if workspace_files else "None provided."
-            prompt = f"Repository Summary:\n{safe_summary}\n\nWorkspace File List (Available modules):\n{file_list_str}\n\nIdentified Issues:\n{all_results['detection']}\n\nTask: Suggest code patches."
-            
-            msg, is_err = self.run_patch_generation_cycle(prompt, workspace_files, user_proxy)
-            if is_err: return [{"name": "Error", "content": msg}]
-            all_results["patching"] = msg
+            prompt = f"Repository Summary:\n{safe_summary}\n\n{source_block}Workspace File List (Available modules):\n{file_list_str}\n\nIdentified Issues:\n{inputs['detection']}\n\nTask: Suggest code patches."
+            return self._run_phase(run_id, checkpoint, "patching", lambda: self.run_patch_generation_cycle(prompt, workspace_files, user_proxy))
 
-            # Phase 4: Review
+        def review(inputs):
+            safe_summary = self.fit_context(repo_summary, "review")
             print("--- PHASE 4: Final AI Review ---", file=sys.stderr, flush=True)
-            time.sleep(1)
-            prompt = f"Repository Summary:\n{safe_summary}\n\nProposed Patches:\n{all_results['patching']}\n\nTask: Perform final review."
-            msg, is_err = self.runner.run_step_with_rotation(self.factory.create_reviewer_agent, user_proxy, prompt, "Final Review")
-            if is_err: return [{"name": "Error", "content": msg}]
-            all_results["review"] = msg
-
-            # Format final list for UI
-            final_messages = [
-                {"name": "Code_Parser", "content": all_results["parsing"]},
-                {"name": "Bug_Detection", "content": all_results["detection"]},
-                {"name": "Patch_Generator", "content": all_results["patching"]},
-                {"name": "Reviewer", "content": all_results["review"]}
-            ]
-
-            # Optional Phase 5: Diagram Generation
-            if generate_diagrams and diagram_types:
-                print(f"--- PHASE 5: Generating {len(diagram_types)} Diagrams ---", file=sys.stderr, flush=True)
-                diagram_contents = []
-                for d_type in diagram_types:
-                    print(f"--- Sketching {d_type} Diagram... ---", file=sys.stderr, flush=True)
-                    time.sleep(2) # Extra delay
-                    prompt_details = "Focus on the step-by-step sequential flow of execution and data logic." if "Flow" in d_type or "Activity" in d_type else "Focus on static structural relationships, entities, and components." if "Class" in d_type or "ER" in d_type or "System" in d_type else "Focus on actors, interactions, and chronological message passing." if "Sequence" in d_type or "Use Case" in d_type else ""
-                    schema_req = "\nOUTPUT EXACTLY THIS JSON FORMAT:\n```json\n{\"nodes\": [{\"id\": \"1\", \"label\": \"UI/Client\", \"layer\": 0}, {\"id\": \"2\", \"label\": \"API/Server\", \"layer\": 1}], \"edges\": [{\"from\": \"1\", \"to\": \"2\"}]}\n```\nNote: 'layer' must be 0 (UI/External), 1 (API/Gateway), 2 (Services), or 3 (Database)."
-                    prompt = f"Context:\n{safe_summary}\n\nTask: Generate exactly ONE structural JSON architecture blueprint tailored specifically for a {d_type}.\n{prompt_details}\nDO NOT just output a generic system architecture. DO NOT GENERATE SVG DIRECTLY.{schema_req}"
-                    diag, is_err = self.runner.run_step_with_rotation(self.factory.create_diagram_generator_agent, user_proxy, prompt, f"{d_type} Diagram")
-                    if is_err: return [{"name": "Error", "content": diag}]
-                    # Programmatically render JSON to professional SVG
-                    import src.utils.diagram_renderer as d_rend
-                    import importlib
-                    importlib.reload(d_rend)
-                    rendered_diag = d_rend.render_json_diagram(diag)
-                    diagram_contents.append(rendered_diag)
-                
-                final_messages.append({"name": "Diagram_Generator", "content": "\n\n".join(diagram_contents)})
+            prompt = f"Repository Summary:\n{safe_summary}\n\nProposed Patches:\n{inputs['patching']}\n\nTask: Perform final review."
+            return self._run_phase(run_id, checkpoint, "review", lambda: self.runner.run_step_with_rotation(self.factory.create_reviewer_agent, user_proxy, prompt, "Final Review"))
+
+        return [
+            PhaseNode("parsing", parsing),
+            PhaseNode("detection", detection, requires=("parsing",)),
+            PhaseNode("patching", patching, requires=("detection",)),
+            PhaseNode("review", review, requires=("patching",)),
+        ]
+
+    def _diagram_nodes(self, safe_summary, diagram_types, run_id=None, checkpoint=None, first_slot=0):
+        """One independent node per diagram: they depend only on the summary, so they overlap the analysis chain."""
+        def make(d_type, slot):
+            def run(inputs):
+                if checkpoint and d_type in checkpoint["diagrams"]:
+                    print(f"--- Resuming: {d_type} diagram restored from checkpoint ---", file=sys.stderr, flush=True)
+                    return checkpoint["diagrams"][d_type], False
+                content, is_err = self._generate_diagram(safe_summary, d_type, slot)
+                if run_id and not is_err:
+                    self.checkpoints.save_diagram(run_id, d_type, content)
+                return content, is_err
+            return run
+        return [PhaseNode(f"diagram:{d_type}", make(d_type, first_slot + i)) for i, d_type in enumerate(diagram_types)]
+
+    @staticmethod
+    def _diagram_message(diagram_results):
+        """One message for all diagrams; None when no diagram was requested."""
+        if not diagram_results:
+            return None
+        if all(is_err for _, is_err in diagram_results):
+            return {"name": "Error", "content": diagram_results[0][0]}
+        return {"name": "Diagram_Generator", "content": "\n\n".join(content for content, _ in diagram_results)}
+
+    def run_debugging_session(self, repo_summary, generate_diagrams=False, diagram_types=None, workspace_files=None, resume=True, workspace_dir=None, repo_id=None, incremental=True):
+        """Orchestrates the debugging process with isolated context tracking.
+        Phases run as a DAG (Parsing -> Detection -> Patching -> Review, with every diagram independent),
+        so diagrams overlap the analysis chain. Every phase is checkpointed under a run id keyed by the
+        workspace content; with `resume` a rerun continues from the first incomplete phase. On failure the
+        completed phases are returned before the error. With `workspace_dir`, detection covers every
+        workspace file (map-reduce over shards) whenever their source does not fit its budget; with a
+        `repo_id` (and `incremental`) it only re-analyzes files changed since that repo's last run."""
+        with self.tracer.span("session", kind="session", files=len(workspace_files or []), diagrams=len(diagram_types or [])) as span:
+            self.last_trace_id = span.trace_id
+            messages = self._run_session(repo_summary, generate_diagrams, diagram_types, workspace_files, resume, workspace_dir, repo_id, incremental, span)
+        self.tracer.write_metrics()
+        return messages
+
+    def _run_session(self, repo_summary, generate_diagrams, diagram_types, workspace_files, resume, workspace_dir, repo_id, incremental, span):
+        try:
+            run_id = self.checkpoints.run_id(repo_summary, workspace_files, workspace_dir)
+            self.last_run_id = run_id
+            span.set(run_id=run_id)
+            checkpoint = self.checkpoints.load(run_id) if resume else {"phases": {}, "diagrams": {}}
+
+            self.detection_manager.shard_timings = []
+            nodes = self._analysis_nodes(repo_summary, workspace_files, run_id, checkpoint, workspace_dir, repo_id, incremental)
+            with_diagrams = bool(generate_diagrams and diagram_types)
+            if with_diagrams:
+                print(f"--- PHASE 5: Generating {len(diagram_types)} Diagrams (concurrently) ---", file=sys.stderr, flush=True)
+                importlib.reload(d_rend)
+                # Slot 0 (Gemini-first) stays with the heavy analysis chain
+                nodes += self._diagram_nodes(self.fit_context(repo_summary, "diagrams"), diagram_types, run_id, checkpoint, first_slot=1)
+
+            outcomes = PhaseScheduler(Config.PHASE_CONCURRENCY, listener=self.phase_listener).run(nodes)
+            self.phase_timings = {name: {k: o[k] for k in ("status", "start", "duration")} for name, o in outcomes.items()}
+            if self.detection_manager.shard_timings:
+                self.phase_timings["detection"]["shards"] = self.detection_manager.shard_timings
+
+            all_results = {phase: outcomes[phase]["output"] for phase in self.PHASE_AGENTS if outcomes[phase]["status"] == "done"}
+            final_messages = self._format_messages(all_results)
+            diagram_message = self._diagram_message([
+                (outcomes[f"diagram:{d_type}"]["output"], outcomes[f"diagram:{d_type}"]["status"] != "done") for d_type in diagram_types
+            ]) if with_diagrams else None
+            if diagram_message:
+                final_messages.append(diagram_message)
+
+            failed = next((outcomes[phase]["output"] for phase in self.PHASE_AGENTS if outcomes[phase]["status"] == "failed"), None)
+            if failed is not None:
+                span.fail(failed)
+                return final_messages + [{"name": "Error", "content": failed}]
 
             print("--- Analysis Session Completed Successfully ---", file=sys.stderr, flush=True)
             return final_messages
         except Exception as e:
             logger.error(f"Error in debugging session: {e}")
+            span.fail(e)
             return [{"name": "Error", "content": f"An unexpected error occurred: {e}"}]
 
+    def rerun_phase(self, repo_summary, phase, generate_diagrams=False, diagram_types=None, workspace_files=None, workspace_dir=None, repo_id=None, phase_listener=None):
+        """Re-runs one named phase ('parsing', 'detection', 'patching', 'review' or 'diagrams') from checkpoints.
+        Earlier phases are restored, the named phase is recomputed, and phases that consume its output follow.
+        Re-running parsing or detection re-analyzes every file instead of reusing manifest findings."""
+        self.phase_listener = phase_listener
+        run_id = self.checkpoints.run_id(repo_summary, workspace_files, workspace_dir)
+        self.checkpoints.invalidate(run_id, phase)
+        if phase == "diagrams":
+            generate_diagrams = True
+        return self.run_debugging_session(repo_summary, generate_diagrams, diagram_types, workspace_files, resume=True, workspace_dir=workspace_dir, repo_id=repo_id, incremental=phase not in ("parsing", "detection"))
+
     def run_patch_generation_cycle(self, prompt, workspace_files, user_proxy):
         """Generates patches and performs nuclear anti-hallucination re-checks."""
         msg, is_err = self.runner.run_step_with_rotation(self.factory.create_patch_generator_agent, user_proxy, prompt, "Patch Generation")
@@ -147,40 +380,77 @@ class Orchestrator:
             
         return msg, False
 
-    def chat_with_repo(self, repo_summary, user_query, chat_history=[]):
-        """Handles a conversational query with isolated context."""
+    def _summarize_memory(self, previous_summary, transcript):
+        """Folds aged-out chat turns into the running summary with the light model."""
+        user_proxy = self.factory.create_user_proxy()
+        prompt = f"PREVIOUS SUMMARY:\n{previous_summary or '(none)'}\n\nNEW TURNS:\n{transcript}"
+        msg, is_err = self.runner.run_step_with_rotation(self.factory.create_memory_summarizer_agent, user_proxy, prompt, "Memory Summary")
+        return None if is_err else msg
+
+    def chat_with_repo(self, repo_summary, user_query, chat_history=[], workspace_dir=None, session_id=None):
+        """Handles a conversational query with isolated context. With an indexed workspace the context
+        is the chunks most relevant to the question; otherwise the budgeted summary. Earlier turns
+        come from the session's conversation memory (recent turns verbatim, older ones summarized)."""
         try:
-            safe_summary = self.factory.truncate_context(repo_summary)
+            history = list(chat_history or [])
+            if history and history[-1].get("role") == "user" and history[-1].get("content") == user_query:
+                history = history[:-1]
+            memory = ""
+            if history:
+                summarizer = self._summarize_memory if Config.CHAT_MEMORY_SUMMARIZER == "llm" else None
+                memory = get_memory(session_id or "default").render(history, summarizer)
+
+            context = ""
+            index = get_index(workspace_dir) if workspace_dir else None
+            if index:
+                # Follow-ups ("where is it called?") retrieve with the previous question as well
+                last_question = next((m["content"] for m in reversed(history) if m.get("role") == "user"), "")
+                context, hits = index.retrieve(f"{user_query} {last_question}", self.factory.context_budget("chat"))
+                self.context_reports["chat"] = {"retrieved": hits}
+            if not context:
+                context = self.fit_context(repo_summary, "chat")
             user_proxy = self.factory.create_user_proxy()
-            prompt = f"Context:\n{safe_summary}\n\nUser Question: {user_query}"
+            history_block = f"Conversation History:\n{memory}\n\n" if memory else ""
+            prompt = f"Context:\n{context}\n\n{history_block}User Question: {user_query}"
             msg, is_err = self.runner.run_step_with_rotation(self.factory.create_repo_chat_agent, user_proxy, prompt, "Repo Chat")
             return {"name": "Repo_Chat_Agent", "content": msg}
         except Exception as e:
             logger.error(f"Error in chatbot: {e}")
             return {"name": "Error", "content": f"Chatbot error: {e}"}
 
+    def _build_diagram_prompt(self, safe_summary, d_type):
+        prompt_details = "Focus on the step-by-step sequential flow of execution and data logic." if "Flow" in d_type or "Activity" in d_type else "Focus on static structural relationships, entities, and components." if "Class" in d_type or "ER" in d_type or "System" in d_type else "Focus on actors, interactions, and chronological message passing." if "Sequence" in d_type or "Use Case" in d_type else ""
+        schema_req = "\nOUTPUT EXACTLY THIS JSON FORMAT:\n```json\n{\"nodes\": [{\"id\": \"1\", \"label\": \"UI/Client\", \"layer\": 0}, {\"id\": \"2\", \"label\": \"API/Server\", \"layer\": 1}], \"edges\": [{\"from\": \"1\", \"to\": \"2\"}]}\n```\nNote: 'layer' must be 0 (UI/External), 1 (API/Gateway), 2 (Services), or 3 (Database)."
+        return f"Context:\n{safe_summary}\n\nTask: Generate exactly ONE structural JSON architecture blueprint tailored specifically for a {d_type}.\n{prompt_details}\nDO NOT just output a generic system architecture. DO NOT GENERATE SVG DIRECTLY.{schema_req}"
+
+    def _generate_diagram(self, safe_summary, d_type, slot):
+        """Generates and renders one diagram on a dedicated runner. Returns (content, is_err)."""
+        runner = self.runner.spawn(slot)
+        user_proxy = runner.factory.create_user_proxy()
+        print(f"--- Sketching {d_type} Diagram... ---", file=sys.stderr, flush=True)
+        prompt = self._build_diagram_prompt(safe_summary, d_type)
+        diag, is_err = runner.run_step_with_rotation(runner.factory.create_diagram_generator_agent, user_proxy, prompt, f"{d_type} Diagram")
+        if is_err:
+            return f"### {d_type}\n{diag}", True
+        # Programmatically render JSON to professional SVG
+        return d_rend.render_json_diagram(diag), False
+
+    def generate_diagrams(self, safe_summary, diagram_types):
+        """Fans diagram requests out on a bounded worker pool, one provider slot per request.
+        Results come back in the requested order and a failed diagram never aborts the others."""
+        if not diagram_types:
+            return []
+        importlib.reload(d_rend)
+        outcomes = PhaseScheduler(min(Config.DIAGRAM_CONCURRENCY, len(diagram_types))).run(self._diagram_nodes(safe_summary, diagram_types))
+        return [(outcomes[f"diagram:{d_type}"]["output"], outcomes[f"diagram:{d_type}"]["status"] != "done") for d_type in diagram_types]
+
     def generate_diagrams_only(self, repo_summary, diagram_types):
         """Generates specific diagrams independently with isolated context."""
+        if not diagram_types:
+            return {"name": "Error", "content": "No diagram types requested."}
         try:
-            safe_summary = self.factory.truncate_context(repo_summary)
-            user_proxy = self.factory.create_user_proxy()
-            diagram_contents = []
-            for d_type in diagram_types:
-                print(f"--- Sketching {d_type} Diagram... ---", file=sys.stderr, flush=True)
-                time.sleep(2)
-                prompt_details = "Focus on the step-by-step sequential flow of execution and data logic." if "Flow" in d_type or "Activity" in d_type else "Focus on static structural relationships, entities, and components." if "Class" in d_type or "ER" in d_type or "System" in d_type else "Focus on actors, interactions, and chronological message passing." if "Sequence" in d_type or "Use Case" in d_type else ""
-                schema_req = "\nOUTPUT EXACTLY THIS JSON FORMAT:\n```json\n{\"nodes\": [{\"id\": \"1\", \"label\": \"UI/Client\", \"layer\": 0}, {\"id\": \"2\", \"label\": \"API/Server\", \"layer\": 1}], \"edges\": [{\"from\": \"1\", \"to\": \"2\"}]}\n```\nNote: 'layer' must be 0 (UI/External), 1 (API/Gateway), 2 (Services), or 3 (Database)."
-                prompt = f"Context:\n{safe_summary}\n\nTask: Generate exactly ONE structural JSON architecture blueprint tailored specifically for a {d_type}.\n{prompt_details}\nDO NOT just output a generic system architecture. DO NOT GENERATE SVG DIRECTLY.{schema_req}"
-                diag, is_err = self.runner.run_step_with_rotation(self.factory.create_diagram_generator_agent, user_proxy, prompt, f"{d_type} Diagram")
-                if is_err: return {"name": "Error", "content": diag}
-                # Programmatically render JSON to professional SVG
-                import src.utils.diagram_renderer as d_rend
-                import importlib
-                importlib.reload(d_rend)
-                rendered_diag = d_rend.render_json_diagram(diag)
-                diagram_contents.append(rendered_diag)
-            
-            return {"name": "Diagram_Generator", "content": "\n\n".join(diagram_contents)}
+            safe_summary = self.fit_context(repo_summary, "diagrams")
+            return self._diagram_message(self.generate_diagrams(safe_summary, diagram_types))
         except Exception as e:
             logger.error(f"Error in diagram generation: {e}")
             return {"name": "Error", "content": f"Diagram generation error: {e}"}
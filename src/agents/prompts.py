@@ -15,7 +15,7 @@ PATCH_GENERATOR_PROMPT = """Suggest concrete code patches or refactorings to fix
             STRICT RULES:
             1. Use '###' for header.
             2. ALWAYS specify the target file path using the format: #### [FILE] path/to/file.py
-            3. ALWAYS provide code fixes inside triple backticks (```python).
+            3. For EXISTING files, provide the fix as a unified diff inside triple backticks (```diff) with '--- a/path' and '+++ b/path' headers and '@@' hunks that keep 3 unchanged context lines copied exactly from the file. For NEW files, provide the complete code inside triple backticks (```python).
             4. Keep explanations brief and focused on the change.
             5. 🔥 MANDATORY ANTI-HALLUCINATION: NEVER introduce new imports.
             6. ONLY use standard libraries OR modules explicitly listed in the 'Workspace File List'.
@@ -74,4 +74,12 @@ DIAGRAM_GENERATOR_PROMPT = """You are a world-class Systems Architect.
 REPO_CHAT_PROMPT = """You are a helpful software engineering assistant integrated into VS Code.
             You have access to a summary of the user's local workspace. 
             Answer their questions accurately based on the provided context. 
+            Use the conversation history to resolve follow-up questions.
             If you don't know the answer, say so. Be concise and professional."""
+
+MEMORY_SUMMARIZER_PROMPT = """You maintain the running summary of a developer's chat about their repository.
+            Merge the PREVIOUS SUMMARY with the NEW TURNS into one updated summary.
+            STRICT RULES:
+            1. Keep facts that later questions may refer to: file names, functions, bugs, decisions.
+            2. Use at most 8 short bullet points ('- ').
+            3. Output ONLY the bullet points, no preamble."""
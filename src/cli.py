@@ -0,0 +1,55 @@
+"""Headless entry point: analyzes one or more repositories without the Streamlit UI.
+
+    python -m src.cli https://github.com/org/service ./local/repo --file repos.txt --workers 4 --output batch_results
+
+Writes one JSON result per repository under OUTPUT/results, resumable progress in
+OUTPUT/progress.json and an aggregate throughput report in OUTPUT/summary.json.
+"""
+import sys
+import argparse
+from src.config import Config
+from src.agents.managers.batch_manager import BatchManager
+
+def read_sources(args):
+    sources = list(args.sources)
+    for path in args.file or []:
+        with open(path, "r", encoding="utf-8") as f:
+            sources.extend(line.split("#", 1)[0].strip() for line in f)
+    return [s for s in sources if s]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze repositories headlessly and write the results as JSON.")
+    parser.add_argument("sources", nargs="*", help="Repository URLs or local paths")
+    parser.add_argument("--file", action="append", help="File listing one URL or path per line ('#' starts a comment)")
+    parser.add_argument("--output", default="batch_results", help="Directory for results, progress and the summary")
+    parser.add_argument("--workers", type=int, default=Config.BATCH_WORKERS, help="Repositories analyzed in parallel")
+    parser.add_argument("--timeout", type=float, default=Config.BATCH_REPO_TIMEOUT, help="Seconds allowed per repository")
+    parser.add_argument("--diagrams", default="", help="Comma-separated diagram types to generate (e.g. 'Flowchart,Class Diagram')")
+    parser.add_argument("--no-resume", action="store_true", help="Re-analyze repositories already marked done")
+    parser.add_argument("--keep-workspaces", action="store_true", help="Keep the cloned/copied workspaces")
+    args = parser.parse_args(argv)
+
+    sources = read_sources(args)
+    if not sources:
+        parser.error("no repositories given")
+    manager = BatchManager(
+        args.output,
+        workers=args.workers,
+        timeout=args.timeout,
+        diagram_types=[d.strip() for d in args.diagrams.split(",") if d.strip()],
+        resume=not args.no_resume,
+        keep_workspaces=args.keep_workspaces,
+    )
+    summary = manager.run(sources)
+    duration = summary["duration_s"]
+    print(
+        f"--- Batch finished: {summary['done']} done, {summary['failed']} failed, {summary['timed_out']} timed out, "
+        f"{summary['skipped']} skipped in {summary['wall_s']:.1f}s ({summary['repos_per_minute']} repos/min, "
+        f"p50 {duration['p50']}s, p95 {duration['p95']}s, {summary['llm_attempts']} LLM attempts) ---",
+        file=sys.stderr, flush=True,
+    )
+    print(f"--- Summary written to {manager.summary_path} ---", file=sys.stderr, flush=True)
+    return 0 if summary["failed"] == 0 and summary["timed_out"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
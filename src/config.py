@@ -47,6 +47,179 @@ class Config:
     MODEL = "gemini-2.5-flash" # Default Gemini model
     GROQ_MODEL = "llama-3.3-70b-versatile" # Recommended Groq model (Heavy)
     GROQ_MODEL_LIGHT = "llama-3.1-8b-instant" # Fast/Light model for high-RPM tasks
+    # OpenAI-compatible endpoint for the Groq configs (point at src/utils/stub_llm_server.py for offline runs)
+    GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+
+    # Token budget for the repository context, per model (what fits its TPM with room for the phase outputs)
+    MODEL_CONTEXT_BUDGETS = {
+        MODEL: int(os.getenv("GEMINI_CONTEXT_BUDGET", "30000")),
+        GROQ_MODEL: int(os.getenv("GROQ_CONTEXT_BUDGET", "4000")),
+        GROQ_MODEL_LIGHT: int(os.getenv("GROQ_LIGHT_CONTEXT_BUDGET", "3000")),
+    }
+    # Per-phase caps on top of the model budget (later phases also carry earlier outputs)
+    PHASE_CONTEXT_BUDGETS = {
+        "parsing": int(os.getenv("CONTEXT_BUDGET_PARSING", "4000")),
+        "detection": int(os.getenv("CONTEXT_BUDGET_DETECTION", "4000")),
+        "patching": int(os.getenv("CONTEXT_BUDGET_PATCHING", "3000")),
+        "review": int(os.getenv("CONTEXT_BUDGET_REVIEW", "2000")),
+        "diagrams": int(os.getenv("CONTEXT_BUDGET_DIAGRAMS", "2000")),
+        "chat": int(os.getenv("CONTEXT_BUDGET_CHAT", "3000")),
+    }
+    CONTEXT_MIN_FILE_TOKENS = 150 # Smaller leftovers drop the file instead of truncating it
+    CONTEXT_GIT_COMMITS = 100 # History window for the recency signal
+
+    # Local BM25 retrieval over code chunks for Repo Chat
+    RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+    RETRIEVAL_CHUNK_MAX_TOKENS = 800 # Larger classes are indexed method by method
+    RETRIEVAL_WINDOW_LINES = 60 # Chunk size for files without functions/classes
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+
+    # Repo Chat memory: recent turns verbatim, older turns folded into a per-session summary
+    CHAT_MEMORY_TURNS = int(os.getenv("CHAT_MEMORY_TURNS", "3"))
+    CHAT_MEMORY_BUDGET = int(os.getenv("CHAT_MEMORY_BUDGET", "1500")) # Tokens for summary + recent turns
+    CHAT_SUMMARY_BUDGET = 400
+    CHAT_MEMORY_SUMMARIZER = os.getenv("CHAT_MEMORY_SUMMARIZER", "extractive") # extractive | llm
+    CHAT_MEMORY_MAX_SESSIONS = 100
+
+    # Map-reduce bug detection: "auto" shards only when the summary cannot hold the whole workspace
+    DETECTION_MODE = os.getenv("DETECTION_MODE", "auto") # auto | sharded | single
+    DETECTION_SHARD_CONCURRENCY = int(os.getenv("DETECTION_SHARD_CONCURRENCY", "4"))
+    DETECTION_STRUCTURE_BUDGET = 500 # Tokens of the parser output sent with every shard
+    DETECTION_REPORT_BUDGET = int(os.getenv("DETECTION_REPORT_BUDGET", "3000")) # Size of the reduced report
+    DETECTION_DEDUP_SIMILARITY = 0.85 # Title similarity above which two findings are merged
+
+    # Max phases (analysis chain + diagrams) the DAG scheduler runs at once
+    PHASE_CONCURRENCY = int(os.getenv("PHASE_CONCURRENCY", "4"))
+
+    # Max parallel diagram requests (spread across Gemini and the Groq keys)
+    DIAGRAM_CONCURRENCY = int(os.getenv("DIAGRAM_CONCURRENCY", "4"))
+
+    # Per-provider rate limits (requests/tokens per minute), overridable via env
+    RATE_LIMITS = {
+        "groq": {"rpm": int(os.getenv("GROQ_RPM", "30")), "tpm": int(os.getenv("GROQ_TPM", "6000"))},
+        "google": {"rpm": int(os.getenv("GEMINI_RPM", "10")), "tpm": int(os.getenv("GEMINI_TPM", "250000"))},
+        "default": {"rpm": 60, "tpm": 100000},
+    }
+    # Model-specific overrides on top of the provider limits
+    RATE_LIMITS_BY_MODEL = {
+        GROQ_MODEL: {"tpm": int(os.getenv("GROQ_TPM_HEAVY", "12000"))},
+    }
+    RATE_LIMIT_OUTPUT_TOKENS = 800 # Completion headroom reserved per request
+    RATE_LIMIT_DEFAULT_COOLDOWN = 5.0 # Used after a 429 without a retry-after hint
+    RATE_LIMIT_MAX_WAIT = 30.0 # Longest retry-after we wait out on the same key
+    RATE_LIMIT_SAME_KEY_RETRIES = 2
+
+    # Shared key pool health tracking
+    KEY_POOL_EWMA_ALPHA = 0.3
+    KEY_POOL_LATENCY_WINDOW = 50
+
+    # Hedged requests: latency-critical phases race a copy on the next provider when the first is slow
+    HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() not in ("0", "false", "no")
+    HEDGE_PHASES = [p.strip() for p in os.getenv("HEDGE_PHASES", "Code Parsing,Repo Chat").split(",") if p.strip()]
+    HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.9")) # Of the primary provider's recent latencies
+    HEDGE_MIN_DELAY = 0.5 # Never hedge sooner than this (seconds)
+    HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "5.0")) # Until enough latency samples exist
+    HEDGE_MIN_SAMPLES = 5
+    HEDGE_PER_MINUTE = int(os.getenv("HEDGE_PER_MINUTE", "10")) # Hedge budget, separate from the key budgets
+    HEDGE_HEADROOM = float(os.getenv("HEDGE_HEADROOM", "0.5")) # Share of a key's RPM/TPM a hedge must leave untouched
+
+    # Workspace crawler (src/utils/file_crawler.py)
+    CRAWL_EXTENSIONS = [e.strip() for e in os.getenv("CRAWL_EXTENSIONS", ".py,.js,.ts,.html,.css").split(",") if e.strip()]
+    CRAWL_IGNORE_DIRS = (
+        '.git', 'node_modules', '__pycache__', 'softenv', '.venv', 'venv', 'env', '.idea', '.vscode',
+        'dist', 'build', 'out', '.pytest_cache', '.mypy_cache', '.tox', '.next', '.nuxt',
+        'vendor', 'target', '.terraform', '.serverless',
+    )
+    CRAWL_GITIGNORE = os.getenv("CRAWL_GITIGNORE", "true").lower() not in ("0", "false", "no")
+    CRAWL_MAX_FILE_BYTES = int(os.getenv("CRAWL_MAX_FILE_BYTES", str(1024 * 1024))) # Larger files are skipped
+    CRAWL_MAX_FILES = int(os.getenv("CRAWL_MAX_FILES", "0")) # 0 = no cap
+    CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", str(min(8, os.cpu_count() or 1)))) # Directories scanned in parallel (1 = serial)
+
+    # File reading for context building (src/utils/file_reader.py)
+    READ_MAX_BYTES = int(os.getenv("READ_MAX_BYTES", str(32 * 1024))) # Prefix read per file; well above any phase budget
+    READ_TAIL_BYTES = 2048 # Read from the end of cut files for entry-point detection
+    READ_FALLBACK_ENCODING = os.getenv("READ_FALLBACK_ENCODING", "cp1252") # When a file is not UTF-8
+    READ_MINIFIED_LINE_LENGTH = 300 # Average characters per line above which a file counts as minified
+    READ_MINIFIED_MIN_CHARS = 2000 # Shorter files are never treated as minified
+
+    # Max files merged in parallel by PatchManager
+    PATCH_CONCURRENCY = int(os.getenv("PATCH_CONCURRENCY", "4"))
+
+    # Context lines a unified-diff hunk may drop (from each end) to still apply
+    DIFF_FUZZ = int(os.getenv("DIFF_FUZZ", "2"))
+
+    # Local cache directory (LLM responses, checkpoints, manifests...)
+    CACHE_DIR = os.path.abspath(os.getenv("DEBUGGER_CACHE_DIR", ".cache"))
+
+    # Local workspaces: copy-on-write sandboxes of the analyzed folder, tracked per session
+    SANDBOX_MODE = os.getenv("SANDBOX_MODE", "auto") # auto (reflink > hardlink > worktree > copy) or one of them
+    SANDBOX_DIR = os.getenv("SANDBOX_DIR", os.path.join(CACHE_DIR, "sandboxes")) # Hardlinks need it on the repository's filesystem
+    SANDBOX_QUOTA_BYTES = int(os.getenv("SANDBOX_QUOTA_BYTES", str(5 * 1024 ** 3))) # Unowned sandboxes are evicted beyond this
+    SANDBOX_TTL = int(os.getenv("SANDBOX_TTL", "1800")) # Seconds an unowned sandbox is kept
+    SANDBOX_MAX_IDLE = int(os.getenv("SANDBOX_MAX_IDLE", str(24 * 3600))) # Seconds before an owned but unused sandbox counts as abandoned
+
+    # Skeleton summaries: signatures, docstrings and call targets instead of raw file text (src/utils/skeleton_builder.py)
+    SKELETON_ENABLED = os.getenv("SKELETON_ENABLED", "true").lower() not in ("0", "false", "no")
+    SKELETON_FULL_BODIES = int(os.getenv("SKELETON_FULL_BODIES", "10")) # Most relevant functions kept with their full source
+    SKELETON_BODY_SHARE = float(os.getenv("SKELETON_BODY_SHARE", "0.25")) # Share of the summary budget full bodies may take
+    SKELETON_MAX_BODY_TOKENS = 600 # Longer functions always stay as signatures
+    SKELETON_CALLER_WEIGHT = 2.0 # Weight of "called from many places" against the file's rank score
+    SKELETON_CACHE_ENABLED = os.getenv("SKELETON_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+    SKELETON_CACHE_DIR = os.getenv("SKELETON_CACHE_DIR", os.path.join(CACHE_DIR, "skeletons")) # One entry per file content hash
+
+    # Remote clones: shallow, blob-filtered and sparse (skipping CRAWL_IGNORE_DIRS), served from bare mirrors
+    CLONE_DEPTH = int(os.getenv("CLONE_DEPTH", "1")) # 0 = full history
+    CLONE_FILTER = os.getenv("CLONE_FILTER", "blob:none") # Partial-clone filter; empty disables it
+    CLONE_SPARSE = os.getenv("CLONE_SPARSE", "true").lower() not in ("0", "false", "no")
+    CLONE_TIMEOUT = int(os.getenv("CLONE_TIMEOUT", "600"))
+    CLONE_CACHE_ENABLED = os.getenv("CLONE_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+    CLONE_CACHE_DIR = os.getenv("CLONE_CACHE_DIR", os.path.join(CACHE_DIR, "mirrors"))
+    CLONE_CACHE_MAX_BYTES = int(os.getenv("CLONE_CACHE_MAX_BYTES", str(2 * 1024 ** 3))) # LRU-evicted beyond this
+    CLONE_FETCH_INTERVAL = int(os.getenv("CLONE_FETCH_INTERVAL", "60")) # Seconds a fetched mirror counts as fresh
+
+    # Persistent LLM response cache
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+    LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm_cache.sqlite"))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+    LLM_CACHE_DEFAULT_TTL = int(os.getenv("LLM_CACHE_DEFAULT_TTL", str(24 * 3600)))
+    # TTL (seconds) per agent/phase. 0 disables caching for that phase.
+    LLM_CACHE_TTLS = {
+        "Code_Parser": 7 * 24 * 3600,
+        "Bug_Detection": 24 * 3600,
+        "Patch_Generator": 24 * 3600,
+        "Reviewer": 24 * 3600,
+        "Patch_Applier": 7 * 24 * 3600,
+        "Diagram_Generator": 7 * 24 * 3600,
+        "Repo_Chat_Agent": 3600,
+        "Memory_Summarizer": 24 * 3600,
+    }
+
+    # Phase checkpoints for resuming failed/repeated sessions
+    CHECKPOINT_ENABLED = os.getenv("CHECKPOINT_ENABLED", "true").lower() not in ("0", "false", "no")
+    CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", os.path.join(CACHE_DIR, "checkpoints"))
+    CHECKPOINT_MAX_RUNS = int(os.getenv("CHECKPOINT_MAX_RUNS", "50"))
+
+    # Incremental re-analysis: per-repo manifests of file hashes, symbol digests and findings
+    INCREMENTAL_ENABLED = os.getenv("INCREMENTAL_ENABLED", "true").lower() not in ("0", "false", "no")
+    MANIFEST_DIR = os.getenv("MANIFEST_DIR", os.path.join(CACHE_DIR, "manifests"))
+
+    # Tracing: spans for phases, LLM attempts, patch merges and commands
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() not in ("0", "false", "no")
+    TRACE_DIR = os.getenv("TRACE_DIR", os.path.join(CACHE_DIR, "traces"))
+    TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", os.path.join(TRACE_DIR, "spans.jsonl"))
+    TRACE_JSONL_MAX_BYTES = int(os.getenv("TRACE_JSONL_MAX_BYTES", str(50 * 1024 * 1024))) # Rotated to .1 beyond this
+    TRACE_METRICS_PATH = os.getenv("TRACE_METRICS_PATH", os.path.join(TRACE_DIR, "metrics.prom"))
+    TRACE_METRICS_PORT = int(os.getenv("TRACE_METRICS_PORT", "0")) # Serves /metrics when set
+    TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "20000")) # Kept in memory for run breakdowns
+
+    # Headless batch mode (python -m src.cli)
+    BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "2")) # Repositories analyzed in parallel (one process each)
+    BATCH_REPO_TIMEOUT = float(os.getenv("BATCH_REPO_TIMEOUT", "1800")) # Seconds before a repository is abandoned
+
+    # Background analysis jobs for the UI
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2")) # Analyses running at once per server process
+    JOB_HISTORY = 50 # Finished jobs kept for polling and refresh re-attach
     
     @classmethod
     def get_groq_keys(cls):
@@ -20,7 +20,9 @@ def render_final_apply_stage():
                         
                         if os.path.exists(src):
                             os.makedirs(os.path.dirname(dst), exist_ok=True)
-                            shutil.copy2(src, dst)
+                            # A sandbox file still hardlinked to the original already is the original
+                            if not (os.path.exists(dst) and os.path.samefile(src, dst)):
+                                shutil.copy2(src, dst)
                             st.write(f"✅ Applied: `{clean_rel_path}`")
                             success_count += 1
                         else:
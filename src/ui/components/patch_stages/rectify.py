@@ -7,7 +7,8 @@ def render_rectify_stage():
     if st.button("🔥 Re-generate Patches", type="primary", use_container_width=True):
         with st.status("Re-analyzing with feedback...", expanded=True) as status:
             orchestrator = Orchestrator()
-            prompt = f"Repository Summary:\n{st.session_state.repo_summary}\n\nUSER FEEDBACK ON PREVIOUS PATCHES: {feedback}\n\nTask: Re-evaluate and suggest better patches."
+            safe_summary = orchestrator.fit_context(st.session_state.repo_summary, "detection")
+            prompt = f"Repository Summary:\n{safe_summary}\n\nUSER FEEDBACK ON PREVIOUS PATCHES: {feedback}\n\nTask: Re-evaluate and suggest better patches."
             msg, is_err = orchestrator._run_step_with_rotation(
                 orchestrator.factory.create_bug_detection_agent, 
                 orchestrator.factory.create_user_proxy(), 
@@ -15,8 +16,11 @@ def render_rectify_stage():
                 "Bug Re-detection"
             )
             if not is_err:
+                # Diff hunks must quote real lines: send the source of the files the analysis names
+                _, sources = orchestrator.patch_context("", msg, st.session_state.get("workspace_files"), st.session_state.cloned_repo_path)
+                source_block = f"Source of the Flagged Files:\n{sources}\n\n" if sources else ""
                 file_list_str = "\n".join([f"- {f}" for f in st.session_state.workspace_files]) if st.session_state.get("workspace_files") else "None provided."
-                patch_prompt = f"Previous Analysis:\n{msg}\n\nWorkspace File List (Available modules):\n{file_list_str}\n\nFeedback: {feedback}\n\nTask: Generate revised code patches."
+                patch_prompt = f"Previous Analysis:\n{msg}\n\n{source_block}Workspace File List (Available modules):\n{file_list_str}\n\nFeedback: {feedback}\n\nTask: Generate revised code patches."
                 p_msg, p_is_err = orchestrator.run_patch_generation_cycle(
                     patch_prompt, 
                     st.session_state.get("workspace_files"), 
@@ -37,6 +41,7 @@ def render_rectify_stage():
                             st.session_state.get("workspace_files")
                         )
                         st.session_state.patch_status = {r['path']: r for r in results}
+                        st.session_state.merge_stats = orchestrator.merge_stats()
                         st.session_state.patch_stage = "TESTING"
                     else:
                         st.session_state.patch_stage = "SUGGESTED"
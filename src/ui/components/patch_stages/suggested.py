@@ -9,6 +9,7 @@ def render_suggested_stage():
                 orchestrator = Orchestrator()
                 results = orchestrator.apply_patches_to_dir(st.session_state.pending_patches, st.session_state.cloned_repo_path, st.session_state.get("workspace_files"))
                 st.session_state.patch_status = {r['path']: r for r in results}
+                st.session_state.merge_stats = orchestrator.merge_stats()
                 
                 # Fail-Fast: Check for errors
                 errors = [r for r in results if r.get("status") != "Success"]
@@ -9,8 +9,11 @@ def render_testing_stage():
     st.success("✅ Step 2: Patches applied to temporary clone. Now, let's verify if the code works as expected.")
     
     with st.expander("🔍 View Changes in Clone"):
+        m_stats = st.session_state.get("merge_stats")
+        if m_stats:
+            st.caption(f"🧩 {m_stats['local_merges']} file(s) merged locally, {m_stats['llm_merges']} via Patch_Applier, {m_stats['diff_merges']} from diffs (~{m_stats['estimated_tokens_saved']} tokens saved).")
         for path, res in st.session_state.patch_status.items():
-            st.markdown(f"**Path:** `{path}` ({'✅ Syntax OK' if res.get('syntax_ok') else '❌ Syntax Error'})")
+            st.markdown(f"**Path:** `{path}` ({'✅ Syntax OK' if res.get('syntax_ok') else '❌ Syntax Error'}{' · local merge' if res.get('merge_mode') == 'local' else ''})")
             if res['status'] == "Success":
                 col_a, col_b = st.columns(2)
                 with col_a: st.code(res.get('old_content', ''), language="python")
@@ -1,5 +1,6 @@
 import streamlit as st
 import os
+from src.utils.sandbox_manager import get_sandbox_manager
 
 def render_sidebar():
     """Renders the sidebar configuration and returns button states."""
@@ -20,8 +21,12 @@ def render_sidebar():
         st.sidebar.divider()
         
     if reset_button:
+        # Hand the session's sandbox back to the garbage collector
+        if st.session_state.get("cloned_repo_path"):
+            get_sandbox_manager().release(st.session_state.cloned_repo_path, f"session:{st.session_state.get('chat_session_id')}")
         # Save the layout setting if any, then clear
         st.session_state.clear()
+        st.query_params.clear()
         st.session_state["repo_url"] = ""
         st.session_state["local_repo_path"] = ""
         st.rerun()
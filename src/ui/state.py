@@ -1,5 +1,6 @@
 import streamlit as st
 import os
+import uuid
 
 DIAG_OPTIONS = ["Flowchart", "Master Flow Chart", "System Design", "Use Case Diagram", "Class Diagram", "Sequence Diagram", "Activity Diagram", "State Diagram", "ER Diagram"]
 
@@ -14,8 +15,18 @@ def initialize_session_state():
     # State for Chat & Analysis
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "chat_session_id" not in st.session_state:
+        st.session_state.chat_session_id = uuid.uuid4().hex
     if "repo_summary" not in st.session_state:
         st.session_state.repo_summary = None
+    if "context_report" not in st.session_state:
+        st.session_state.context_report = None
+    if "run_timings" not in st.session_state:
+        st.session_state.run_timings = None
+    if "analysis_job_id" not in st.session_state:
+        st.session_state.analysis_job_id = None
+    if "applied_job_id" not in st.session_state:
+        st.session_state.applied_job_id = None
     if "analysis_results" not in st.session_state:
         st.session_state.analysis_results = []
     if "initial_analysis_requested" not in st.session_state:
@@ -1,98 +1,88 @@
 import streamlit as st
-import tempfile
-import os
-from src.utils.github_utils import GitHubUtils
+import time
 from src.agents.orchestrator import Orchestrator
+from src.agents.managers.job_manager import get_job_manager
+from src.utils.sandbox_manager import get_sandbox_manager
 from src.database.db_manager import save_analysis_result
 
+PHASE_ICONS = {"running": "⏳", "done": "✅", "failed": "❌", "skipped": "⏭️"}
+
+def render_job_progress(snapshot):
+    """Shows the streamed progress of a running analysis job."""
+    with st.status(f"Processing Repository... ({snapshot['elapsed']}s)", expanded=True):
+        for entry in snapshot["messages"]:
+            st.write(entry["message"])
+        if snapshot["phases"]:
+            st.write(" · ".join(f"{PHASE_ICONS.get(status, '•')} {phase}" for phase, status in snapshot["phases"].items()))
+        if snapshot["coalesced"]:
+            st.caption(f"Shared with {snapshot['coalesced']} identical request(s).")
+
+def apply_job_result(job, repo_label):
+    """Copies a finished job's result into the session (once per job)."""
+    if job.status == "failed":
+        st.error(job.error)
+        return
+    result = job.result
+    # The session holds the job's sandbox (or, when a coalesced job is shared, a private sandbox of it)
+    # from now on and lets go of its previous one
+    sandboxes, owner = get_sandbox_manager(), f"session:{st.session_state.chat_session_id}"
+    previous = st.session_state.cloned_repo_path
+    workspace = sandboxes.claim_private(result["workspace_dir"], owner)
+    if previous and previous != workspace:
+        sandboxes.release(previous, owner)
+    if not workspace:
+        st.warning("The workspace of this analysis was already cleaned up; run the analysis again to apply patches.")
+    st.session_state.cloned_repo_path = workspace or result["workspace_dir"]
+    st.session_state.workspace_files = result["workspace_files"]
+    st.session_state.repo_summary = result["repo_summary"]
+    st.session_state.context_report = result["context_report"]
+    st.session_state.analysis_results = result["messages"]
+    st.session_state.run_timings = result["timings"]
+    
+    # Extract pending patches
+    if any(m.get("name") == "Patch_Generator" for m in result["messages"]):
+        st.session_state.pending_patches = result["pending_patches"]
+        # Reset workflow state ONLY for new results
+        st.session_state.patch_stage = "SUGGESTED"
+        st.session_state.patch_status = {}
+        st.session_state.last_exec_output = None
+        st.session_state.test_command = ""
+    
+    if result["ok"]:
+        save_analysis_result(repo_label, st.session_state.analysis_results)
+
+def poll_analysis_job():
+    """Reruns the app while the session's analysis job is in flight (call after every tab rendered)."""
+    job_id = st.session_state.get("analysis_job_id")
+    job = get_job_manager().get(job_id) if job_id else None
+    if job and (not job.done or st.session_state.get("applied_job_id") != job.id):
+        time.sleep(1)
+        st.rerun()
+
 def render_analysis_tab(process_button):
     st.header("📊 Repository Analysis")
     r_url = st.session_state.get("repo_url")
     l_path = st.session_state.get("local_repo_path")
     
     # ONLY run analysis if button is pressed OR if results are missing BUT requested
-    should_analyze = process_button or (st.session_state.initial_analysis_requested and not st.session_state.analysis_results)
+    should_analyze = process_button or (st.session_state.initial_analysis_requested and not st.session_state.analysis_results and not st.session_state.analysis_job_id)
 
+    manager = get_job_manager()
     if should_analyze:
-        with st.status("Processing Repository...", expanded=True) as status:
-            temp_dir = tempfile.mkdtemp()
-            success = False
-            
-            if r_url:
-                st.write("Cloning remote repository...")
-                if GitHubUtils.clone_repository(r_url, temp_dir):
-                    success = True
-                else:
-                    st.error("Failed to clone remote repository.")
-            elif l_path:
-                st.write(f"Copying local repository from {l_path}...")
-                try:
-                    import shutil
-                    if os.path.exists(temp_dir): shutil.rmtree(temp_dir)
-                    os.makedirs(temp_dir, exist_ok=True)
-                    
-                    if os.path.isfile(l_path):
-                        # Handle single file repository
-                        shutil.copy2(l_path, os.path.join(temp_dir, os.path.basename(l_path)))
-                        st.info("Single file detected. Processing as a one-file repository.")
-                        success = True
-                    elif os.path.isdir(l_path):
-                        # Expanded ignore list to speed up copying
-                        ignore_list = shutil.ignore_patterns(
-                            '.git', 'node_modules', '__pycache__', 'softenv', 
-                            '.venv', 'venv', 'env', '.idea', '.vscode', 
-                            'dist', 'build', '.pytest_cache', '.next', '.nuxt', 
-                            'vendor', 'target', '.terraform', '.serverless',
-                            '*.pyc', '*.pyo', '*.pyd', '.DS_Store'
-                        )
-                        shutil.copytree(l_path, temp_dir, dirs_exist_ok=True, ignore=ignore_list)
-                        success = True
-                    else:
-                        st.error(f"Path not found: {l_path}")
-                except Exception as e:
-                    st.error(f"Failed to copy local repository: {e}")
+        # Runs in the background; an identical analysis already in flight is joined instead
+        job = manager.submit_analysis(r_url, l_path, st.session_state.diag_selection)
+        st.session_state.analysis_job_id = job.id
+        st.query_params["job"] = job.id
+    elif not st.session_state.analysis_job_id and st.query_params.get("job"):
+        # A refreshed browser tab re-attaches to its job
+        st.session_state.analysis_job_id = st.query_params["job"]
 
-            if success:
-                st.session_state.cloned_repo_path = temp_dir
-                st.write("Parsing files...")
-                files = GitHubUtils.list_files(temp_dir)
-                repo_summary = ""
-                # Use a larger slice if local to be more comprehensive
-                max_summary_files = 20 if l_path else 10
-                workspace_files = [os.path.relpath(fp, temp_dir) for fp in files]
-                st.session_state.workspace_files = workspace_files
-                
-                for file_path in files[:max_summary_files]:
-                    content = GitHubUtils.read_file_content(file_path)
-                    if content:
-                        repo_summary += f"--- Path: {os.path.relpath(file_path, temp_dir)} ---\n{content[:2000]}\n\n"
-                st.session_state.repo_summary = repo_summary
-                
-                st.write("Initializing Agents...")
-                orchestrator = Orchestrator()
-                do_gen = len(st.session_state.diag_selection) > 0
-                st.session_state.analysis_results = orchestrator.run_debugging_session(
-                    repo_summary, 
-                    generate_diagrams=do_gen, 
-                    diagram_types=st.session_state.diag_selection,
-                    workspace_files=workspace_files
-                )
-                
-                # Extract pending patches
-                patch_msg = next((m for m in st.session_state.analysis_results if m.get("name") == "Patch_Generator"), None)
-                if patch_msg:
-                    st.session_state.pending_patches = orchestrator.parse_patches(patch_msg["content"])
-                    # Reset workflow state ONLY for new results
-                    st.session_state.patch_stage = "SUGGESTED"
-                    st.session_state.patch_status = {}
-                    st.session_state.last_exec_output = None
-                    st.session_state.test_command = ""
-                
-                status.update(label="Analysis Complete!", state="complete", expanded=False)
-                if st.session_state.analysis_results and not any(msg.get("name") in ["System", "Error"] for msg in st.session_state.analysis_results):
-                    save_analysis_result(r_url or l_path, st.session_state.analysis_results)
-            else:
-                status.update(label="Process Failed", state="error")
+    job = manager.get(st.session_state.analysis_job_id) if st.session_state.analysis_job_id else None
+    if job and not job.done:
+        render_job_progress(job.snapshot())
+    elif job and st.session_state.applied_job_id != job.id:
+        st.session_state.applied_job_id = job.id
+        apply_job_result(job, r_url or l_path)
 
     if st.session_state.analysis_results:
         for msg in st.session_state.analysis_results:
@@ -103,6 +93,41 @@ def render_analysis_tab(process_button):
             elif role == "Diagram_Generator": pass
             else:
                 with st.chat_message(role): st.markdown(content)
+
+        report = st.session_state.get("context_report")
+        if report:
+            with st.expander(f"📦 Context: {report['used']}/{report['budget']} tokens, {len(report['included'])} file(s) included"):
+                if report["truncated"]:
+                    st.caption("Truncated: " + ", ".join(report["truncated"]))
+                if report["dropped"]:
+                    st.caption(f"Dropped ({len(report['dropped'])}): " + ", ".join(report["dropped"]))
+                st.caption("Included: " + ", ".join(report["included"]))
+
+        timings = st.session_state.get("run_timings")
+        if timings:
+            llm_time = sum(row["llm_s"] for row in timings)
+            wait_time = sum(row["wait_s"] for row in timings)
+            with st.expander(f"⏱️ Timing: {len(timings)} phase(s), {llm_time:.1f}s in LLM calls, {wait_time:.1f}s waiting on rate limits"):
+                st.dataframe(timings, use_container_width=True)
+                st.caption("Spans are also exported as JSON lines and Prometheus metrics under the trace directory.")
+
+        if st.session_state.repo_summary:
+            with st.expander("🔁 Re-run a single phase"):
+                phase = st.selectbox("Phase", ["review", "patching", "detection", "parsing", "diagrams"], key="rerun_phase")
+                if st.button("Re-run Phase"):
+                    # Runs in the background like the analysis itself; the polling above shows its progress
+                    job = manager.submit_rerun(
+                        phase,
+                        st.session_state.repo_summary,
+                        diagram_types=st.session_state.diag_selection,
+                        workspace_files=st.session_state.workspace_files,
+                        workspace_dir=st.session_state.cloned_repo_path,
+                        repo_id=Orchestrator.repo_id(r_url, l_path),
+                        context_report=st.session_state.get("context_report"),
+                    )
+                    st.session_state.analysis_job_id = job.id
+                    st.query_params["job"] = job.id
+                    st.rerun()
                 
-    else:
+    elif not job or job.done:
         st.info("Enter a GitHub URL or Local Path in the sidebar and click 'Analyze Codebase' to start.")
@@ -14,7 +14,11 @@ def render_chat_tab():
             st.session_state.messages.append({"role": "user", "content": prompt})
             orchestrator = Orchestrator()
             with st.spinner("Thinking..."):
-                response_msg = orchestrator.chat_with_repo(st.session_state.repo_summary, prompt, st.session_state.messages)
+                response_msg = orchestrator.chat_with_repo(
+                    st.session_state.repo_summary, prompt, st.session_state.messages,
+                    workspace_dir=st.session_state.cloned_repo_path,
+                    session_id=st.session_state.chat_session_id
+                )
             
             role = response_msg.get("name", "Agent")
             content = response_msg.get("content", "")
@@ -0,0 +1,272 @@
+import os
+import re
+import sys
+import math
+import subprocess
+from src.config import Config, logger
+from src.utils.file_reader import FileReader
+from src.utils.skeleton_builder import SkeletonBuilder
+
+# Word pieces and punctuation: close to what BPE tokenizers produce for source code
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+PATH_HEADER = re.compile(r"^--- Path: (.+?) ---$", re.MULTILINE)
+
+ENTRY_POINT_NAMES = {
+    "main.py", "app.py", "__main__.py", "cli.py", "manage.py", "server.py", "wsgi.py", "asgi.py", "run.py",
+    "index.js", "index.ts", "main.js", "main.ts", "server.js", "server.ts", "app.js", "app.ts",
+}
+ENTRY_POINT_PATTERN = re.compile(
+    r"""if\s+__name__\s*==\s*['"]__main__['"]|=\s*(?:Flask|FastAPI)\(|st\.set_page_config\(|\.listen\(|createRoot\("""
+)
+PY_IMPORT = re.compile(r"^\s*(?:from\s+(\.*[\w.]*)\s+import\s+\(?([\w*, ]+)|import\s+([\w., ]+))", re.MULTILINE)
+JS_IMPORT = re.compile(r"""(?:from\s+|require\(\s*|import\s*\(\s*|import\s+)['"](\.{1,2}/[^'"]+)['"]""")
+JS_EXTENSIONS = ["", ".js", ".ts", ".jsx", ".tsx", "/index.js", "/index.ts"]
+CODE_EXTENSIONS = (".py", ".js", ".ts", ".jsx", ".tsx")
+
+class ContextBuilder:
+    """Packs the most valuable files of a workspace into a token budget.
+
+    Files are ranked by entry-point status, import centrality (how many files import them),
+    size and recent git activity, then packed best-first; a file that no longer fits is
+    truncated or dropped, and every decision is reported."""
+
+    WEIGHTS = {"entry_point": 3.0, "centrality": 2.0, "recency": 1.5, "size": 1.0}
+
+    @staticmethod
+    def estimate_tokens(text):
+        """Local token estimate: one per word piece or symbol, plus one per 8 characters of long identifiers."""
+        if not text:
+            return 0
+        return sum(1 + len(piece) // 8 for piece in TOKEN_PATTERN.findall(text))
+
+    def rank_files(self, directory, files, reader=None):
+        """Returns [{'path', 'score', 'signals', 'content'}] best first (paths relative to `directory`).
+        Only a bounded prefix of each file is read (see FileReader); binary, generated and minified files are left out."""
+        reader = reader or FileReader()
+        contents, tails = {}, {}
+        for file_path in files:
+            rel_path = os.path.relpath(file_path, directory)
+            content, truncated = reader.read_prefix(file_path)
+            if content:
+                contents[rel_path] = content
+                if truncated:
+                    tails[rel_path] = reader.read_tail(file_path)
+
+        in_degree = self._import_in_degree(contents)
+        recency = self._git_recency(directory)
+        max_in = max(in_degree.values(), default=0) or 1
+        max_recent = max(recency.values(), default=0) or 1
+
+        ranked = []
+        for rel_path, content in contents.items():
+            tokens = self.estimate_tokens(content)
+            signals = {
+                "entry_point": 1.0 if self._is_entry_point(rel_path, content) or (rel_path in tails and self._is_entry_point(rel_path, tails[rel_path])) else 0.0,
+                "centrality": in_degree.get(rel_path, 0) / max_in,
+                "recency": recency.get(rel_path.replace(os.sep, "/"), 0) / max_recent,
+                # Saturates around 2k tokens: near-empty files score ~0, big files are not favoured further
+                "size": min(1.0, math.log1p(tokens) / math.log1p(2000)),
+            }
+            score = sum(self.WEIGHTS[name] * value for name, value in signals.items())
+            if not rel_path.endswith(CODE_EXTENSIONS):
+                score *= 0.5
+            ranked.append({"path": rel_path, "score": round(score, 3), "signals": signals, "content": content, "tokens": tokens})
+        ranked.sort(key=lambda f: (-f["score"], f["path"]))
+        return ranked
+
+    def build_summary(self, directory, files, budget):
+        """Ranks `files` and packs them (as skeletons with SKELETON_ENABLED) into `budget` tokens.
+        Returns (summary, report); the report's 'reads' holds the reader counters, with bytes
+        read against bytes packed, and 'skeletons' the skeleton cache counters."""
+        print(f"--- Building Context ({budget} token budget) ---", file=sys.stderr, flush=True)
+        reader = FileReader()
+        ranked = self.rank_files(directory, files, reader)
+        if Config.SKELETON_ENABLED:
+            skeletons = SkeletonBuilder()
+            blocks = skeletons.summarize(ranked, self.estimate_tokens, budget)
+        else:
+            blocks = [(f["path"], f["content"]) for f in ranked]
+        summary, report = self.pack(blocks, budget)
+        report["reads"] = {**reader.stats, "bytes_used": report["bytes"]}
+        if Config.SKELETON_ENABLED:
+            report["skeletons"] = skeletons.stats
+        return summary, report
+
+    def build_sources(self, directory, rel_paths, budget, rank=False):
+        """Packs the source of `rel_paths` (bounded prefixes, never skeletons) into `budget` tokens, for
+        phases that must quote code exactly. Files keep the given order unless `rank`. Returns (text, report)."""
+        reader = FileReader()
+        paths = [os.path.join(directory, p) for p in rel_paths]
+        if rank:
+            blocks = [(f["path"], f["content"]) for f in self.rank_files(directory, paths, reader)]
+        else:
+            blocks = []
+            for path in paths:
+                text = reader.read(path)
+                if text:
+                    blocks.append((os.path.relpath(path, directory), text))
+        return self.pack(blocks, budget)
+
+    def fit(self, text, budget):
+        """Fits an already ranked summary ('--- Path: ... ---' blocks, best first) into `budget` tokens.
+        Text without path blocks is cut at the budget. Returns (text, report)."""
+        if not text:
+            return "", self._report(budget)
+        headers = list(PATH_HEADER.finditer(text))
+        if not headers:
+            if self.estimate_tokens(text) <= budget:
+                report = self._report(budget)
+                report["used"] = self.estimate_tokens(text)
+                return text, report
+            cut, used = self._cut(text, budget)
+            report = self._report(budget)
+            report["used"] = used
+            report["truncated"].append("<text>")
+            return cut + "\n... [Context truncated to fit the token budget] ...", report
+        blocks = []
+        for header, nxt in zip(headers, headers[1:] + [None]):
+            body = text[header.end():nxt.start() if nxt else len(text)]
+            blocks.append((header.group(1), body.strip("\n")))
+        return self.pack(blocks, budget)
+
+    def pack(self, blocks, budget):
+        """Packs (path, content) blocks in order. Returns (summary, report)."""
+        report = self._report(budget)
+        parts = []
+        remaining = budget
+        for rel_path, content in blocks:
+            header = f"--- Path: {rel_path} ---\n"
+            cost = self.estimate_tokens(header + content)
+            if cost <= remaining:
+                parts.append(f"{header}{content}\n\n")
+                report["included"].append(rel_path)
+                report["bytes"] += len(content.encode("utf-8"))
+                remaining -= cost
+                continue
+            room = remaining - self.estimate_tokens(header)
+            if room >= Config.CONTEXT_MIN_FILE_TOKENS:
+                cut, used = self._cut(content, room)
+                parts.append(f"{header}{cut}\n... [truncated] ...\n\n")
+                report["truncated"].append(rel_path)
+                report["bytes"] += len(cut.encode("utf-8"))
+                remaining -= used + self.estimate_tokens(header)
+            else:
+                report["dropped"].append(rel_path)
+        report["used"] = budget - remaining
+        return "".join(parts), report
+
+    def _cut(self, content, budget):
+        """Longest line-aligned prefix of `content` within `budget` tokens. Returns (prefix, tokens)."""
+        kept = []
+        used = 0
+        for line in content.splitlines():
+            cost = self.estimate_tokens(line)
+            if used + cost > budget:
+                if not kept:
+                    # A single oversized line (minified code, prose): cut it at a token boundary
+                    end = 0
+                    for piece in TOKEN_PATTERN.finditer(line):
+                        used += 1 + len(piece.group()) // 8
+                        if used > budget:
+                            used -= 1 + len(piece.group()) // 8
+                            break
+                        end = piece.end()
+                    kept.append(line[:end])
+                break
+            kept.append(line)
+            used += cost
+        return "\n".join(kept), used
+
+    @staticmethod
+    def _report(budget):
+        return {"budget": budget, "used": 0, "bytes": 0, "included": [], "truncated": [], "dropped": []}
+
+    @staticmethod
+    def _is_entry_point(rel_path, content):
+        return os.path.basename(rel_path) in ENTRY_POINT_NAMES or bool(ENTRY_POINT_PATTERN.search(content))
+
+    def import_graph(self, contents):
+        """Maps every file to the set of workspace files it imports."""
+        modules = {}
+        for rel_path in contents:
+            if rel_path.endswith(".py"):
+                parts = rel_path[:-3].replace(os.sep, "/").split("/")
+                if parts[-1] == "__init__":
+                    parts = parts[:-1]
+                # Register every suffix so both `src.utils.x` and `utils.x` style imports resolve
+                for i in range(len(parts)):
+                    modules.setdefault(".".join(parts[i:]), rel_path)
+
+        graph = {}
+        for rel_path, content in contents.items():
+            targets = set()
+            if rel_path.endswith(".py"):
+                package = rel_path.replace(os.sep, "/").split("/")[:-1]
+                for match in PY_IMPORT.finditer(content):
+                    for name in self._python_candidates(match, package):
+                        if name in modules:
+                            targets.add(modules[name])
+            elif rel_path.endswith(CODE_EXTENSIONS):
+                base = os.path.dirname(rel_path)
+                for match in JS_IMPORT.finditer(content):
+                    target = os.path.normpath(os.path.join(base, match.group(1)))
+                    for ext in JS_EXTENSIONS:
+                        if target + ext in contents:
+                            targets.add(target + ext)
+                            break
+            graph[rel_path] = targets - {rel_path}
+        return graph
+
+    def _import_in_degree(self, contents):
+        """Counts, for every file, how many other workspace files import it."""
+        importers = {}
+        for rel_path, targets in self.import_graph(contents).items():
+            for target in targets:
+                importers.setdefault(target, set()).add(rel_path)
+        return {path: len(sources) for path, sources in importers.items()}
+
+    @staticmethod
+    def _python_candidates(match, package):
+        """Dotted module names an import statement may refer to."""
+        source, names, plain = match.groups()
+        if plain is not None:
+            return [n.split(" as ")[0].strip() for n in plain.split(",") if n.strip()]
+        dots = len(source) - len(source.lstrip("."))
+        source = source.lstrip(".")
+        if dots:
+            base = package[:len(package) - (dots - 1)] if dots > 1 else package
+            source = ".".join(base + ([source] if source else []))
+        candidates = [source] if source else []
+        for name in names.split(","):
+            name = name.split(" as ")[0].strip()
+            if name and name != "*":
+                candidates.append(f"{source}.{name}" if source else name)
+        return candidates
+
+    @staticmethod
+    def _git_recency(directory):
+        """Recency-weighted change counts per file over the last commits; empty unless `directory` is the
+        root of a git repository (a hardlinked or copied sandbox under SANDBOX_DIR has no .git, and git
+        would otherwise walk up to whatever repository encloses it, such as the app's own)."""
+        try:
+            toplevel = subprocess.run(
+                ["git", "-C", directory, "rev-parse", "--show-toplevel"], capture_output=True, text=True, timeout=10
+            ).stdout.strip()
+            if not toplevel or os.path.realpath(toplevel) != os.path.realpath(directory):
+                return {}
+            out = subprocess.run(
+                ["git", "-C", directory, "log", f"-n{Config.CONTEXT_GIT_COMMITS}", "--name-only", "--pretty=format:%x00"],
+                capture_output=True, text=True, timeout=10
+            ).stdout
+        except Exception as e:
+            logger.warning(f"Git recency unavailable: {e}")
+            return {}
+        commits = [c.strip().splitlines() for c in out.split("\x00") if c.strip()]
+        # A single (e.g. shallow) commit lists every file and says nothing about recency
+        if len(commits) < 2:
+            return {}
+        scores = {}
+        for age, paths in enumerate(commits):
+            for path in paths:
+                scores[path] = scores.get(path, 0.0) + 1.0 / (1 + age / 10)
+        return scores
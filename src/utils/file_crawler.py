@@ -0,0 +1,232 @@
+import os
+import re
+import sys
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from src.config import Config, logger
+
+def _translate(pattern):
+    """Translates one gitignore glob (without its flags) into a regex over '/'-separated paths."""
+    i, out = 0, []
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**/", i):
+                out.append("(?:.*/)?")
+                i += 3
+                continue
+            if pattern.startswith("**", i):
+                out.append(".*")
+                i += 2
+                continue
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2 if pattern.startswith("[!", i) or pattern.startswith("[]", i) else i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end + 1
+                continue
+        elif c == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+class IgnoreRules:
+    """The patterns of one .gitignore (or info/exclude) file, relative to the directory it lives in."""
+
+    def __init__(self, base, lines):
+        self.base = base
+        self.rules = []
+        for line in lines:
+            line = line.rstrip("\n")
+            if not line.endswith("\\ "):
+                line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            # A slash anywhere but the end anchors the pattern to this directory
+            anchored = "/" in line
+            regex = _translate(line.lstrip("/"))
+            self.rules.append((re.compile(("^" if anchored else "^(?:.*/)?") + regex + "$"), negate, dir_only))
+        self.prefix = base + "/" if base else ""
+        # Without negations the last-match-wins order is irrelevant: one alternation per entry type
+        self.combined = None
+        if not any(negate for _, negate, _ in self.rules):
+            file_rules = [r.pattern for r, _, dir_only in self.rules if not dir_only]
+            self.combined = (
+                re.compile("|".join(file_rules)) if file_rules else None,
+                re.compile("|".join(r.pattern for r, _, _ in self.rules)),
+            )
+
+    @classmethod
+    def load(cls, path, base):
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                rules = cls(base, f.readlines())
+        except OSError:
+            return None
+        return rules if rules.rules else None
+
+    def match(self, rel_path, is_dir):
+        """True/False when a pattern decides `rel_path` (relative to the crawl root), else None."""
+        if self.prefix:
+            if not rel_path.startswith(self.prefix):
+                return None
+            rel_path = rel_path[len(self.prefix):]
+        if self.combined is not None:
+            pattern = self.combined[1] if is_dir else self.combined[0]
+            return True if pattern is not None and pattern.match(rel_path) else None
+        for regex, negate, dir_only in reversed(self.rules):
+            if (is_dir or not dir_only) and regex.match(rel_path):
+                return not negate
+        return None
+
+class FileCrawler:
+    """Lists workspace files with os.scandir. Directories are scanned in parallel on a thread pool
+    (each scan stats its own entries) and files are yielded as soon as their directory is done,
+    so consumers can start reading before the crawl finishes.
+
+    Skips the configured vendor/build directories and whatever .gitignore files (nested ones too,
+    plus .git/info/exclude) exclude, filters by extension and drops files above a size limit.
+    Counters of the last crawl are kept in `stats`."""
+
+    def __init__(self, extensions=None, ignore_dirs=None, max_file_bytes=None, max_files=None, workers=None, gitignore=None):
+        extensions = Config.CRAWL_EXTENSIONS if extensions is None else extensions
+        self.extensions = {e.lower() for e in extensions} if extensions else None
+        # Multi-dot suffixes such as '.d.ts' cannot be found by the last-dot lookup
+        self.compound = tuple(e for e in self.extensions or () if e.count(".") > 1)
+        self.ignore_dirs = set(Config.CRAWL_IGNORE_DIRS if ignore_dirs is None else ignore_dirs)
+        self.max_file_bytes = Config.CRAWL_MAX_FILE_BYTES if max_file_bytes is None else max_file_bytes
+        self.max_files = Config.CRAWL_MAX_FILES if max_files is None else max_files
+        self.workers = max(1, workers or Config.CRAWL_WORKERS)
+        self.gitignore = Config.CRAWL_GITIGNORE if gitignore is None else gitignore
+        self.stats = {}
+
+    def _wanted(self, name):
+        if self.extensions is None:
+            return True
+        dot = name.rfind(".")
+        if dot > 0 and name[dot:].lower() in self.extensions:
+            return True
+        return bool(self.compound) and name.lower().endswith(self.compound)
+
+    @staticmethod
+    def _ignored(rules, rel_path, is_dir):
+        # Deeper .gitignore files override shallower ones
+        for ruleset in reversed(rules):
+            matched = ruleset.match(rel_path, is_dir)
+            if matched is not None:
+                return matched
+        return False
+
+    def _scan(self, path, rel, rules):
+        """Scans one directory. Returns (files, subdirectories, rules for the subdirectories, counters)."""
+        counts = {"dirs": 1, "seen": 0, "ignored": 0, "filtered": 0, "too_large": 0, "bytes": 0}
+        if self.gitignore:
+            local = IgnoreRules.load(os.path.join(path, ".gitignore"), rel)
+            if local:
+                rules = rules + (local,)
+        files, dirs = [], []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    name = entry.name
+                    child = f"{rel}/{name}" if rel else name
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if name in self.ignore_dirs or (rules and self._ignored(rules, child, True)):
+                                counts["ignored"] += 1
+                            else:
+                                dirs.append((entry.path, child))
+                            continue
+                        if not entry.is_file():
+                            continue
+                        counts["seen"] += 1
+                        if not self._wanted(name):
+                            counts["filtered"] += 1
+                            continue
+                        if rules and self._ignored(rules, child, False):
+                            counts["ignored"] += 1
+                            continue
+                        size = entry.stat().st_size
+                    except OSError:
+                        continue
+                    if self.max_file_bytes and size > self.max_file_bytes:
+                        counts["too_large"] += 1
+                        continue
+                    counts["bytes"] += size
+                    files.append(entry.path)
+        except OSError as e:
+            logger.warning(f"Crawler: cannot scan {path}: {e}")
+        return files, dirs, rules, counts
+
+    def crawl(self, directory):
+        """Yields absolute paths of the wanted files under `directory`, in no particular order."""
+        root = os.path.abspath(directory)
+        started = time.monotonic()
+        self.stats = {"dirs": 0, "seen": 0, "ignored": 0, "filtered": 0, "too_large": 0, "bytes": 0, "files": 0, "truncated": False, "seconds": 0.0}
+        rules = ()
+        if self.gitignore:
+            exclude = IgnoreRules.load(os.path.join(root, ".git", "info", "exclude"), "")
+            rules = (exclude,) if exclude else ()
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crawl") if self.workers > 1 else None
+        # Finished scans arrive on a queue (cheaper than futures.wait over thousands of pending scans)
+        done = queue.SimpleQueue()
+        stack = []
+
+        def submit(path, rel, rules):
+            if pool is None:
+                stack.append((path, rel, rules))
+            else:
+                pool.submit(self._scan, path, rel, rules).add_done_callback(done.put)
+
+        submit(root, "", rules)
+        outstanding = 1
+        try:
+            while outstanding:
+                if pool is None:
+                    files, dirs, child_rules, counts = self._scan(*stack.pop())
+                else:
+                    files, dirs, child_rules, counts = done.get().result()
+                outstanding -= 1
+                for path, rel in dirs:
+                    submit(path, rel, child_rules)
+                outstanding += len(dirs)
+                for name, value in counts.items():
+                    self.stats[name] += value
+                for path in files:
+                    if self.max_files and self.stats["files"] >= self.max_files:
+                        self.stats["truncated"] = True
+                        return
+                    self.stats["files"] += 1
+                    yield path
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+            self.stats["seconds"] = round(time.monotonic() - started, 4)
+
+    def list_files(self, directory):
+        """The crawl as a sorted list."""
+        print(f"--- Crawling directory: {os.path.basename(os.path.abspath(directory))} ---", file=sys.stderr, flush=True)
+        files = sorted(self.crawl(directory))
+        if self.stats["truncated"]:
+            logger.info(f"Crawler: stopped at {self.max_files} files in {directory}")
+        return files
@@ -0,0 +1,137 @@
+import os
+import re
+import time
+import codecs
+import hashlib
+import threading
+from src.config import Config, logger
+
+# UTF-32 first: its little-endian BOM starts with the UTF-16 one
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"), (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"),
+)
+SNIFF_BYTES = 8192
+GENERATED_NAMES = re.compile(
+    r"(?:\.min\.(?:js|css)|[.-]bundle\.js|\.chunk\.js|_pb2(?:_grpc)?\.py|\.pb\.go|\.generated\.\w+|\.g\.dart"
+    r"|(?:^|/)(?:package-lock\.json|yarn\.lock|pnpm-lock\.yaml|poetry\.lock|Pipfile\.lock))$"
+)
+GENERATED_MARKERS = re.compile(r"@generated|DO NOT EDIT|Code generated by|auto-?generated (?:file|code)|automatically generated", re.IGNORECASE)
+GENERATED_HEADER_LINES = 5
+DIGEST_CHUNK = 1 << 20
+RACY_SECONDS = 2 # A file modified this recently may change again within its mtime tick: never cache its digest
+
+_digests = {}
+_digests_lock = threading.Lock()
+
+def file_digest(path):
+    """SHA-256 of a file's full content, streamed in chunks so memory stays bounded. Digests are
+    cached per (size, mtime, inode), so unchanged files are not re-read. None if unreadable."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    with _digests_lock:
+        cached = _digests.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(DIGEST_CHUNK), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    value = digest.hexdigest()
+    if time.time() - stat.st_mtime > RACY_SECONDS:
+        with _digests_lock:
+            _digests[path] = (key, value)
+    return value
+
+class FileReader:
+    """Reads source files for context building with bounded memory.
+
+    Only a prefix of at most `limit` bytes (READ_MAX_BYTES) is read and a cut prefix ends at a line
+    boundary. Binary content is sniffed from the first bytes (NUL bytes without a UTF-16/32 BOM);
+    the encoding comes from the BOM, then UTF-8, then READ_FALLBACK_ENCODING, so Latin-1 or cp1252
+    files are no longer dropped. Generated files (lockfiles, protobuf output, '@generated' headers)
+    and minified ones (very long average lines) are skipped. `stats` counts what was read and skipped."""
+
+    def __init__(self, limit=None, skip_generated=True):
+        self.limit = Config.READ_MAX_BYTES if limit is None else limit
+        self.skip_generated = skip_generated
+        self.stats = {"read": 0, "bytes_read": 0, "cut": 0, "binary": 0, "generated": 0, "minified": 0, "fallback_encoding": 0, "unreadable": 0}
+
+    @staticmethod
+    def _decode(data, final):
+        """Returns (text, encoding) or (None, None) for binary data. Without `final`, a multi-byte
+        character split at the end of the prefix is dropped instead of failing the decode."""
+        for bom, encoding in BOMS:
+            if data.startswith(bom):
+                return codecs.getincrementaldecoder(encoding)(errors="replace").decode(data, final), encoding
+        if b"\0" in data[:SNIFF_BYTES]:
+            return None, None
+        try:
+            return codecs.getincrementaldecoder("utf-8")().decode(data, final), "utf-8"
+        except UnicodeDecodeError:
+            return data.decode(Config.READ_FALLBACK_ENCODING, errors="replace"), Config.READ_FALLBACK_ENCODING
+
+    def _skip_reason(self, path, text):
+        if GENERATED_NAMES.search(path.replace(os.sep, "/")):
+            return "generated"
+        header = "\n".join(text.split("\n", GENERATED_HEADER_LINES)[:GENERATED_HEADER_LINES])
+        if GENERATED_MARKERS.search(header):
+            return "generated"
+        if len(text) >= Config.READ_MINIFIED_MIN_CHARS and len(text) / (text.count("\n") + 1) > Config.READ_MINIFIED_LINE_LENGTH:
+            return "minified"
+        return None
+
+    def read_prefix(self, path, limit=None):
+        """Returns (text, truncated); text is None for binary, generated, minified or unreadable files."""
+        limit = self.limit if limit is None else limit
+        try:
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                data = f.read(limit) if limit else f.read()
+        except OSError as e:
+            self.stats["unreadable"] += 1
+            logger.error(f"Error reading file {path}: {e}")
+            return None, False
+        self.stats["bytes_read"] += len(data)
+        truncated = len(data) < size
+        text, encoding = self._decode(data, final=not truncated)
+        if text is None:
+            self.stats["binary"] += 1
+            return None, truncated
+        if encoding == Config.READ_FALLBACK_ENCODING:
+            self.stats["fallback_encoding"] += 1
+        if self.skip_generated:
+            reason = self._skip_reason(path, text)
+            if reason:
+                self.stats[reason] += 1
+                return None, truncated
+        if truncated:
+            self.stats["cut"] += 1
+            cut = text.rfind("\n")
+            if cut > 0:
+                text = text[:cut + 1]
+        self.stats["read"] += 1
+        return text, truncated
+
+    def read(self, path, limit=None):
+        """The text of `path` (see `read_prefix`), or None."""
+        return self.read_prefix(path, limit)[0]
+
+    def read_tail(self, path, size=None):
+        """The last `size` bytes of a file decoded leniently, for signals that live at the end
+        (e.g. `if __name__ == "__main__":`) of files whose prefix was cut."""
+        size = size or Config.READ_TAIL_BYTES
+        try:
+            with open(path, "rb") as f:
+                f.seek(max(0, os.fstat(f.fileno()).st_size - size))
+                data = f.read(size)
+        except OSError:
+            return ""
+        self.stats["bytes_read"] += len(data)
+        return data.decode("utf-8", errors="replace")
@@ -1,16 +1,34 @@
 import os
 import shutil
 from git import Repo
-from src.config import logger
+from src.config import Config, logger
+from src.utils.file_crawler import FileCrawler
+from src.utils.file_reader import FileReader
+from src.utils.repo_cache import RepoCache, get_repo_cache
 
 class GitHubUtils:
     @staticmethod
     def clone_repository(repo_url, target_dir):
-        """Clones a GitHub repository to a local directory."""
+        """Checks out a GitHub repository into a local directory: a worktree of the cached bare
+        mirror when the clone cache is enabled, otherwise a shallow, blob-filtered, sparse clone."""
+        if Config.CLONE_CACHE_ENABLED:
+            try:
+                get_repo_cache().checkout(repo_url, target_dir)
+                logger.info(f"Repository checked out from the clone cache to {target_dir}")
+                return True
+            except Exception as e:
+                logger.warning(f"Clone cache failed for {repo_url}, cloning directly: {e}")
         try:
             if os.path.exists(target_dir):
                 shutil.rmtree(target_dir)
-            Repo.clone_from(repo_url, target_dir)
+            try:
+                Repo.clone_from(repo_url, target_dir, no_checkout=True, **RepoCache.clone_options())
+                RepoCache.sparse_checkout(target_dir)
+            except Exception as e:
+                # Servers without shallow/filter support: fall back to a plain clone
+                logger.warning(f"Shallow clone failed, retrying a full clone: {e}")
+                shutil.rmtree(target_dir, ignore_errors=True)
+                Repo.clone_from(repo_url, target_dir)
             logger.info(f"Repository cloned successfully to {target_dir}")
             return True
         except Exception as e:
@@ -19,23 +37,10 @@ class GitHubUtils:
 
     @staticmethod
     def list_files(directory, extensions=None):
-        """Lists files in a directory, optionally filtered by extensions."""
-        if extensions is None:
-            extensions = ['.py', '.js', '.ts', '.html', '.css']
-        
-        file_list = []
-        for root, _, files in os.walk(directory):
-            for file in files:
-                if any(file.endswith(ext) for ext in extensions):
-                    file_list.append(os.path.join(root, file))
-        return file_list
+        """Lists files in a directory, optionally filtered by extensions (defaults to CRAWL_EXTENSIONS)."""
+        return FileCrawler(extensions=extensions).list_files(directory)
 
     @staticmethod
     def read_file_content(file_path):
-        """Reads the content of a file."""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        except Exception as e:
-            logger.error(f"Error reading file {file_path}: {e}")
-            return None
+        """Reads the content of a file, detecting its encoding (non-UTF-8 files are no longer dropped)."""
+        return FileReader(limit=0, skip_generated=False).read(file_path)
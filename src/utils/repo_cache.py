@@ -0,0 +1,203 @@
+import os
+import re
+import time
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+from git import Git
+from src.config import Config, logger
+
+try:
+    import fcntl
+except ImportError: # Windows: mirrors are only locked within this process
+    fcntl = None
+
+FETCHED_MARKER = "debugger-fetched"
+USED_MARKER = "debugger-used"
+
+class RepoCache:
+    """Local bare mirrors of remote repositories, keyed by URL.
+
+    A mirror is created once as a shallow, blob-filtered clone and refreshed with a fetch on later
+    use; every session gets its own `git worktree` of it, so checking out a repository analyzed
+    before only fetches what changed. Blobs fetched for one checkout stay in the mirror for the
+    next. Mirrors are evicted least-recently-used once the cache exceeds its size bound."""
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or Config.CLONE_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else Config.CLONE_CACHE_MAX_BYTES
+        self.stats = {"hits": 0, "misses": 0, "fetches": 0, "fetch_failures": 0, "evictions": 0}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    # --- Clone options shared with direct clones ---
+
+    @staticmethod
+    def clone_options():
+        """GitPython kwargs for a shallow, blob-filtered, single-branch clone (per CLONE_DEPTH / CLONE_FILTER)."""
+        options = {"single_branch": True}
+        if Config.CLONE_DEPTH > 0:
+            options["depth"] = Config.CLONE_DEPTH
+        if Config.CLONE_FILTER:
+            options["filter"] = Config.CLONE_FILTER
+        return options
+
+    @staticmethod
+    def sparse_checkout(worktree):
+        """Checks out a `--no-checkout` clone/worktree without the directories the crawler skips,
+        so their blobs are never fetched. Falls back to a full checkout when sparse is off or fails."""
+        git = Git(worktree)
+        if Config.CLONE_SPARSE:
+            patterns = ["/*"] + [f"!{d}/" for d in Config.CRAWL_IGNORE_DIRS if d != ".git"]
+            try:
+                git.sparse_checkout("set", "--no-cone", *patterns)
+            except Exception as e:
+                logger.warning(f"Sparse checkout unavailable, checking out everything: {e}")
+        git.checkout(kill_after_timeout=Config.CLONE_TIMEOUT)
+
+    # --- Mirrors ---
+
+    def mirror_path(self, repo_url):
+        name = re.sub(r"[^A-Za-z0-9._-]+", "_", repo_url.rstrip("/").split("/")[-1].removesuffix(".git")) or "repo"
+        return os.path.join(self.root, f"{name[:40]}-{hashlib.sha1(repo_url.encode('utf-8')).hexdigest()[:12]}.git")
+
+    @contextmanager
+    def _locked(self, mirror, blocking=True):
+        """Serializes work on one mirror across threads and (via flock) across processes.
+        Yields False when `blocking` is off and the mirror is busy."""
+        with self._lock:
+            lock = self._locks.setdefault(mirror, threading.Lock())
+        if not lock.acquire(blocking):
+            yield False
+            return
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(mirror + ".lock", "a") as handle:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(handle, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                    except OSError:
+                        yield False
+                        return
+                yield True
+        finally:
+            lock.release()
+
+    @staticmethod
+    def _touch(path):
+        with open(path, "a"):
+            os.utime(path, None)
+
+    def _refresh(self, repo_url, mirror):
+        """Creates the mirror, or fetches its branch when the last fetch is older than CLONE_FETCH_INTERVAL."""
+        if not os.path.isdir(mirror):
+            self.stats["misses"] += 1
+            tmp = mirror + ".tmp"
+            shutil.rmtree(tmp, ignore_errors=True)
+            Git().clone(repo_url, tmp, bare=True, kill_after_timeout=Config.CLONE_TIMEOUT, **self.clone_options())
+            self._touch(os.path.join(tmp, FETCHED_MARKER))
+            os.replace(tmp, mirror)
+            logger.info(f"Clone cache: mirrored {repo_url}")
+            return
+        self.stats["hits"] += 1
+        git = Git(mirror)
+        # Worktrees of finished sessions are deleted as plain directories
+        git.worktree("prune")
+        marker = os.path.join(mirror, FETCHED_MARKER)
+        if os.path.exists(marker) and time.time() - os.path.getmtime(marker) < Config.CLONE_FETCH_INTERVAL:
+            return
+        try:
+            branch = git.symbolic_ref("HEAD")
+            fetch_options = {k: v for k, v in self.clone_options().items() if k != "single_branch"}
+            git.fetch("origin", f"+{branch}:{branch}", kill_after_timeout=Config.CLONE_TIMEOUT, **fetch_options)
+            self._touch(marker)
+            self.stats["fetches"] += 1
+        except Exception as e:
+            # A stale mirror still beats no checkout (e.g. while offline)
+            self.stats["fetch_failures"] += 1
+            logger.warning(f"Clone cache: fetch failed for {repo_url}, using the cached revision: {e}")
+
+    def checkout(self, repo_url, target_dir):
+        """Checks out the default branch of `repo_url` into `target_dir` as a worktree of its mirror."""
+        mirror = self.mirror_path(repo_url)
+        with self._locked(mirror):
+            self._refresh(repo_url, mirror)
+            if os.path.exists(target_dir):
+                shutil.rmtree(target_dir)
+            Git(mirror).worktree("add", "--detach", "--no-checkout", os.path.abspath(target_dir), "HEAD")
+            self.sparse_checkout(target_dir)
+            self._touch(os.path.join(mirror, USED_MARKER))
+        self.evict(keep=mirror)
+        return target_dir
+
+    # --- Eviction ---
+
+    @staticmethod
+    def _size(path):
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.lstat(os.path.join(root, name)).st_size
+                except OSError:
+                    pass
+        return total
+
+    def _mirrors(self):
+        """[(last_used, path, size)] of every mirror in the cache."""
+        mirrors = []
+        if not os.path.isdir(self.root):
+            return mirrors
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith(".git") and os.path.isdir(path):
+                marker = os.path.join(path, USED_MARKER)
+                used = os.path.getmtime(marker) if os.path.exists(marker) else os.path.getmtime(path)
+                mirrors.append((used, path, self._size(path)))
+        return mirrors
+
+    def evict(self, keep=None):
+        """Deletes least recently used mirrors until the cache fits CLONE_CACHE_MAX_BYTES. Mirrors with
+        live worktrees (sessions still using them) or held by another process are skipped."""
+        if not self.max_bytes:
+            return 0
+        mirrors = self._mirrors()
+        total = sum(size for _, _, size in mirrors)
+        evicted = 0
+        for _, path, size in sorted(mirrors):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            with self._locked(path, blocking=False) as acquired:
+                if not acquired:
+                    continue
+                try:
+                    Git(path).worktree("prune")
+                except Exception:
+                    pass
+                worktrees = os.path.join(path, "worktrees")
+                if os.path.isdir(worktrees) and os.listdir(worktrees):
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            evicted += 1
+            self.stats["evictions"] += 1
+            logger.info(f"Clone cache: evicted {os.path.basename(path)} ({size / (1024 * 1024):.1f} MB)")
+        return evicted
+
+    def snapshot(self):
+        mirrors = self._mirrors()
+        return {**self.stats, "mirrors": len(mirrors), "bytes": sum(size for _, _, size in mirrors), "max_bytes": self.max_bytes}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_repo_cache():
+    """Returns the process-wide clone cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RepoCache()
+        return _cache
@@ -0,0 +1,225 @@
+import os
+import re
+import ast
+import json
+import threading
+import numpy as np
+from src.config import Config, logger
+from src.utils.file_reader import FileReader
+from src.utils.context_builder import ContextBuilder
+
+WORD_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+SUBWORD_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+JS_BOUNDARY = re.compile(r"^(?:export\s+)?(?:default\s+)?(?:async\s+)?(?:function\*?\s+(\w+)|class\s+(\w+)|(?:const|let|var)\s+(\w+)\s*=)", re.MULTILINE)
+
+def tokenize(text):
+    """Lower-cased identifiers plus their camelCase/snake_case parts, so `getUserId` matches 'user id'."""
+    terms = []
+    for word in WORD_PATTERN.findall(text):
+        lower = word.lower()
+        terms.append(lower)
+        parts = [p.lower() for piece in word.split("_") for p in SUBWORD_PATTERN.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+class RetrievalIndex:
+    """Local BM25 index over code chunks (one per function/class, module remainder, or line window).
+
+    Postings are stored term-major in flat NumPy arrays with precomputed BM25 weights, so a query
+    is a handful of slices and one bincount. The index is persisted next to the workspace."""
+
+    def __init__(self, chunks=None, vocab=None, offsets=None, doc_ids=None, weights=None):
+        self.chunks = chunks or []
+        self.vocab = vocab or {}
+        self.offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self.doc_ids = doc_ids if doc_ids is not None else np.zeros(0, dtype=np.int32)
+        self.weights = weights if weights is not None else np.zeros(0, dtype=np.float32)
+
+    @staticmethod
+    def index_dir(workspace_dir):
+        """Index location: a sibling of the workspace, so it never shows up in crawls or patches."""
+        return os.path.normpath(workspace_dir) + ".index"
+
+    # --- Chunking ---
+
+    def chunk_file(self, rel_path, content):
+        """Splits a file into [{'path', 'name', 'start', 'end', 'text'}] (1-based inclusive lines)."""
+        lines = content.splitlines()
+        if not lines:
+            return []
+        spans = None
+        if rel_path.endswith(".py"):
+            spans = self._python_spans(content)
+        elif rel_path.endswith((".js", ".ts", ".jsx", ".tsx")):
+            spans = self._js_spans(content, len(lines))
+        if not spans:
+            spans = [("", start, min(start + Config.RETRIEVAL_WINDOW_LINES - 1, len(lines)))
+                     for start in range(1, len(lines) + 1, Config.RETRIEVAL_WINDOW_LINES)]
+
+        chunks = []
+        covered = set()
+        for name, start, end in spans:
+            covered.update(range(start, end + 1))
+            chunks.append(self._chunk(rel_path, name, start, end, lines))
+        # Imports, constants and top-level statements outside any definition
+        rest = [i for i in range(1, len(lines) + 1) if i not in covered and lines[i - 1].strip()]
+        if rest:
+            text = "\n".join(lines[i - 1] for i in rest)
+            chunks.append({"path": rel_path, "name": "<module>", "start": rest[0], "end": rest[-1], "text": text})
+        return chunks
+
+    @staticmethod
+    def _chunk(rel_path, name, start, end, lines):
+        return {"path": rel_path, "name": name, "start": start, "end": end, "text": "\n".join(lines[start - 1:end])}
+
+    def _python_spans(self, content):
+        try:
+            tree = ast.parse(content)
+        except SyntaxError:
+            return None
+        spans = []
+        for node in tree.body:
+            if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                continue
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+            size = ContextBuilder.estimate_tokens("\n".join(content.splitlines()[start - 1:node.end_lineno]))
+            methods = [m for m in node.body if isinstance(m, (ast.FunctionDef, ast.AsyncFunctionDef))] if isinstance(node, ast.ClassDef) else []
+            if methods and size > Config.RETRIEVAL_CHUNK_MAX_TOKENS:
+                # Large classes: header up to the first method, then one chunk per method
+                first = min([methods[0].lineno] + [d.lineno for d in methods[0].decorator_list])
+                spans.append((node.name, start, first - 1))
+                for m in methods:
+                    m_start = min([m.lineno] + [d.lineno for d in m.decorator_list])
+                    spans.append((f"{node.name}.{m.name}", m_start, m.end_lineno))
+            else:
+                spans.append((node.name, start, node.end_lineno))
+        return spans
+
+    @staticmethod
+    def _js_spans(content, total_lines):
+        starts = []
+        for match in JS_BOUNDARY.finditer(content):
+            line = content.count("\n", 0, match.start()) + 1
+            starts.append((next(g for g in match.groups() if g), line))
+        spans = []
+        for (name, start), nxt in zip(starts, starts[1:] + [None]):
+            spans.append((name, start, (nxt[1] - 1) if nxt else total_lines))
+        return spans
+
+    # --- Building & persistence ---
+
+    @classmethod
+    def build(cls, directory, files):
+        """Chunks and indexes `files` (absolute paths under `directory`)."""
+        index = cls()
+        chunks = []
+        # Whole files (the crawler already bounds their size), minus binary, generated and minified ones
+        reader = FileReader(limit=0)
+        for file_path in files:
+            content = reader.read(file_path)
+            if content:
+                chunks.extend(index.chunk_file(os.path.relpath(file_path, directory), content))
+
+        vocab = {}
+        term_ids, doc_ids, tfs = [], [], []
+        doc_lens = np.zeros(len(chunks), dtype=np.float32)
+        for doc, chunk in enumerate(chunks):
+            # Path and symbol name count twice: they are the strongest hint of what a chunk is about
+            terms = tokenize(chunk["text"]) + 2 * tokenize(f"{chunk['path']} {chunk['name']}")
+            doc_lens[doc] = len(terms)
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, tf in counts.items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(doc)
+                tfs.append(tf)
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        tfs = np.asarray(tfs, dtype=np.float32)
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, doc_ids, tfs = term_ids[order], doc_ids[order], tfs[order]
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=offsets[1:])
+
+        if len(chunks):
+            k1, b = Config.BM25_K1, Config.BM25_B
+            df = np.diff(offsets).astype(np.float32)
+            idf = np.log(1.0 + (len(chunks) - df + 0.5) / (df + 0.5))
+            norm = k1 * (1 - b + b * doc_lens[doc_ids] / max(float(doc_lens.mean()), 1.0))
+            weights = (idf[term_ids] * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32)
+        else:
+            weights = np.zeros(0, dtype=np.float32)
+        return cls(chunks, vocab, offsets, doc_ids, weights)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.savez(os.path.join(path, "postings.npz"), offsets=self.offsets, doc_ids=self.doc_ids, weights=self.weights)
+        with open(os.path.join(path, "chunks.json"), "w", encoding="utf-8") as f:
+            json.dump({"chunks": self.chunks, "vocab": self.vocab}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "chunks.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = np.load(os.path.join(path, "postings.npz"))
+        return cls(meta["chunks"], meta["vocab"], arrays["offsets"], arrays["doc_ids"], arrays["weights"])
+
+    # --- Querying ---
+
+    def search(self, query, k=None):
+        """Returns up to k (score, chunk) pairs, best first."""
+        k = k or Config.RETRIEVAL_TOP_K
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids or not self.chunks:
+            return []
+        slices = [slice(self.offsets[t], self.offsets[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.doc_ids[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        scores = np.bincount(docs, weights=weights, minlength=len(self.chunks))
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self.chunks[i]) for i in top]
+
+    def retrieve(self, query, budget, k=None):
+        """Packs the top-k chunks for `query` into `budget` tokens. Returns (context, hits)."""
+        parts = []
+        hits = []
+        remaining = budget
+        for score, chunk in self.search(query, k):
+            label = f" ({chunk['name']})" if chunk["name"] else ""
+            block = f"--- Path: {chunk['path']} lines {chunk['start']}-{chunk['end']}{label} ---\n{chunk['text']}\n\n"
+            cost = ContextBuilder.estimate_tokens(block)
+            if cost > remaining:
+                continue
+            parts.append(block)
+            hits.append({"path": chunk["path"], "name": chunk["name"], "start": chunk["start"], "end": chunk["end"], "score": round(score, 3)})
+            remaining -= cost
+        return "".join(parts), hits
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(workspace_dir):
+    """Returns the persisted index of a workspace (loaded once per process and version), or None."""
+    path = RetrievalIndex.index_dir(workspace_dir)
+    marker = os.path.join(path, "chunks.json")
+    if not os.path.exists(marker):
+        return None
+    version = os.path.getmtime(marker)
+    with _indexes_lock:
+        cached = _indexes.get(path)
+        if cached and cached[0] == version:
+            return cached[1]
+        try:
+            index = RetrievalIndex.load(path)
+        except Exception as e:
+            logger.warning(f"Could not load retrieval index {path}: {e}")
+            return None
+        _indexes[path] = (version, index)
+        return index
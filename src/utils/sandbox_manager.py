@@ -0,0 +1,358 @@
+import os
+import sys
+import re
+import json
+import time
+import shutil
+import fnmatch
+import tempfile
+import threading
+from git import Git
+from src.config import Config, logger
+
+try:
+    import fcntl
+except ImportError: # Windows: no reflinks
+    fcntl = None
+
+# Skipped when sandboxing a local repository
+COPY_IGNORE = (
+    '.git', 'node_modules', '__pycache__', 'softenv',
+    '.venv', 'venv', 'env', '.idea', '.vscode',
+    'dist', 'build', '.pytest_cache', '.next', '.nuxt',
+    'vendor', 'target', '.terraform', '.serverless',
+    '*.pyc', '*.pyo', '*.pyd', '.DS_Store'
+)
+
+MODES = ("reflink", "hardlink", "worktree", "copy")
+META_SUFFIX = ".sandbox.json"
+FICLONE = 0x40049409 # Linux ioctl sharing every extent of a file (Btrfs, XFS, bcachefs, ...)
+IGNORE_NAMES = frozenset(p for p in COPY_IGNORE if not any(c in p for c in "*?["))
+IGNORE_GLOBS = re.compile("|".join(fnmatch.translate(p) for p in COPY_IGNORE if p not in IGNORE_NAMES))
+RECENT = 60 # Seconds a sandbox is safe from quota eviction after its last use
+
+class Unsupported(Exception):
+    """Raised when a sandbox mode cannot work for a source/target pair."""
+
+def _reflink(src, dst):
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    shutil.copystat(src, dst)
+
+def detach(path):
+    """Gives a hardlinked (or symlinked) sandbox file its own inode, so writing it cannot change
+    the original. Reflinked, worktree and copied files need nothing. Returns True when a link was broken."""
+    try:
+        stat = os.lstat(path)
+    except FileNotFoundError:
+        return False
+    if stat.st_nlink < 2 and not os.path.islink(path):
+        return False
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.cow"
+    shutil.copy2(path, tmp)
+    os.replace(tmp, path)
+    return True
+
+class SandboxManager:
+    """Per-session workspaces of local repositories that cost almost nothing to set up.
+
+    A sandbox shares the original's data instead of copying it: reflinked files (copy-on-write in
+    the filesystem), hardlinks broken by `detach` right before PatchManager writes a file, or a
+    `git worktree` of a clean repository; a plain copy is the last resort. Each sandbox has a
+    sidecar `<dir>.sandbox.json` recording its source, mode, owners (sessions and jobs) and last
+    use. `gc` deletes unowned sandboxes after SANDBOX_TTL, abandoned ones after SANDBOX_MAX_IDLE,
+    and the least recently used unowned ones while the total exceeds SANDBOX_QUOTA_BYTES."""
+
+    def __init__(self, root=None, quota_bytes=None):
+        self.root = os.path.abspath(root or Config.SANDBOX_DIR)
+        self.quota_bytes = quota_bytes if quota_bytes is not None else Config.SANDBOX_QUOTA_BYTES
+        self.stats = {"created": 0, "removed": 0, "fallbacks": 0, **{mode: 0 for mode in MODES}}
+        self._lock = threading.Lock()
+        self._gc_lock = threading.Lock()
+
+    # --- Setup ---
+
+    def allocate(self):
+        """A fresh, empty sandbox directory under SANDBOX_DIR."""
+        os.makedirs(self.root, exist_ok=True)
+        return tempfile.mkdtemp(prefix="ws_", dir=self.root)
+
+    @staticmethod
+    def _modes():
+        if Config.SANDBOX_MODE in MODES:
+            return (Config.SANDBOX_MODE,) if Config.SANDBOX_MODE == "copy" else (Config.SANDBOX_MODE, "copy")
+        return MODES
+
+    def _replicate(self, source, target, link):
+        """Recreates the directories of `source` under `target` and fills them with `link(src, dst)`
+        (reflink, hardlink or copy), skipping COPY_IGNORE. Symlinked files stay symlinks; the first
+        failure aborts, so an unsupported mode falls back before touching the rest of the tree."""
+        # Never recurse into the sandboxes themselves (SANDBOX_DIR may live inside the source)
+        skip = {path for path in (self.root, target) if path.startswith(source + os.sep)}
+        stack = [(source, target)]
+        while stack:
+            src_dir, dst_dir = stack.pop()
+            with os.scandir(src_dir) as entries:
+                for entry in entries:
+                    if entry.name in IGNORE_NAMES or IGNORE_GLOBS.match(entry.name):
+                        continue
+                    dst = os.path.join(dst_dir, entry.name)
+                    if entry.is_dir():
+                        if entry.path not in skip:
+                            os.mkdir(dst)
+                            stack.append((entry.path, dst))
+                    elif entry.is_symlink():
+                        os.symlink(os.readlink(entry.path), dst)
+                    else:
+                        link(entry.path, dst)
+
+    def _reflink_tree(self, source, target):
+        if fcntl is None or not sys.platform.startswith("linux"):
+            raise Unsupported("reflinks need Linux")
+        self._replicate(source, target, _reflink)
+
+    def _hardlink_tree(self, source, target):
+        if os.stat(source).st_dev != os.stat(target).st_dev:
+            raise Unsupported("source and SANDBOX_DIR are on different filesystems")
+        self._replicate(source, target, os.link)
+
+    def _worktree_tree(self, source, target):
+        git = Git(source)
+        try:
+            toplevel = git.rev_parse("--show-toplevel")
+        except Exception:
+            raise Unsupported("not a git repository")
+        if os.path.realpath(toplevel) != os.path.realpath(source):
+            raise Unsupported("not the repository root")
+        if git.status("--porcelain"):
+            raise Unsupported("uncommitted changes would be missing from a worktree")
+        os.rmdir(target)
+        try:
+            git.worktree("add", "--detach", target, "HEAD")
+        except Exception as e:
+            raise Unsupported(e)
+
+    def _copy_tree(self, source, target):
+        self._replicate(source, target, shutil.copy2)
+
+    def create(self, source, target_dir=None, owner=None):
+        """Sandboxes `source` (a directory or a single file) into `target_dir` (default: a new
+        directory under SANDBOX_DIR). Returns the sandbox directory."""
+        source = os.path.abspath(source)
+        target_dir = os.path.abspath(target_dir or self.allocate())
+        if os.path.lexists(target_dir) and (not os.path.isdir(target_dir) or os.listdir(target_dir)):
+            self.remove(target_dir)
+        os.makedirs(target_dir, exist_ok=True)
+        started = time.monotonic()
+        # The sidecar comes first so gc never mistakes a sandbox being built for an orphan
+        self._write_meta(target_dir, {"source": source, "mode": "pending", "owners": [owner] if owner else [], "created": time.time(), "last_used": time.time()})
+        if os.path.isfile(source):
+            shutil.copy2(source, os.path.join(target_dir, os.path.basename(source)))
+            mode = "copy"
+        else:
+            for mode in self._modes():
+                try:
+                    getattr(self, f"_{mode}_tree")(source, target_dir)
+                    break
+                except (Unsupported, OSError) as e:
+                    if mode == "copy":
+                        raise
+                    logger.info(f"Sandbox: {mode} unavailable for {source}: {e}")
+                    self.stats["fallbacks"] += 1
+                    self._clear(target_dir)
+        with self._lock:
+            self.stats["created"] += 1
+            self.stats[mode] += 1
+            meta = self._read_meta(target_dir) or {}
+            meta["mode"] = mode
+            self._write_meta(target_dir, meta)
+        print(f"--- Sandbox ({mode}) of {os.path.basename(source)} ready in {time.monotonic() - started:.2f}s ---", file=sys.stderr, flush=True)
+        self.collect()
+        return target_dir
+
+    def register(self, path, source, mode, owner=None):
+        """Tracks a workspace created elsewhere (e.g. a clone) so it is garbage-collected like a sandbox."""
+        now = time.time()
+        with self._lock:
+            self._write_meta(path, {"source": source, "mode": mode, "owners": [owner] if owner else [], "created": now, "last_used": now})
+        self.collect()
+
+    # --- Ownership ---
+
+    @staticmethod
+    def _meta_path(path):
+        return os.path.normpath(path) + META_SUFFIX
+
+    def _read_meta(self, path):
+        try:
+            with open(self._meta_path(path), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, path, meta):
+        tmp = self._meta_path(path) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta_path(path))
+
+    def _update(self, path, change):
+        if not path:
+            return False
+        with self._lock:
+            meta = self._read_meta(path)
+            if meta is None or not os.path.isdir(path):
+                return False
+            change(meta)
+            meta["last_used"] = time.time()
+            self._write_meta(path, meta)
+            return True
+
+    def claim(self, path, owner):
+        """Marks `owner` (a session or job id) as using the sandbox. False when it no longer exists."""
+        return self._update(path, lambda meta: meta["owners"].append(owner) if owner not in meta["owners"] else None)
+
+    def release(self, path, owner):
+        """Drops `owner`'s claim; the sandbox becomes collectable once nobody holds it."""
+        return self._update(path, lambda meta: meta["owners"].remove(owner) if owner in meta["owners"] else None)
+
+    def claim_private(self, path, owner):
+        """Claims a (possibly shared) job workspace for `owner`. The first claimant gets the directory
+        itself; later ones get a sandbox of it, so patches and test runs of one session never reach
+        another's tree. Returns the directory to use, or None when the workspace no longer exists."""
+        first = []
+
+        def change(meta):
+            if meta.get("claimed_by", owner) == owner:
+                meta["claimed_by"] = owner
+                if owner not in meta["owners"]:
+                    meta["owners"].append(owner)
+                first.append(True)
+
+        if not self._update(path, change):
+            return None
+        if first:
+            return path
+        private = self.create(path, owner=owner)
+        index = os.path.normpath(path) + ".index"
+        if os.path.isdir(index):
+            # Copied, not linked: saving an index rewrites its files in place
+            shutil.copytree(index, os.path.normpath(private) + ".index", dirs_exist_ok=True)
+        return private
+
+    def touch(self, path):
+        return self._update(path, lambda meta: None)
+
+    # --- Removal ---
+
+    @staticmethod
+    def _clear(path):
+        """Empties a directory after a failed setup attempt (a worktree deregisters itself first)."""
+        if os.path.isfile(os.path.join(path, ".git")):
+            try:
+                Git(path).worktree("remove", "--force", path)
+            except Exception:
+                pass
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+    def remove(self, path):
+        """Deletes a sandbox, its retrieval index and its sidecar."""
+        if os.path.isfile(os.path.join(path, ".git")):
+            try:
+                Git(path).worktree("remove", "--force", os.path.abspath(path))
+            except Exception:
+                pass
+        shutil.rmtree(path, ignore_errors=True)
+        shutil.rmtree(os.path.normpath(path) + ".index", ignore_errors=True)
+        try:
+            os.remove(self._meta_path(path))
+        except OSError:
+            pass
+        with self._lock:
+            self.stats["removed"] += 1
+
+    @staticmethod
+    def usage(path):
+        """Bytes the sandbox occupies on its own: files still hardlinked to the original are free.
+        Reflinked files count in full (extent sharing is invisible to stat), so this errs high."""
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    stat = os.lstat(os.path.join(root, name))
+                except OSError:
+                    continue
+                if stat.st_nlink < 2:
+                    total += getattr(stat, "st_blocks", stat.st_size // 512) * 512
+        return total
+
+    def _sandboxes(self):
+        """[(path, meta)] of every directory under SANDBOX_DIR; meta is None for orphans."""
+        if not os.path.isdir(self.root):
+            return []
+        found = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith(".index") or not os.path.isdir(path):
+                continue
+            found.append((path, self._read_meta(path)))
+        return found
+
+    def gc(self):
+        """Deletes expired sandboxes, then least recently used unowned ones while over the quota.
+        Returns the number deleted."""
+        if not self._gc_lock.acquire(blocking=False):
+            return 0
+        try:
+            now = time.time()
+            removed, kept = 0, []
+            for path, meta in self._sandboxes():
+                if meta is None:
+                    # No sidecar: left behind by a crash or an older version; st_ctime cannot be backdated
+                    expired = now - os.stat(path).st_ctime > Config.SANDBOX_TTL
+                else:
+                    idle = now - meta.get("last_used", 0)
+                    expired = idle > (Config.SANDBOX_MAX_IDLE if meta.get("owners") else Config.SANDBOX_TTL)
+                if expired:
+                    self.remove(path)
+                    removed += 1
+                else:
+                    kept.append((path, meta))
+            if self.quota_bytes:
+                sized = [(meta.get("last_used", 0), path, meta, self.usage(path)) for path, meta in kept if meta]
+                total = sum(size for *_, size in sized)
+                for last_used, path, meta, size in sorted(sized, key=lambda row: row[0]):
+                    if total <= self.quota_bytes:
+                        break
+                    if meta.get("owners") or now - last_used < RECENT:
+                        continue
+                    self.remove(path)
+                    removed += 1
+                    total -= size
+                if total > self.quota_bytes:
+                    logger.warning(f"Sandboxes use {total / (1024 * 1024):.0f} MB, above SANDBOX_QUOTA_BYTES, but every remaining one is in use")
+            if removed:
+                logger.info(f"Sandbox gc: removed {removed} sandbox(es)")
+            return removed
+        finally:
+            self._gc_lock.release()
+
+    def collect(self):
+        """Runs `gc` in the background so it never adds to setup time."""
+        threading.Thread(target=self.gc, name="sandbox-gc", daemon=True).start()
+
+    def snapshot(self):
+        sandboxes = [meta for _, meta in self._sandboxes() if meta]
+        return {**self.stats, "sandboxes": len(sandboxes), "owned": sum(1 for meta in sandboxes if meta.get("owners"))}
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_sandbox_manager():
+    """Returns the process-wide sandbox manager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = SandboxManager()
+        return _manager
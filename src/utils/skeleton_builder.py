@@ -0,0 +1,448 @@
+import os
+import re
+import ast
+import json
+import bisect
+import hashlib
+import builtins
+from src.config import Config, logger
+
+SKELETON_VERSION = 2 # Bump when the skeleton format changes: cached skeletons are keyed by it
+MAX_CALLS = 8
+MAX_IMPORTS = 12
+MAX_NAMES = 12
+BUILTINS = frozenset(dir(builtins))
+PY_EXTENSIONS = (".py",)
+JS_EXTENSIONS = (".js", ".ts", ".jsx", ".tsx", ".mjs", ".cjs")
+
+JS_TOKEN = re.compile(r"""
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:\\.|[^'\\\n])*'|"(?:\\.|[^"\\\n])*"|`(?:\\.|[^`\\])*`)
+  | (?P<name>[A-Za-z_$][\w$]*)
+  | (?P<punct>=>|\.\.\.|\?\.|[{}()\[\];,.=:<>@*?!])
+  | (?P<other>\S)
+""", re.DOTALL | re.VERBOSE)
+JS_KEYWORDS = {
+    "if", "for", "while", "switch", "catch", "return", "function", "typeof", "new", "await", "yield", "delete",
+    "void", "in", "of", "instanceof", "else", "do", "try", "finally", "throw", "case", "super", "import", "class",
+}
+JS_MODIFIERS = {"static", "async", "get", "set", "public", "private", "protected", "readonly", "override", "abstract", "export", "default", "declare"}
+JS_IMPORT = re.compile(r"""^\s*import\s[^'"]*['"]([^'"]+)['"]|require\(\s*['"]([^'"]+)['"]\s*\)""", re.MULTILINE)
+
+def _first_paragraph(doc, limit=200):
+    text = " ".join(doc.strip().split("\n\n")[0].split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+def _assigned_names(body):
+    """Names bound by plain assignments in a module or class body."""
+    names = []
+    for node in body:
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target] if isinstance(node, ast.AnnAssign) else []
+        names.extend(t.id for t in targets if isinstance(t, ast.Name))
+    return list(dict.fromkeys(names))
+
+def _listing(label, names, limit):
+    more = f" (+{len(names) - limit})" if len(names) > limit else ""
+    return f"{label}: {', '.join(names[:limit])}{more}"
+
+def _calls(node):
+    """Call targets under `node` in source order, without builtins."""
+    found = []
+    for child in ast.walk(node):
+        if isinstance(child, ast.Call):
+            name = _call_name(child.func)
+            if name and name not in BUILTINS:
+                found.append((child.lineno, child.col_offset, name))
+    return list(dict.fromkeys(name for _, _, name in sorted(found)))
+
+def _call_name(func):
+    """'a.b.c' for plain name/attribute chains, else None (calls on call results, subscripts...)."""
+    parts = []
+    while isinstance(func, ast.Attribute):
+        parts.append(func.attr)
+        func = func.value
+    if not isinstance(func, ast.Name):
+        return None
+    parts.append(func.id)
+    return ".".join(reversed(parts))
+
+class SkeletonBuilder:
+    """Condenses source files into skeletons: module docstring, imports, class and function
+    signatures with their decorators, docstring summaries and call targets, bodies elided.
+
+    Python is read with `ast`; JS/TS with a small tokenizer that tracks braces, skipping strings and
+    comments. A skeleton is a list of items, each optionally naming the function whose full source
+    it can be swapped for, so `summarize` can inline the bodies of the most relevant functions.
+    Skeletons are cached on disk per content hash (SKELETON_CACHE_DIR)."""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or Config.SKELETON_CACHE_DIR
+        self.stats = {"files": 0, "cache_hits": 0, "built": 0, "raw": 0, "full_bodies": 0}
+
+    # --- Cache ---
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def skeleton(self, rel_path, content):
+        """Returns {'items': [{'text', 'function'}], 'functions': [{'qualname', 'name', 'start', 'end', 'calls'}]}
+        or None when the file is not Python/JS/TS or does not parse. An item's 'function' is an index into
+        'functions': qualnames repeat for overloads and property getter/setter pairs."""
+        if not rel_path.endswith(PY_EXTENSIONS + JS_EXTENSIONS):
+            return None
+        language = "py" if rel_path.endswith(PY_EXTENSIONS) else "js"
+        key = hashlib.sha256(f"{SKELETON_VERSION}:{language}:{content}".encode("utf-8")).hexdigest()
+        path = self._cache_path(key)
+        if Config.SKELETON_CACHE_ENABLED:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.stats["cache_hits"] += 1
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        data = self._python(content) if language == "py" else self._javascript(content)
+        self.stats["built"] += 1
+        if Config.SKELETON_CACHE_ENABLED:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(data, f)
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.warning(f"Skeleton cache write failed: {e}")
+        return data
+
+    # --- Python ---
+
+    @staticmethod
+    def _parse_python(content):
+        """Parses a file, or, for a prefix cut mid-definition, the part before the last definition
+        (at any depth) that leaves valid code. Returns (tree, cut)."""
+        try:
+            return ast.parse(content), False
+        except SyntaxError:
+            pass
+        lines = content.splitlines()
+        attempts = 0
+        for i in range(len(lines) - 1, 0, -1):
+            if not lines[i].lstrip().startswith(("def ", "async def ", "class ")):
+                continue
+            while i > 0 and lines[i - 1].lstrip().startswith("@"):
+                i -= 1
+            try:
+                return ast.parse("\n".join(lines[:i])), True
+            except SyntaxError:
+                attempts += 1
+                if attempts >= 20:
+                    break
+        return None, False
+
+    def _python(self, content):
+        tree, cut = self._parse_python(content)
+        if tree is None:
+            return None
+        items, functions = [], []
+        doc = ast.get_docstring(tree)
+        if doc:
+            items.append({"text": f'"""{_first_paragraph(doc)}"""', "function": None})
+        imports = []
+        for node in tree.body:
+            if isinstance(node, ast.Import):
+                imports.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                imports.append("." * node.level + (node.module or ""))
+        if imports:
+            items.append({"text": _listing("# imports", list(dict.fromkeys(imports)), MAX_IMPORTS), "function": None})
+        names = _assigned_names(tree.body)
+        if names:
+            items.append({"text": _listing("# globals", names, MAX_NAMES), "function": None})
+        # Scripts do their work at module level
+        runs = []
+        for node in tree.body:
+            if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Import, ast.ImportFrom, ast.If)):
+                runs.extend(_calls(node))
+        if runs:
+            items.append({"text": _listing("# runs", list(dict.fromkeys(runs)), MAX_NAMES), "function": None})
+        for node in tree.body:
+            self._python_node(node, "", "", items, functions)
+        if cut:
+            items.append({"text": "# ... (file continues)", "function": None})
+        return {"items": items, "functions": functions}
+
+    def _python_node(self, node, indent, owner, items, functions):
+        decorators = [f"{indent}@{ast.unparse(d)}" for d in getattr(node, "decorator_list", [])]
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            qualname = f"{owner}{node.name}"
+            prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+            returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+            lines = decorators + [f"{indent}{prefix} {node.name}({ast.unparse(node.args)}){returns}:"]
+            doc = ast.get_docstring(node)
+            if doc:
+                lines.append(f'{indent}    """{_first_paragraph(doc)}"""')
+            calls = _calls(node)
+            if calls:
+                lines.append(f"{indent}    # calls: {', '.join(calls[:MAX_CALLS])}")
+            lines.append(f"{indent}    ...")
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+            items.append({"text": "\n".join(lines), "function": len(functions)})
+            functions.append({"qualname": qualname, "name": node.name, "start": start, "end": node.end_lineno, "calls": calls})
+        elif isinstance(node, ast.ClassDef):
+            bases = [ast.unparse(b) for b in node.bases] + [ast.unparse(k) for k in node.keywords]
+            lines = decorators + [f"{indent}class {node.name}{'(' + ', '.join(bases) + ')' if bases else ''}:"]
+            doc = ast.get_docstring(node)
+            if doc:
+                lines.append(f'{indent}    """{_first_paragraph(doc)}"""')
+            names = _assigned_names(node.body)
+            if names:
+                lines.append(_listing(f"{indent}    # attributes", names, MAX_NAMES))
+            items.append({"text": "\n".join(lines), "function": None})
+            members = [m for m in node.body if isinstance(m, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))]
+            for member in members:
+                self._python_node(member, indent + "    ", f"{owner}{node.name}.", items, functions)
+            if not members and not doc and not names:
+                items.append({"text": f"{indent}    ...", "function": None})
+        elif isinstance(node, ast.If) and "__name__" in ast.unparse(node.test):
+            items.append({"text": f"{indent}if {ast.unparse(node.test)}:  # calls: {', '.join(_calls(node)[:MAX_CALLS])}", "function": None})
+
+    # --- JavaScript / TypeScript ---
+
+    @staticmethod
+    def _tokens(content):
+        """[(kind, text, offset)] without comments; the leading doc comment is returned separately."""
+        tokens, doc = [], None
+        for match in JS_TOKEN.finditer(content):
+            kind = match.lastgroup
+            if kind == "comment":
+                if doc is None and not tokens and match.group().startswith("/**"):
+                    doc = match.group()
+                continue
+            tokens.append((kind, match.group(), match.start()))
+        return tokens, doc
+
+    @staticmethod
+    def _matches(tokens):
+        """Index of the closing bracket for every opening one (unbalanced ones are left out)."""
+        pairs, stacks = {}, {"{": [], "(": [], "[": []}
+        closing = {"}": "{", ")": "(", "]": "["}
+        for i, (kind, text, _) in enumerate(tokens):
+            if kind != "punct":
+                continue
+            if text in stacks:
+                stacks[text].append(i)
+            elif text in closing and stacks[closing[text]]:
+                pairs[stacks[closing[text]].pop()] = i
+        return pairs
+
+    def _javascript(self, content):
+        tokens, doc = self._tokens(content)
+        pairs = self._matches(tokens)
+        newlines = [i for i, c in enumerate(content) if c == "\n"]
+        source_lines = content.splitlines()
+
+        def line_of(i):
+            return bisect.bisect_right(newlines, tokens[i][2]) + 1
+
+        def signature(start, end):
+            # Source from the declaration's first token up to (excluding) token `end`, on one line
+            stop = tokens[end][2] if end < len(tokens) else len(content)
+            return " ".join(content[tokens[start][2]:stop].split())
+
+        def calls_in(start, end):
+            calls = []
+            for j in range(start, end):
+                kind, text, _ = tokens[j]
+                if kind == "name" and text not in JS_KEYWORDS and j + 1 < end and tokens[j + 1][1] == "(":
+                    k, name = j, text
+                    while k >= 2 and tokens[k - 1][1] in (".", "?.") and tokens[k - 2][0] == "name":
+                        k -= 2
+                        name = f"{tokens[k][1]}.{name}"
+                    if (k == 0 or tokens[k - 1][1] != "function") and name not in calls:
+                        calls.append(name)
+            return calls
+
+        items, functions = [], []
+        if doc:
+            text = " ".join(line.strip().lstrip("*").strip() for line in doc[3:-2].splitlines() if not line.strip().lstrip("*").strip().startswith("@"))
+            if text.strip():
+                items.append({"text": f"/** {_first_paragraph(text)} */", "function": None})
+        imports = list(dict.fromkeys(a or b for a, b in JS_IMPORT.findall(content)))
+        if imports:
+            items.append({"text": _listing("// imports", imports, MAX_IMPORTS), "function": None})
+
+        def decl_start(i):
+            # Walk back over modifiers (export, async, static...) and decorators on the same declaration
+            while i > 0 and (tokens[i - 1][1] in JS_MODIFIERS or tokens[i - 1][1] == "*"):
+                i -= 1
+            return i
+
+        def add_function(qualname, name, start, body_open, body_close, indent):
+            sig = signature(start, body_open)
+            calls = calls_in(body_open, body_close + 1)
+            lines = [f"{indent}{sig} {{"]
+            if calls:
+                lines.append(f"{indent}    // calls: {', '.join(calls[:MAX_CALLS])}")
+            lines.append(f"{indent}    ...")
+            lines.append(f"{indent}}}")
+            items.append({"text": "\n".join(lines), "function": len(functions)})
+            functions.append({"qualname": qualname, "name": name, "start": line_of(start), "end": line_of(body_close), "calls": calls})
+
+        def body_after(i, limit):
+            """Index of the '{' opening a body after the parameter list ending at `i`, before `limit`."""
+            j = i + 1
+            while j < limit and tokens[j][1] not in ("{", ";", "=", "}"):
+                j += 1
+            return j if j < limit and tokens[j][1] == "{" and j in pairs else None
+
+        def walk(start, end, indent, owner, in_class):
+            i = start
+            while i < end:
+                kind, text, _ = tokens[i]
+                nxt = tokens[i + 1][1] if i + 1 < end else ""
+                if text == "class" and kind == "name" and i + 1 < end and tokens[i + 1][0] == "name":
+                    j = i + 1
+                    while j < end and tokens[j][1] != "{":
+                        j += 1
+                    if j < end and j in pairs:
+                        first = decl_start(i)
+                        name = tokens[i + 1][1]
+                        items.append({"text": f"{indent}{signature(first, j)} {{", "function": None})
+                        walk(j + 1, pairs[j], indent + "    ", f"{owner}{name}.", True)
+                        items.append({"text": f"{indent}}}", "function": None})
+                        i = pairs[j] + 1
+                        continue
+                if text == "function" and kind == "name":
+                    j = i + 1
+                    if j < end and tokens[j][1] == "*":
+                        j += 1
+                    if j < end and tokens[j][0] == "name" and j + 1 < end and tokens[j + 1][1] == "(" and (j + 1) in pairs:
+                        body = body_after(pairs[j + 1], end)
+                        if body is not None:
+                            add_function(f"{owner}{tokens[j][1]}", tokens[j][1], decl_start(i), body, pairs[body], indent)
+                            i = pairs[body] + 1
+                            continue
+                if kind == "name" and text in ("interface", "enum") and i + 1 < end and tokens[i + 1][0] == "name":
+                    j = i + 1
+                    while j < end and tokens[j][1] != "{":
+                        j += 1
+                    if j < end and j in pairs:
+                        first = decl_start(i)
+                        items.append({"text": f"{indent}{signature(first, j)} {{ ... }}", "function": None})
+                        i = pairs[j] + 1
+                        continue
+                if kind == "name" and text not in JS_KEYWORDS and (nxt in ("=", ":") or (in_class and nxt == "(")):
+                    # Arrow functions / function expressions assigned to a name, or class methods
+                    j = i + 1
+                    if nxt == ":":
+                        # Skip a TypeScript annotation up to the '='
+                        while j < end and tokens[j][1] not in ("=", ";", "{", "(") and j - i < 40:
+                            j += 1
+                    if j < end and tokens[j][1] == "=":
+                        k = j + 1
+                        if k < end and tokens[k][1] == "async":
+                            k += 1
+                        if k < end and tokens[k][1] == "function":
+                            k += 1
+                            if k < end and tokens[k][0] == "name":
+                                k += 1
+                        params_end = None
+                        if k < end and tokens[k][1] == "(" and k in pairs:
+                            params_end = pairs[k]
+                        elif k < end and tokens[k][0] == "name" and k + 1 < end and tokens[k + 1][1] == "=>":
+                            params_end = k
+                        if params_end is not None:
+                            m = params_end + 1
+                            while m < end and tokens[m][1] not in ("=>", "{", ";", ","):
+                                m += 1
+                            if m < end and tokens[m][1] == "=>":
+                                m += 1
+                            if m < end and tokens[m][1] == "{" and m in pairs:
+                                add_function(f"{owner}{text}", text, decl_start(self._declarator(tokens, i)), m, pairs[m], indent)
+                                i = pairs[m] + 1
+                                continue
+                    elif in_class and nxt == "(" and (i + 1) in pairs:
+                        body = body_after(pairs[i + 1], end)
+                        if body is not None:
+                            add_function(f"{owner}{text}", text, decl_start(i), body, pairs[body], indent)
+                            i = pairs[body] + 1
+                            continue
+                # Skip other bracketed regions (object literals, call arguments, blocks...)
+                if kind == "punct" and text in ("{", "(", "[") and i in pairs:
+                    i = pairs[i] + 1
+                    continue
+                i += 1
+
+        walk(0, len(tokens), "", "", False)
+        if not items:
+            return None
+        return {"items": items, "functions": functions}
+
+    @staticmethod
+    def _declarator(tokens, i):
+        """Includes a preceding const/let/var in an assignment's declaration."""
+        return i - 1 if i > 0 and tokens[i - 1][1] in ("const", "let", "var") else i
+
+    # --- Summaries ---
+
+    @staticmethod
+    def render(data, content, full=()):
+        """Skeleton text, with the source of the functions in `full` (indexes into 'functions') instead of their stubs."""
+        lines = content.splitlines()
+        parts = []
+        for item in data["items"]:
+            if item["function"] is not None and item["function"] in full:
+                function = data["functions"][item["function"]]
+                start, end = function["start"], function["end"]
+                parts.append("\n".join(lines[start - 1:end]))
+            else:
+                parts.append(item["text"])
+        return "\n".join(parts)
+
+    def summarize(self, ranked, estimate_tokens, budget):
+        """Turns ranked files (see ContextBuilder.rank_files) into (path, text) blocks: skeletons,
+        with full bodies for up to SKELETON_FULL_BODIES of the most relevant functions, within
+        SKELETON_BODY_SHARE of `budget`. Relevance is the file's score plus how often other
+        functions call the function's name. Files without a skeleton (other languages,
+        unparsable code) keep their content."""
+        skeletons = {}
+        for f in ranked:
+            self.stats["files"] += 1
+            data = self.skeleton(f["path"], f["content"])
+            if data and data["items"]:
+                skeletons[f["path"]] = data
+            else:
+                self.stats["raw"] += 1
+
+        callers = {}
+        for path, data in skeletons.items():
+            for index, function in enumerate(data["functions"]):
+                for call in function["calls"]:
+                    callers.setdefault(call.rsplit(".", 1)[-1], set()).add((path, index))
+        most_called = max((len(c) for c in callers.values()), default=0) or 1
+        scores = {f["path"]: f["score"] for f in ranked}
+        contents = {f["path"]: f["content"] for f in ranked}
+        candidates = []
+        for path, data in skeletons.items():
+            lines = contents[path].splitlines()
+            for index, function in enumerate(data["functions"]):
+                cost = estimate_tokens("\n".join(lines[function["start"] - 1:function["end"]]))
+                if cost > Config.SKELETON_MAX_BODY_TOKENS:
+                    continue
+                called = len(callers.get(function["name"], set()) - {(path, index)})
+                candidates.append((scores[path] + Config.SKELETON_CALLER_WEIGHT * called / most_called, path, index, cost))
+        candidates.sort(key=lambda c: (-c[0], c[1], c[2]))
+        full, room, chosen = {}, int(budget * Config.SKELETON_BODY_SHARE), 0
+        for _, path, index, cost in candidates:
+            if chosen >= Config.SKELETON_FULL_BODIES:
+                break
+            if cost <= room:
+                full.setdefault(path, set()).add(index)
+                room -= cost
+                chosen += 1
+        self.stats["full_bodies"] += chosen
+
+        blocks = []
+        for f in ranked:
+            data = skeletons.get(f["path"])
+            blocks.append((f["path"], self.render(data, f["content"], full.get(f["path"], ())) if data else f["content"]))
+        return blocks
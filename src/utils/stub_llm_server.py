@@ -0,0 +1,297 @@
+"""OpenAI-compatible stub LLM server for offline load, latency and rate-limit testing.
+
+Serves POST /v1/chat/completions with canned answers shaped like each agent's real output
+(parser notes, '###' findings, '#### [FILE]' unified diffs against the flagged source, review
+verdicts, diagram JSON...), chosen from the agent's system prompt. Latency, 429 injection and
+payload size are configurable and seeded, so runs are reproducible. GET /stats returns request counters.
+
+Point the app at it without real keys:
+
+    python -m src.utils.stub_llm_server --port 8089 --latency lognormal:-1.5,0.5 --rate-429 0.05
+    GROQ_BASE_URL=http://127.0.0.1:8089/v1 GROQ_API_KEY=stub-key GOOGLE_API_KEY= streamlit run app.py
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import src.agents.prompts as prompts
+
+PATH_HEADER = re.compile(r"^--- Path: (\S+)", re.MULTILINE)
+FILE_LIST_ITEM = re.compile(r"^- (\S+\.py)$", re.MULTILINE)
+CODE_BLOCK = re.compile(r"```(?:python)?\n(.*?)\n```", re.DOTALL)
+SOURCE_SECTION = re.compile(r"Source of the Flagged Files:\n(.*?)(?:\n\nWorkspace File List|\Z)", re.DOTALL)
+SOURCE_BLOCK = re.compile(r"^--- Path: (\S+) ---\n(.*?)(?=^--- Path: |\Z)", re.MULTILINE | re.DOTALL)
+DEF_LINE = re.compile(r"^\s*def \w+\((?!self\b|cls\b)(\w+)[^)]*\)[^:]*:\s*$")
+
+# Agent name -> first line of its system prompt, used to recognise who is calling
+PHASE_MARKERS = [
+    ("Code_Parser", prompts.CODE_PARSER_PROMPT),
+    ("Bug_Detection", prompts.BUG_DETECTION_PROMPT),
+    ("Patch_Generator", prompts.PATCH_GENERATOR_PROMPT),
+    ("Reviewer", prompts.REVIEWER_PROMPT),
+    ("Patch_Applier", prompts.PATCH_APPLIER_PROMPT),
+    ("Diagram_Generator", prompts.DIAGRAM_GENERATOR_PROMPT),
+    ("Repo_Chat_Agent", prompts.REPO_CHAT_PROMPT),
+    ("Memory_Summarizer", prompts.MEMORY_SUMMARIZER_PROMPT),
+]
+
+class LatencyModel:
+    """Samples response delays from a spec: 'fixed:S', 'uniform:A,B', 'normal:MU,SD',
+    'lognormal:MU,SIGMA' or 'exp:MEAN' (seconds, never negative)."""
+
+    def __init__(self, spec, rng):
+        kind, _, args = spec.partition(":")
+        self.kind = kind
+        self.args = [float(a) for a in args.split(",") if a] or [0.0]
+        self.rng = rng
+        if kind not in ("fixed", "uniform", "normal", "lognormal", "exp"):
+            raise ValueError(f"Unknown latency distribution '{spec}'")
+
+    def sample(self):
+        a = self.args
+        if self.kind == "fixed":
+            value = a[0]
+        elif self.kind == "uniform":
+            value = self.rng.uniform(a[0], a[1])
+        elif self.kind == "normal":
+            value = self.rng.gauss(a[0], a[1])
+        elif self.kind == "lognormal":
+            value = self.rng.lognormvariate(a[0], a[1])
+        else:
+            value = self.rng.expovariate(1.0 / a[0]) if a[0] > 0 else 0.0
+        return max(0.0, value)
+
+class StubLLMServer:
+    """Threaded stub server. `start()` serves in the background and returns the base URL."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency="fixed:0", rate_429=0.0, retry_after=1.0, payload_chars=0, seed=0):
+        self.host = host
+        self.port = port
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.payload_chars = payload_chars
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.latency = LatencyModel(latency, self._rng)
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "rate_limited": 0, "in_flight": 0, "max_in_flight": 0, "by_phase": {}}
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    def start(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler_class())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def serve_forever(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler_class())
+        self.port = self._server.server_address[1]
+        print(f"--- Stub LLM server listening on {self.base_url} ---", file=sys.stderr, flush=True)
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def stats(self):
+        with self._stats_lock:
+            return json.loads(json.dumps(self._stats))
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats = {"requests": 0, "rate_limited": 0, "in_flight": 0, "max_in_flight": 0, "by_phase": {}}
+
+    # --- Request handling ---
+
+    def _roll(self):
+        with self._rng_lock:
+            return self._rng.random(), self.latency.sample()
+
+    def _count(self, phase, rate_limited=False, delta_in_flight=0):
+        with self._stats_lock:
+            s = self._stats
+            if phase is not None:
+                s["requests"] += 1
+                s["by_phase"][phase] = s["by_phase"].get(phase, 0) + 1
+            if rate_limited:
+                s["rate_limited"] += 1
+            s["in_flight"] += delta_in_flight
+            s["max_in_flight"] = max(s["max_in_flight"], s["in_flight"])
+
+    def complete(self, body):
+        """Returns (status, payload, headers) for a chat completion request body."""
+        messages = body.get("messages", [])
+        system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+        user = "\n".join(m.get("content") or "" for m in messages if m.get("role") == "user")
+        phase = self.phase_of(system)
+        roll, delay = self._roll()
+        self._count(phase, delta_in_flight=1)
+        try:
+            time.sleep(delay)
+            if roll < self.rate_429:
+                self._count(None, rate_limited=True)
+                message = f"Rate limit reached for model `{body.get('model')}` on tokens per minute (TPM). Please try again in {self.retry_after}s."
+                return 429, {"error": {"message": message, "type": "tokens", "code": "rate_limit_exceeded"}}, {"Retry-After": str(self.retry_after)}
+            content = self.respond(phase, user)
+            if self.payload_chars and len(content) < self.payload_chars:
+                content += "\n\n" + self._padding(self.payload_chars - len(content))
+            prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+            completion_tokens = len(content) // 4
+            return 200, {
+                "id": f"chatcmpl-stub-{int(time.time() * 1000)}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+            }, {}
+        finally:
+            self._count(None, delta_in_flight=-1)
+
+    @staticmethod
+    def phase_of(system_message):
+        for name, prompt in PHASE_MARKERS:
+            if prompt.splitlines()[0].strip() in system_message:
+                return name
+        return "Unknown"
+
+    @staticmethod
+    def unified_diff(path, content):
+        """A one-hunk diff adding a None check to the first function of `content` that takes an
+        argument, with three context lines on each side copied from the file; None if there is none."""
+        lines = content.split("\n... [truncated] ...")[0].rstrip("\n").splitlines()
+        for i, line in enumerate(lines[:-1]):
+            match = DEF_LINE.match(line)
+            body = lines[i + 1]
+            indent = body[:len(body) - len(body.lstrip())]
+            if not match or len(indent) <= len(line) - len(line.lstrip()):
+                continue
+            before, after = lines[max(0, i - 2):i + 1], lines[i + 1:i + 4]
+            added = [f"{indent}if {match.group(1)} is None:", f"{indent}    raise ValueError(\"{match.group(1)} is required\")"]
+            start = i + 2 - len(before)
+            header = f"@@ -{start},{len(before) + len(after)} +{start},{len(before) + len(after) + len(added)} @@"
+            hunk = [f" {l}" for l in before] + [f"+{l}" for l in added] + [f" {l}" for l in after]
+            return "\n".join([f"--- a/{path}", f"+++ b/{path}", header] + hunk)
+        return None
+
+    @staticmethod
+    def respond(phase, user):
+        """Canned answer in the shape the pipeline parses for `phase`."""
+        paths = PATH_HEADER.findall(user) or ["main.py"]
+        if phase == "Code_Parser":
+            return "### Structure\n" + "\n".join(f"- `{p}`: module" for p in paths)
+        if phase == "Bug_Detection":
+            return "\n\n".join(f"### Unchecked input in {p}\nValues from callers reach `{p}` without validation." for p in paths[:3])
+        if phase == "Patch_Generator":
+            # Diffs against the flagged source the prompt carries, as PATCH_GENERATOR_PROMPT asks
+            section = SOURCE_SECTION.search(user)
+            blocks = []
+            for path, content in SOURCE_BLOCK.findall(section.group(1)) if section else []:
+                diff = StubLLMServer.unified_diff(path, content) if path.endswith(".py") else None
+                if diff:
+                    blocks.append(f"### Validate input ({path})\n#### [FILE] {path}\n```diff\n{diff}\n```")
+                if len(blocks) == 2:
+                    break
+            if blocks:
+                return "\n\n".join(blocks)
+            # Without source to diff against: new helper code as full blocks
+            targets = FILE_LIST_ITEM.findall(user) or [p for p in paths if p.endswith(".py")] or ["main.py"]
+            for i, target in enumerate(targets[:2]):
+                blocks.append(
+                    f"### Validate input ({target})\n#### [FILE] {target}\n"
+                    f"```python\ndef stub_validate_{i}(value):\n    if value is None:\n        raise ValueError(\"value is required\")\n    return value\n```"
+                )
+            return "\n\n".join(blocks)
+        if phase == "Reviewer":
+            return "✅ APPROVED\nThe patches validate inputs without changing behaviour for valid values."
+        if phase == "Patch_Applier":
+            blocks = CODE_BLOCK.findall(user)
+            merged = "\n\n".join(blocks) if blocks else "pass"
+            return f"```python\n{merged}\n```"
+        if phase == "Diagram_Generator":
+            nodes = [{"id": str(i), "label": p.split("/")[-1], "layer": min(i, 3)} for i, p in enumerate(paths[:4])]
+            edges = [{"from": str(i), "to": str(i + 1), "label": "calls"} for i in range(len(nodes) - 1)]
+            return "### Diagram\n```json\n" + json.dumps({"nodes": nodes, "edges": edges}) + "\n```"
+        if phase == "Memory_Summarizer":
+            return "- The user asked about the repository structure."
+        return f"Stub answer based on {len(paths)} file(s)."
+
+    @staticmethod
+    def _padding(chars):
+        filler = "Additional analysis detail for load testing. "
+        return (filler * (chars // len(filler) + 1))[:chars]
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/") in ("/stats", "/v1/stats"):
+                    self._send(200, server.stats())
+                elif self.path.rstrip("/") in ("/models", "/v1/models"):
+                    self._send(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+                else:
+                    self._send(404, {"error": {"message": "not found"}})
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": "not found"}})
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except Exception as e:
+                    self._send(400, {"error": {"message": f"invalid request: {e}"}})
+                    return
+                status, payload, headers = server.complete(body)
+                self._send(status, payload, headers)
+
+        return Handler
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub LLM server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", default="fixed:0.05", help="fixed:S | uniform:A,B | normal:MU,SD | lognormal:MU,SIGMA | exp:MEAN")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Probability of answering 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Seconds advertised on 429 responses")
+    parser.add_argument("--payload-chars", type=int, default=0, help="Pad answers to at least this many characters")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    StubLLMServer(args.host, args.port, args.latency, args.rate_429, args.retry_after, args.payload_chars, args.seed).serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,48 @@
 import os
 import sys
-from src.config import logger
+from src.utils.github_utils import GitHubUtils
+from src.utils.file_crawler import FileCrawler
+from src.utils.file_reader import FileReader
+from src.utils.sandbox_manager import get_sandbox_manager
 
 class WorkspaceUtils:
     @staticmethod
-    def list_files(directory, extensions=None, ignore_dirs=None):
-        """Lists files in a directory, optionally filtered by extensions and ignoring specific directories."""
+    def prepare_workspace(repo_url=None, local_path=None, target_dir=None, owner=None):
+        """Clones `repo_url` or sandboxes `local_path` (a directory or a single file) into a fresh
+        workspace directory tracked by the sandbox manager for `owner`.
+        Returns (workspace_dir, note, error); `error` is None on success."""
+        sandboxes = get_sandbox_manager()
+        if repo_url:
+            target_dir = target_dir or sandboxes.allocate()
+            if GitHubUtils.clone_repository(repo_url, target_dir):
+                sandboxes.register(target_dir, repo_url, "clone", owner)
+                return target_dir, None, None
+            return target_dir, None, "Failed to clone remote repository."
+        if not local_path:
+            return target_dir, None, "No repository URL or local path given."
+        if not os.path.exists(local_path):
+            return target_dir, None, f"Path not found: {local_path}"
+        try:
+            target_dir = sandboxes.create(local_path, target_dir, owner)
+        except Exception as e:
+            return target_dir, None, f"Failed to copy local repository: {e}"
+        if os.path.isfile(local_path):
+            return target_dir, "Single file detected. Processing as a one-file repository.", None
+        return target_dir, None, None
+
+    @staticmethod
+    def list_files(directory, extensions=None, ignore_dirs=None, max_files=100):
+        """Lists files in a directory, optionally filtered by extensions and ignoring specific directories.
+        Stops at `max_files` (a practical limit for summaries)."""
         if extensions is None:
             extensions = ['.py', '.js', '.ts', '.html', '.css', '.md', '.json']
-        if ignore_dirs is None:
-            ignore_dirs = ['node_modules', '.git', '__pycache__', 'venv', '.vscode', 'out', 'build', 'dist', '.next', '.venv', 'env']
-        
-        file_list = []
-        print(f"--- Crawling directory: {os.path.basename(directory)} ---", file=sys.stderr, flush=True)
-        for root, dirs, files in os.walk(directory):
-            # Prune ignored directories
-            dirs[:] = [d for d in dirs if d not in ignore_dirs and not d.startswith('.')]
-            
-            for file in files:
-                if any(file.endswith(ext) for ext in extensions):
-                    full_path = os.path.join(root, file)
-                    file_list.append(full_path)
-                    if len(file_list) >= 100: # Practical limit for summary
-                        return file_list
-        return file_list
+        return FileCrawler(extensions=extensions, ignore_dirs=ignore_dirs, max_files=max_files).list_files(directory)
 
     @staticmethod
-    def read_file_content(file_path):
-        """Reads the content of a file."""
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
-        except Exception as e:
-            logger.error(f"Error reading file {file_path}: {e}")
-            return None
+    def read_file_content(file_path, limit=0):
+        """Reads the content of a file (its first `limit` bytes when set) with encoding detection.
+        Returns None for binary or unreadable files."""
+        return FileReader(limit=limit, skip_generated=False).read(file_path)
 
     @staticmethod
     def get_workspace_summary(directory, max_files=15):
@@ -41,9 +50,10 @@ class WorkspaceUtils:
         print("--- Building Workspace Summary ---", file=sys.stderr, flush=True)
         files = WorkspaceUtils.list_files(directory)
         summary = ""
+        reader = FileReader(limit=1500)
         for file_path in files[:max_files]:
-            content = WorkspaceUtils.read_file_content(file_path)
+            content = reader.read(file_path)
             if content:
                 rel_path = os.path.relpath(file_path, directory)
-                summary += f"--- Path: {rel_path} ---\n{content[:1500]}\n\n"
+                summary += f"--- Path: {rel_path} ---\n{content}\n\n"
         return summary